@@ -1,34 +1,68 @@
 #import os
-#import numpy as np
+import numpy as np
 import dash
 import dash_core_components as dcc
 import dash_table
 from dash_table.Format import Format, Scheme
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
-import plotly.graph_objs as go
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import flask
-from support_functions import update_Ra, create_report, solvents_trace, df2,filter_by_hazard, GSK_calculator, f2s, suggested_path, create_annotations, number2scientific
+from support_functions import update_Ra, create_report, solvents_trace, df2,filter_by_hazard, GSK_calculator, f2s, suggested_path, create_annotations, number2scientific, solvent_ranking, solvents_filter, hazard_matrix, hansen_index, nearest_solvents, screen_solutes, precompute_ghs_html, canonical_scores, solvents_base_data, solvents_trace_update, pareto_solvents, PARETO_OBJECTIVES
+from catalog import SolventCatalog, ScoreCube
+from cache import LRUCache
+from pagination import RankedTable
+from dataset import load_solvents, shared_array, data_key
+from hansen_sphere import fit_spheres, relative_energy_difference
+from blends import blend_search
+from export import export_stream, FORMATS
+from jobs import JobQueue
+from static_assets import StaticAssets
+from instrumentation import instrument_app
 from math import log10
+from functools import lru_cache
+from collections import namedtuple
+import json
+import hashlib
+import os
+from urllib.parse import urlencode
 
 # Folder where I can find the local resources, such as images
 STATIC_PATH = 'static'
+# Maximum number of rendered solvent reports kept in memory
+REPORT_CACHE_SIZE = 512
+# Rows of each page of the Solvent Ranking Table, and number and size (bytes) of the rankings kept in memory,
+# to serve its pages and the requests repeated. With OPEG_RANKING_CACHE=<folder>, they are also kept on disk
+PAGE_SIZE = 25
+RANKING_CACHE_SIZE = 64
+RANKING_CACHE_BYTES = 256 * 2**20
+RANKING_CACHE_PATH = os.environ.get('OPEG_RANKING_CACHE') or None
+# Seconds the main callback waits for a quick path or a Pareto front computed in the background, and
+# milliseconds between the checks of the browser if it is not ready by then
+JOB_WAIT = 0.5
+JOB_POLL_INTERVAL = 500
+# Limits of the blend searches of the API (see blend_solutes): the largest distance to the solute and the
+# smallest step of the fractions, which bound the number of blends of a request
+BLEND_MAX_RA = 15.0
+BLEND_MIN_STEP = 0.05
+# Range of the HSP of the solutes of the API, in MPa^1/2 (those of the solvents are below 50), so their Ra are finite
+HSP_RANGE = (0.0, 100.0)
 
-# Main stylesheet, so far, fetching it from an open source webpage
-#external_stylesheets = []
-# I start the dash object instance, saved in the variable app
-app = dash.Dash(__name__)
-
-server = app.server # No sure that this line is necessary, not sure what it does...
+# The images, minified and precompressed once, and served from memory with long-lived cache headers.
+# Built on first use, as the tables below, so the import of the module stays short (see warm_up)
+@lru_cache(maxsize = 1)
+def static_assets():
+    return StaticAssets(STATIC_PATH)
 
 #------------------- LOADING THE DATA -------------------------------------------
-# Loading the Excel file with all the solvents and its properties (first sheet)
-# The data is loaded in a DataFrame structure (see pandas library)
-df = pd.read_excel('solventSelectionTool_table.xlsx', sheet_name = 0, header = 2)
-df['index'] = df['Solvent Name']
-df.set_index('index', inplace=True, drop=True) # The column name is set as a index, not sure is the wisest option
-df = df[1:] # Here I am manually dropping the first row, as it is empty
+# Loading the Excel file with all the solvents and its properties (first sheet), through its binary cache
+# The data is loaded in a DataFrame structure (see pandas library), indexed by the solvent name
+df = load_solvents()
+# Version of the data, in the keys of what is derived from it and stored on disk
+DATA_KEY = data_key()
+# OBS: df is the read-only base dataset shared by all the requests (and threads). The callbacks must never
+# write on it, the columns that depend on the user's input are computed on a new DataFrame (see solvent_ranking)
 
 
 ##----------------- DEFINITION OF SOME GLOBAL VARIABLES -------------------------
@@ -60,6 +94,11 @@ FORMAT_COLUMNS = [Format(precision = 1, scheme=Scheme.fixed),\
                   Format(precision = 0, scheme=Scheme.fixed, fill= ' ', padding_width=4),\
                   Format(precision = 1, scheme = Scheme.fixed, fill= ' ', padding_width=4),\
                   Format(precision = 0, scheme=Scheme.fixed, fill = ' ', padding_width=4)]
+# Keys of the query of a ranking, the arguments of solvent_selection (see main_plot and parse_table_query)
+QUERY_KEYS = ['mode', 'solute', 'scores', 'greenness', 'hazard_list', 'temperature_range', 'viscosity_range', 'stension_range',\
+              'ndistance', 'solvent_list', 'pareto_objectives']
+# Columns of the exported rankings (see export_frame)
+EXPORT_COLUMNS = ['Solvent Name', 'CAS Number'] + HANSEN_COORDINATES + ['Ra', 'Composite score', 'Boiling Point (°C)', 'Viscosity (mPa.s)', 'Surface Tension (mN/m)']
 # Prepare the list to feed the table, adding the format two the desired precision
 TABLE_DCC = [{"type" : coltype, "name": key, "id": value, 'format' : colformat} for key, value, coltype, colformat in zip(TABLE_COLUMNS.keys(), TABLE_COLUMNS.values(), TYPE_COLUMNS, FORMAT_COLUMNS)]
 
@@ -68,49 +107,80 @@ N_SOLVENTS = df.shape[0]
 ##----------------- Adding new columns -----------------------------------
 df['Ra'] = update_Ra(df[HANSEN_COORDINATES])
 df['GSK score'], _ = GSK_calculator(df, [WASTE, HEALTH, ENVIRONMENT, SAFETY])  # This is the GSK score according to the paper
-df['Composite score'], _ = GSK_calculator(df, [WASTE, HEALTH, ENVIRONMENT, SAFETY]) # This is the composite score, that the user can modify, initial eq. to GSK
+df['Composite score'] = df['GSK score'] # This is the composite score, that the user can modify, initial eq. to GSK (computed only once)
+# The hazard labels are parsed only once into a boolean matrix (solvents x H-statements), used by the hazard filter
+@lru_cache(maxsize = 1)
+def solvents_hazards():
+    return hazard_matrix(df['Hazard Labels'])
+# Spatial index of the solvents in the Hansen space, to find the closest solvents without sorting the whole table.
+# It is built on first use, as its import (scipy) is slow
+@lru_cache(maxsize = 1)
+def solvents_index():
+    return hansen_index(df[HANSEN_COORDINATES])
+# Log-space subcategory scores, with the composite score of every selection of subcategories precomputed,
+# once for all the processes (memory-mapped, see dataset.shared_array)
+@lru_cache(maxsize = 1)
+def score_cube():
+    cube = ScoreCube(df)
+    return cube.precompute(shared_array('score_cube', cube.compute_table, DATA_KEY + repr(cube.scores)))
+# The solvents as typed arrays, for the batch requests of the API (no pandas overhead on each call, see SolventCatalog)
+@lru_cache(maxsize = 1)
+def solvents_catalog():
+    return SolventCatalog(df, hazards = solvents_hazards())
+# The rankings of the last requests (see ranking), from which the table takes the rows of its pages
+RANKINGS = LRUCache(RANKING_CACHE_SIZE, RANKING_CACHE_BYTES, lambda ranking: ranking.size, RANKING_CACHE_PATH)
+# The computations that can take long, run in the background (see jobs.py)
+JOBS = JobQueue(version = DATA_KEY)
+# The GHS statements of a solvent are resolved into html only once, on its first report (see warm_up)
 
 
-#----------------CONFIGURING THE INITAL 3D PLOT--------------------------------
-# traces is a list of traces objects. Each trace correspond to a set of data in our plot. We have 3 sets of data
-# (1) solvents, (2) the virtual solute and (3) the highlighted solvents
-traces = [solvents_trace(df),
-        go.Scatter3d(x = [], y = [], z =[], mode='markers',
-                    marker=dict(color = 'black',symbol = 'circle', opacity = 1, size = 6),\
-                    text = ['Your solute'],\
-                    hovertemplate = '<b>%{text}</b><br><br>' +\
-                                    'dD = %{x:.2f}<br>dP = %{y:.2f}<br>dH = %{z:.2f} <extra></extra>'),
-        go.Scatter3d(x = [], y = [], z =[], mode='markers',
-                     marker=dict(color = 'red', size = 10, symbol = 'circle-open', opacity=1.0,\
-                                 line = dict(color = 'red', width = 4)),\
-                     hoverinfo = 'skip')]
+# Static data of the main trace for all the solvents (coordinates, names, etc.), the figure is updated from it
+@lru_cache(maxsize = 1)
+def solvents_data():
+    return solvents_base_data(df)
 # Defining axis template        
 axis_template = dict(showbackground = True, backgroundcolor = '#F0F0F0', gridcolor = '#808080', zerolinecolor = '#808080')
 
-plot_layout = go.Layout(title = dict(text = "<b>Hansen Space</b><br>Solute's HSP: dD = " + f2s(0) + '  dP = ' + f2s(0) + '  dH = ' + f2s(0),\
-                                     y = 0.9, x = 0.5, xanchor = 'center', yanchor = 'top',\
-                                     font  = dict(size = 16, family = 'Arial', color = 'rgb(50, 50, 50)')),
-                        # font = {'size' : 11},
-                        paper_bgcolor= '#F0F0F0',
-                        plot_bgcolor = '#F0F0F0',
-                        margin =  dict(t =  .25, b =  .25,l =  .25, r =  .25),
-                        hoverlabel = dict(bgcolor =  'black', font = {'color': 'white'}), 
-                        scene= dict(aspectmode = "cube",
+#----------------CONFIGURING THE INITAL 3D PLOT--------------------------------
+def initial_figure():
+    """
+    The figure before the first update, as plain plotly JSON (the traces are filled in the browser, see
+    assets/2_figure.js). Built with the layout, on the first request
+    """
+    # traces is a list of traces objects. Each trace correspond to a set of data in our plot. We have 3 sets of data
+    # (1) solvents, (2) the virtual solute and (3) the highlighted solvents
+    traces = [solvents_trace(df),
+              dict(type = 'scatter3d', x = [], y = [], z =[], mode='markers',
+                   marker=dict(color = 'black',symbol = 'circle', opacity = 1, size = 6),\
+                   text = ['Your solute'],\
+                   hovertemplate = '<b>%{text}</b><br><br>' +\
+                                   'dD = %{x:.2f}<br>dP = %{y:.2f}<br>dH = %{z:.2f} <extra></extra>'),
+              dict(type = 'scatter3d', x = [], y = [], z =[], mode='markers',
+                   marker=dict(color = 'red', size = 10, symbol = 'circle-open', opacity=1.0,\
+                               line = dict(color = 'red', width = 4)),\
+                   hoverinfo = 'skip')]
+    plot_layout = dict(title = dict(text = "<b>Hansen Space</b><br>Solute's HSP: dD = " + f2s(0) + '  dP = ' + f2s(0) + '  dH = ' + f2s(0),\
+                                    y = 0.9, x = 0.5, xanchor = 'center', yanchor = 'top',\
+                                    font  = dict(size = 16, family = 'Arial', color = 'rgb(50, 50, 50)')),
+                       # font = {'size' : 11},
+                       paper_bgcolor= '#F0F0F0',
+                       plot_bgcolor = '#F0F0F0',
+                       margin =  dict(t =  .25, b =  .25,l =  .25, r =  .25),
+                       hoverlabel = dict(bgcolor =  'black', font = {'color': 'white'}), 
+                       scene= dict(aspectmode = "cube",
 #                               aspectratio = {'x' : 1, 'y' : 2, 'z' : 2},
-                               xaxis = dict(title = 'Dispersion dD (MPa)<sup>1/2</sup>', **axis_template),
-                               yaxis = dict(title =  'Polarity dP (MPa)<sup>1/2</sup>', **axis_template ),
-                               zaxis = dict(title = 'Hydrogen bonding dH (MPa)<sup>1/2</sup>', **axis_template),
-                               camera = {"eye": {"x": 1.5, "y": 1.5, "z": 0.1}}
-                               ),
-                        showlegend = False,
-                        clickmode =  'event+select',
-                        autosize = True)
-
-# Some of the callbacks will not exist at the beginning of the page.... check on that.
-app.config['suppress_callback_exceptions'] = True
+                              xaxis = dict(title = dict(text = 'Dispersion dD (MPa)<sup>1/2</sup>'), **axis_template),
+                              yaxis = dict(title =  dict(text = 'Polarity dP (MPa)<sup>1/2</sup>'), **axis_template ),
+                              zaxis = dict(title = dict(text = 'Hydrogen bonding dH (MPa)<sup>1/2</sup>'), **axis_template),
+                              camera = {"eye": {"x": 1.5, "y": 1.5, "z": 0.1}}
+                              ),
+                       showlegend = False,
+                       clickmode =  'event+select',
+                       autosize = True)
+    return {"data" : traces, "layout" : plot_layout}
 
 ## Google analytics line and Matomo code
-app.index_string = """<!DOCTYPE html>
+INDEX_STRING = """<!DOCTYPE html>
 <html>
     <head>
         <!-- Global site tag (gtag.js) - Google Analytics -->
@@ -167,7 +237,8 @@ INTRO_TEXT = [html.Summary(id = 'title-how-it-works', children = html.B('How it
                               ' to the solute in the Hansen space, i.e. by their similarity in solubility capacity. You can alternatively rank the solvents according to their composite sustainability score (G, a higher value represents a more sustainable alternative), boiling point (bp), viscosity (η), or surface tension (𝜎).']),\
                   html.P(dcc.Markdown('By selecting a solvent in the **Hansen space** or the **Solvent Ranking Table** you get information regarding chemical structure, physical properties, and sustainability indicators.')),\
                   html.P(dcc.Markdown('In the left panel, click **Refinement options** to define the range for G, bp, η, and 𝜎. Click **Update**.')),\
-                  html.P(dcc.Markdown('Click **Quick path** for a sequential path to greener functional solvents. Starting from the HSP of your solute, each iteration finds the next nearest solvent with a higher G than the previous.'))]
+                  html.P(dcc.Markdown('Click **Quick path** for a sequential path to greener functional solvents. Starting from the HSP of your solute, each iteration finds the next nearest solvent with a higher G than the previous.')),\
+                  html.P(dcc.Markdown('Click **Pareto front** to highlight all the solvents for which no other solvent is both closer to your solute and greener (optionally, also with a lower bp and/or η).'))]
 
 REFERENCES_TEXT0 = ['Hansen solubility ', html.A('theory and parameters', href = 'https://www.stevenabbott.co.uk/practical-solubility/hsp-basics.php', target='_blank'), ' (Last accessed: 2018-10-22)', \
                      html.Br(),\
@@ -180,262 +251,315 @@ REFERENCES_TEXT1 = ["Viscosities and surface tensions are given at a temperature
                      'Made by the ', html.A('Organic Photonics and Electronics Group (OPEG)', href = 'http://www.opeg-umu.se/', target='_blank')] 
 
 
-app.layout = html.Div([html.Div(className = 'row header-container',  children = [
-       html.A(html.Img(src = r'\static\dash-logo.png',\
-                alt = 'plotly-logo',id = 'logo'), href  = 'https://plotly.com/dash/', target='_blank', style = {'height' : 'auto', 'max-width' : '100%'}),
-       html.H4('Green Solvent Selection Tool',
-                         id = 'header-title'),
-       html.A(html.Img(src = r'\static\opeg-logo.png',\
-                alt = 'opeg-logo',\
-                    title = 'Organic Electronics and Photonics Group',
-                    id = 'opeg-logo'), href = 'http://www.opeg-umu.se/', target='_blank', style = {'height' : 'auto', 'max-width' : '100%'})          
-       ]),
-       html.Div(className = 'row main-content',  children = [
-        #---------- First column where the input options go-----------
-        html.Div(className = 'column left', children = [
-                        html.Div(id = 'radiobutton-div', className ='container', children = [
-                            dcc.RadioItems(
-                                    id = 'radiobutton-route',
-                                    options=[
-                                        {'label': 'Known functional solvent(s) of your solute', 'value': 1},
-                                        {'label': 'Known HSP of your solute', 'value': 0}
-                                    ],
-                                    value = 1,
-                                    style = {'margin-bottom' : '10px'}),                              
-                            html.Div(id = 'solvent-list-div', hidden = False, children = [
-                                dcc.Dropdown(
-                                    id='solvent-list',
-                                    options=[{'label': name, 'value': i, 'title' : f'CAS: {cas}'} for name,i, cas in zip(df['Solvent Name'],df.index, df['CAS Number'])],
-                                    value = [],
-                                    placeholder = "Choose a solvent...",
-                                    multi = True,
-                                )] 
-                           ),
-                            html.Div(id = 'hansen-div', hidden = True, children = [
-                                    html.Div(style = {'width': 'max-content','text-align' : 'right', 'margin': '0 auto'},\
-                                             children = [
-                                    html.P(['Dispersion:  ',
-                                        dcc.Input(
-                                            id = "dD-input",
-                                            name = 'dD',
-                                            type = 'number',
-                                            placeholder="dD",
-                                            style = {'width' : '80px'},
-                                        ), ' (MPa)', html.Sup('1/2')]),
-                
-                                    html.P(['Polarity: ',
-                                        dcc.Input(
-                                            id = "dP-input",
-                                            type = 'number',
-                                            placeholder="dP",
-                                            style = {'width' : '80px'},
-                                        ), ' (MPa)', html.Sup('1/2')]),
-                                    html.P(['H bonding:  ',
-                                        dcc.Input(
-                                            id = "dH-input",
-                                            type = 'number',
-                                            placeholder="dH",
-                                            style = {'width' : '80px'},
-                                        ), ' (MPa)', html.Sup('1/2')
-                                    ])
-                                ])
-                            ]),                            
-                        ]),
-                        html.Div(id = 'buttons-div', className  = 'buttons-container', children = [
-                            html.Button('UPDATE',
-                                        id='button-update',
-                                        title = 'Click here to update the plot and table',
-                                        n_clicks = 0,
-                                        n_clicks_timestamp = -1),
-                            html.Button('RESET',
-                                        id='button-reset',
-                                        title = 'Click here to Reset the app',
-                                        n_clicks = 0,
-                                        n_clicks_timestamp = -2),
-                            html.Button('QUICK PATH',
-                                                id='button-path',
-                                                title = 'Click to view a quick path to a green solvent',
-                                                n_clicks = 0,
-                                                n_clicks_timestamp = -1),
-                            html.P('', id = 'error-path')                                        
-                           ]),          
-
-                        html.Div(id = 'filters-table-div', children = [
-                            html.Details(id = 'filters-details', className = 'container',\
-                                title = 'Click here to open/close', children = [
-                                html.Summary(id = 'refinement-options', children = html.B('Refinement options (click to open)')),
-                                html.Div( children = [
-                                html.Div(id = 'greenness-div',className = 'filters-type', children = [
-                                html.P(['Set lower limit for G, G > ',\
-                                        html.Span(id = 'greenness-indicator', children = '0')]),  
-
-                                    dcc.Slider(
-                                        id = 'greenness-filter',
-                                        min = 0,
-                                        max = 8,
-                                        updatemode='drag',                                        
-                                        value = 0,
-                                        step = 1,
-                                        marks = dict((i, str(i)) for i in range(0,9,4)),
-                                        )
-                                ]),
-                                html.Div(id = 'div-temperature-range',className = 'filters-type', children = [
-                                    html.P(['Set range for boiling point, ', 
-                                            html.Span(id='output-temperature-slider')]),
-                                    dcc.RangeSlider(
-                                        id='temperatures-range-slider',
-                                        min = TEMPERATURE_RANGE[0],
-                                        max = TEMPERATURE_RANGE[1],
-                                        step = 5,
-                                        updatemode='drag',
-                                        value = TEMPERATURE_RANGE,
-                                        marks={
-                                            0: {'label': '0°C', 'style': {'color': '#77b0b1'}},
-                                            100: {'label': '100°C', 'style': {'color': '#f50'}}},
-                                        pushable = 25
-                                    )]
-                               ),
-                                html.Div(id = 'div-viscosity-range',className = 'filters-type', children = [
-                                    html.P(['Set range for viscosity, ', html.Span(id='output-viscosity-slider')]),
-                                    dcc.RangeSlider(
-                                        # I need to make a non-linear slider due to the big range of values... (might be that some are wrong though)
-                                        id='viscosity-slider',
-                                        min = VISCOSITY_RANGE[0],
-                                        max = VISCOSITY_RANGE[1],
-                                        step = 0.1,
-                                        updatemode='drag',
-                                        value = [value for value in VISCOSITY_RANGE],
-                                        marks = {value : f'{10**value:.1f}' for value in VISCOSITY_RANGE},
-                                        pushable = 0.5
-                                    )]
-                               ),
-                                html.Div(id = 'div-surface-tension-range',className = 'filters-type', children = [
-                                    html.P(['Set range for surface tension ', html.Span(id='output-surface-tension-slider')]),
-                                    dcc.RangeSlider(
-                                        id='surface-tension-slider',
-                                        min = SURFACE_TENSION_RANGE[0],
-                                        max = SURFACE_TENSION_RANGE[1],
-                                        step = 5,
-                                        updatemode='drag',
-                                        value = SURFACE_TENSION_RANGE,
-                                        marks = {value : f'{value}' for value in SURFACE_TENSION_RANGE},
-                                        pushable = 5
-                                    )]
-                               ),
-                                html.Div(id = 'distance-div',className = 'filters-type', children = [                                    
-                                html.P('Select number of closest solvents:', id = 'distance-filter-text'),  
-
-                                    dcc.Slider(
-                                        id = 'distance-filter',
-                                        min = 5,
-                                        max = N_SOLVENTS,
-                                        value = N_SOLVENTS,
-                                        updatemode='drag',                                        
-                                        step = None,
-                                        marks = {5: '5', 10 : '10', 25: '25', 50: '50', 100 : '100', N_SOLVENTS : 'all'}
-                                        )
-                                ]),                                 
-                               html.Div(id = 'div-hazard-list',className = 'filters-type', children = [
-                               html.P('Exclude solvents by hazard label(s)'),
+@lru_cache(maxsize = 1)
+def create_layout():
+    """The layout of the app. Dash asks for it on every page load, it is built only on the first one"""
+    return html.Div([html.Div(className = 'row header-container',  children = [
+           html.A(html.Img(src = static_assets().url('dash-logo.png'),\
+                    alt = 'plotly-logo',id = 'logo'), href  = 'https://plotly.com/dash/', target='_blank', style = {'height' : 'auto', 'max-width' : '100%'}),
+           html.H4('Green Solvent Selection Tool',
+                             id = 'header-title'),
+           html.A(html.Img(src = static_assets().url('opeg-logo.png'),\
+                    alt = 'opeg-logo',\
+                        title = 'Organic Electronics and Photonics Group',
+                        id = 'opeg-logo'), href = 'http://www.opeg-umu.se/', target='_blank', style = {'height' : 'auto', 'max-width' : '100%'})          
+           ]),
+           html.Div(className = 'row main-content',  children = [
+            #---------- First column where the input options go-----------
+            html.Div(className = 'column left', children = [
+                            html.Div(id = 'radiobutton-div', className ='container', children = [
+                                dcc.RadioItems(
+                                        id = 'radiobutton-route',
+                                        options=[
+                                            {'label': 'Known functional solvent(s) of your solute', 'value': 1},
+                                            {'label': 'Known HSP of your solute', 'value': 0}
+                                        ],
+                                        value = 1,
+                                        style = {'margin-bottom' : '10px'}),                              
+                                html.Div(id = 'solvent-list-div', hidden = False, children = [
                                     dcc.Dropdown(
-                                        id = 'hazard-list',
-                                        options=[{'label': label + f': {text}', 'value': label} for text, label in zip(df2['Fulltext'][2:48],df2.index[2:48])],
+                                        id='solvent-list',
+                                        options=[{'label': name, 'value': i, 'title' : f'CAS: {cas}'} for name,i, cas in zip(df['Solvent Name'],df.index, df['CAS Number'])],
                                         value = [],
-                                        placeholder = "Hazards to exclude...",
+                                        placeholder = "Choose a solvent...",
                                         multi = True,
-                                        style = {'text-align' : 'left'}),
-                                ]),
-                                html.Div(id = 'checklist-div', className = 'filters-type',  children = [                                
-                               html.P(html.Span('Set subcategories for G calculation', className = 'hover-span', title = 'Uncheck the categories to be excluded from the G calculation')),
-                               html.Div(style = {'text-align' : 'left'} , children = [
-                                    html.P(html.Em('Waste')),
-                                    dcc.Checklist(id = 'checklist-waste',
-                                                  options = [{'label': name, 'value': name} for name in WASTE],
-                                                  value = WASTE,
-                                                  labelStyle={'display': 'inline-block', 'width' : '50%'}
-                                                  ),
-                                    html.P(html.Em('Health')),
-                                    dcc.Checklist(id = 'checklist-health',
-                                                  options = [{'label': name, 'value': name} for name in HEALTH],
-                                                  value = HEALTH,
-                                                  labelStyle={'display': 'inline-block', 'width' : '50%'}
-                                                  ),
-                                    html.P(html.Em('Environment')),              
-                                    dcc.Checklist(id = 'checklist-environment',
-                                                  options = [{'label': name, 'value': name} for name in ENVIRONMENT],
-                                                  value = ENVIRONMENT,
-                                                  labelStyle={'display': 'inline-block', 'width' : '50%'}
-                                                  ),
-                                    html.P(html.Em('Safety')),  
-                                    dcc.Checklist(id = 'checklist-safety',
-                                                  options = [{'label': name, 'value': name} for name in SAFETY],
-                                                  value = SAFETY,
-                                                  labelStyle={'display': 'inline-block', 'width' : '50%'}
-                                                  )
+                                    )] 
+                               ),
+                                html.Div(id = 'hansen-div', hidden = True, children = [
+                                        html.Div(style = {'width': 'max-content','text-align' : 'right', 'margin': '0 auto'},\
+                                                 children = [
+                                        html.P(['Dispersion:  ',
+                                            dcc.Input(
+                                                id = "dD-input",
+                                                name = 'dD',
+                                                type = 'number',
+                                                placeholder="dD",
+                                                style = {'width' : '80px'},
+                                            ), ' (MPa)', html.Sup('1/2')]),
+                
+                                        html.P(['Polarity: ',
+                                            dcc.Input(
+                                                id = "dP-input",
+                                                type = 'number',
+                                                placeholder="dP",
+                                                style = {'width' : '80px'},
+                                            ), ' (MPa)', html.Sup('1/2')]),
+                                        html.P(['H bonding:  ',
+                                            dcc.Input(
+                                                id = "dH-input",
+                                                type = 'number',
+                                                placeholder="dH",
+                                                style = {'width' : '80px'},
+                                            ), ' (MPa)', html.Sup('1/2')
                                         ])
-                                    ]),
-                                ])
+                                    ])
+                                ]),                            
                             ]),
+                            html.Div(id = 'buttons-div', className  = 'buttons-container', children = [
+                                html.Button('UPDATE',
+                                            id='button-update',
+                                            title = 'Click here to update the plot and table',
+                                            n_clicks = 0,
+                                            n_clicks_timestamp = -1),
+                                html.Button('RESET',
+                                            id='button-reset',
+                                            title = 'Click here to Reset the app',
+                                            n_clicks = 0,
+                                            n_clicks_timestamp = -2),
+                                html.Button('QUICK PATH',
+                                                    id='button-path',
+                                                    title = 'Click to view a quick path to a green solvent',
+                                                    n_clicks = 0,
+                                                    n_clicks_timestamp = -1),
+                                html.Button('PARETO FRONT',
+                                                    id='button-pareto',
+                                                    title = 'Click to view the solvents for which no other one is both closer and greener',
+                                                    n_clicks = 0,
+                                                    n_clicks_timestamp = -1),
+                                dcc.Checklist(id = 'pareto-objectives',
+                                              options = [{'label' : ' Also low bp', 'value' : 'Boiling Point (°C)'},
+                                                         {'label' : ' Also low η', 'value' : 'Viscosity (mPa.s)'}],
+                                              value = [],
+                                              labelStyle = {'display': 'inline-block', 'margin' : '0 5px'}),
+                                html.P('', id = 'error-path')                                        
+                               ]),          
+
+                            html.Div(id = 'filters-table-div', children = [
+                                html.Details(id = 'filters-details', className = 'container',\
+                                    title = 'Click here to open/close', children = [
+                                    html.Summary(id = 'refinement-options', children = html.B('Refinement options (click to open)')),
+                                    html.Div( children = [
+                                    html.Div(id = 'greenness-div',className = 'filters-type', children = [
+                                    html.P(['Set lower limit for G, G > ',\
+                                            html.Span(id = 'greenness-indicator', children = '0')]),  
+
+                                        dcc.Slider(
+                                            id = 'greenness-filter',
+                                            min = 0,
+                                            max = 8,
+                                            updatemode='drag',                                        
+                                            value = 0,
+                                            step = 1,
+                                            marks = dict((i, str(i)) for i in range(0,9,4)),
+                                            )
+                                    ]),
+                                    html.Div(id = 'div-temperature-range',className = 'filters-type', children = [
+                                        html.P(['Set range for boiling point, ', 
+                                                html.Span(id='output-temperature-slider')]),
+                                        dcc.RangeSlider(
+                                            id='temperatures-range-slider',
+                                            min = TEMPERATURE_RANGE[0],
+                                            max = TEMPERATURE_RANGE[1],
+                                            step = 5,
+                                            updatemode='drag',
+                                            value = TEMPERATURE_RANGE,
+                                            marks={
+                                                0: {'label': '0°C', 'style': {'color': '#77b0b1'}},
+                                                100: {'label': '100°C', 'style': {'color': '#f50'}}},
+                                            pushable = 25
+                                        )]
+                                   ),
+                                    html.Div(id = 'div-viscosity-range',className = 'filters-type', children = [
+                                        html.P(['Set range for viscosity, ', html.Span(id='output-viscosity-slider')]),
+                                        dcc.RangeSlider(
+                                            # I need to make a non-linear slider due to the big range of values... (might be that some are wrong though)
+                                            id='viscosity-slider',
+                                            min = VISCOSITY_RANGE[0],
+                                            max = VISCOSITY_RANGE[1],
+                                            step = 0.1,
+                                            updatemode='drag',
+                                            value = [value for value in VISCOSITY_RANGE],
+                                            marks = {value : f'{10**value:.1f}' for value in VISCOSITY_RANGE},
+                                            pushable = 0.5
+                                        )]
+                                   ),
+                                    html.Div(id = 'div-surface-tension-range',className = 'filters-type', children = [
+                                        html.P(['Set range for surface tension ', html.Span(id='output-surface-tension-slider')]),
+                                        dcc.RangeSlider(
+                                            id='surface-tension-slider',
+                                            min = SURFACE_TENSION_RANGE[0],
+                                            max = SURFACE_TENSION_RANGE[1],
+                                            step = 5,
+                                            updatemode='drag',
+                                            value = SURFACE_TENSION_RANGE,
+                                            marks = {value : f'{value}' for value in SURFACE_TENSION_RANGE},
+                                            pushable = 5
+                                        )]
+                                   ),
+                                    html.Div(id = 'distance-div',className = 'filters-type', children = [                                    
+                                    html.P('Select number of closest solvents:', id = 'distance-filter-text'),  
+
+                                        dcc.Slider(
+                                            id = 'distance-filter',
+                                            min = 5,
+                                            max = N_SOLVENTS,
+                                            value = N_SOLVENTS,
+                                            updatemode='drag',                                        
+                                            step = None,
+                                            marks = {5: '5', 10 : '10', 25: '25', 50: '50', 100 : '100', N_SOLVENTS : 'all'}
+                                            )
+                                    ]),                                 
+                                   html.Div(id = 'div-hazard-list',className = 'filters-type', children = [
+                                   html.P('Exclude solvents by hazard label(s)'),
+                                        dcc.Dropdown(
+                                            id = 'hazard-list',
+                                            options=[{'label': label + f': {text}', 'value': label} for text, label in zip(df2['Fulltext'][2:48],df2.index[2:48])],
+                                            value = [],
+                                            placeholder = "Hazards to exclude...",
+                                            multi = True,
+                                            style = {'text-align' : 'left'}),
+                                    ]),
+                                    html.Div(id = 'checklist-div', className = 'filters-type',  children = [                                
+                                   html.P(html.Span('Set subcategories for G calculation', className = 'hover-span', title = 'Uncheck the categories to be excluded from the G calculation')),
+                                   html.Div(style = {'text-align' : 'left'} , children = [
+                                        html.P(html.Em('Waste')),
+                                        dcc.Checklist(id = 'checklist-waste',
+                                                      options = [{'label': name, 'value': name} for name in WASTE],
+                                                      value = WASTE,
+                                                      labelStyle={'display': 'inline-block', 'width' : '50%'}
+                                                      ),
+                                        html.P(html.Em('Health')),
+                                        dcc.Checklist(id = 'checklist-health',
+                                                      options = [{'label': name, 'value': name} for name in HEALTH],
+                                                      value = HEALTH,
+                                                      labelStyle={'display': 'inline-block', 'width' : '50%'}
+                                                      ),
+                                        html.P(html.Em('Environment')),              
+                                        dcc.Checklist(id = 'checklist-environment',
+                                                      options = [{'label': name, 'value': name} for name in ENVIRONMENT],
+                                                      value = ENVIRONMENT,
+                                                      labelStyle={'display': 'inline-block', 'width' : '50%'}
+                                                      ),
+                                        html.P(html.Em('Safety')),  
+                                        dcc.Checklist(id = 'checklist-safety',
+                                                      options = [{'label': name, 'value': name} for name in SAFETY],
+                                                      value = SAFETY,
+                                                      labelStyle={'display': 'inline-block', 'width' : '50%'}
+                                                      )
+                                            ])
+                                        ]),
+                                    ])
+                                ]),
                         
-            html.Div(id = 'table-div', children = [
-                html.H5('Solvent Ranking Table', id = 'title-table', style = {'text-align' : 'left'}),
-                dash_table.DataTable(
-                    id='table',
-                    columns = TABLE_DCC, # defined at the beginning,
-                    data = df[list(TABLE_COLUMNS.values())].to_dict('records'),
-        #            fixed_rows = { 'headers': True, 'data': 0},
-                    style_as_list_view = True,
-                    row_selectable = 'single',
-                    selected_rows = [],
-                    sort_by = [],
-                    sort_mode = 'single',
-                    sort_action='native',
-                    style_cell_conditional=[
-                    {'if': {'column_id': 'Solvent Name'},
-                        'textAlign': 'left', 'maxWidth': '150px', 'minWidth': '50px'},
-                    {'if': {'column_id': 'Boiling Point (°C)'}, 'width': '30px', 'maxWidth': '30px', 'minWidth': '30px'}
-                    ],
-                    style_table= dict(#overflowY = 'scroll',
-                                 # overflowX = 'auto',
-                                 # height = '30vh',
-                                 width = '100%',
-                                 border = 'thin lightgrey solid'),
-                    style_cell = {'minWidth': '40px', 'width': '40px','maxWidth': '40px', 'text-align':'center','textOverflow': 'ellipsis', 'vertical-align': 'top'},
-                    style_header= {'whiteSpace' : 'normal', 'fontWeight': 'bold', 'textOverflow': 'ellipsis'}
+                html.Div(id = 'table-div', children = [
+                    html.H5('Solvent Ranking Table', id = 'title-table', style = {'text-align' : 'left'}),
+                    # The whole ranking, as sorted in the table (see update_export_link)
+                    html.A('Download the ranking (CSV)', id = 'export-link', href = '', target = '_blank', style = {'float' : 'right'}),
+                    dash_table.DataTable(
+                        id='table',
+                        columns = TABLE_DCC, # defined at the beginning,
+                        data = [], # Only the page shown, sent by update_table
+            #            fixed_rows = { 'headers': True, 'data': 0},
+                        style_as_list_view = True,
+                        row_selectable = 'single',
+                        selected_rows = [],
+                        # The rows are paginated and sorted in the server (see RankedTable)
+                        page_action = 'custom',
+                        page_current = 0,
+                        page_size = PAGE_SIZE,
+                        page_count = 1,
+                        sort_by = [],
+                        sort_mode = 'single',
+                        sort_action = 'custom',
+                        style_cell_conditional=[
+                        {'if': {'column_id': 'Solvent Name'},
+                            'textAlign': 'left', 'maxWidth': '150px', 'minWidth': '50px'},
+                        {'if': {'column_id': 'Boiling Point (°C)'}, 'width': '30px', 'maxWidth': '30px', 'minWidth': '30px'}
+                        ],
+                        style_table= dict(#overflowY = 'scroll',
+                                     # overflowX = 'auto',
+                                     # height = '30vh',
+                                     width = '100%',
+                                     border = 'thin lightgrey solid'),
+                        style_cell = {'minWidth': '40px', 'width': '40px','maxWidth': '40px', 'text-align':'center','textOverflow': 'ellipsis', 'vertical-align': 'top'},
+                        style_header= {'whiteSpace' : 'normal', 'fontWeight': 'bold', 'textOverflow': 'ellipsis'}
                     
-                    )
-                ])
-            ])                          
-                    ]),
-        #----------- Second column, where the plot goes ----------------
-        html.Div(className = 'column middle', children = [         
-          # html.Div(id = 'div-fig', children = [
-                dcc.Graph(id='main-plot', 
-                      figure= { "data": traces,
-                                "layout": plot_layout,
-                                },
-                      config={'editable' : False},
-                      responsive = True,
-                      # style = { 'vertical-align': 'top', 'width' : '35vw'}
-                      )
-                # ], style = {}),
-        ]),
-        #----------- Third column, where the info goes (how it works + solvent info) ------------------------
-        html.Div(id = 'column-right-div',className = 'column right', children = [
-            html.Div(id = 'intro-div', className = 'container', children = 
-                    html.Details(INTRO_TEXT,\
-                                 id = 'details-how-it-works')
-                    ),
-            html.Div(id = 'report', className = 'container', children = create_report()),
+                        )
+                    ])
+                ])                          
+                        ]),
+            #----------- Second column, where the plot goes ----------------
+            html.Div(className = 'column middle', children = [         
+              # html.Div(id = 'div-fig', children = [
+                    dcc.Graph(id='main-plot', 
+                          figure = initial_figure(),
+                          config={'editable' : False},
+                          responsive = True,
+                          # style = { 'vertical-align': 'top', 'width' : '35vw'}
+                          ),
+                    # Static data of all the solvents (sent only once) and the changes of the figure on each request
+                    dcc.Store(id = 'solvents-data', data = solvents_data()),
+                    dcc.Store(id = 'plot-update'),
+                    # The query of the ranking shown in the table (see ranked_table)
+                    dcc.Store(id = 'table-query'),
+                    # The quick path or Pareto front computed in the background, and the polling until it is ready
+                    dcc.Store(id = 'selection-job'),
+                    dcc.Interval(id = 'job-interval', interval = JOB_POLL_INTERVAL, disabled = True)
+                    # ], style = {}),
+            ]),
+            #----------- Third column, where the info goes (how it works + solvent info) ------------------------
+            html.Div(id = 'column-right-div',className = 'column right', children = [
+                html.Div(id = 'intro-div', className = 'container', children = 
+                        html.Details(INTRO_TEXT,\
+                                     id = 'details-how-it-works')
+                        ),
+                html.Div(id = 'report', className = 'container', children = create_report()),
+            ]),
+
         ]),
+        html.Div([html.Div('Sources', className = 'footer-col',\
+                                   style = {'font-size' : '3vmin','width' : 'min-content','max-width' : '20%'}),\
+                   html.Div(REFERENCES_TEXT0, className = 'footer-col', style = {'max-width' : '50%'}),\
+                   html.Div(REFERENCES_TEXT1, className = 'footer-col', style = {'max-width' : '25%'})],\
+                      className = 'row sources-container')
+    ])
+
 
-    ]),
-    html.Div([html.Div('Sources', className = 'footer-col',\
-                               style = {'font-size' : '3vmin','width' : 'min-content','max-width' : '20%'}),\
-               html.Div(REFERENCES_TEXT0, className = 'footer-col', style = {'max-width' : '50%'}),\
-               html.Div(REFERENCES_TEXT1, className = 'footer-col', style = {'max-width' : '25%'})],\
-                  className = 'row sources-container')
-])
+def warm_up():
+    """
+    Builds what is otherwise deferred to the first requests: the layout (and the figure), the static images,
+    the tables derived from the data, the spatial index and the GHS html of all the reports. E.g. in the
+    gunicorn master, before forking the workers (see gunicorn.conf.py)
+    """
+    create_layout()
+    static_assets()
+    score_cube()
+    solvents_catalog()
+    solvents_index()
+    precompute_ghs_html(df)
+
+# The callbacks of the app, as (dependencies, function), registered on each app made by create_app
+CALLBACKS = []
+
+def callback(*dependencies):
+    """As dash.Dash.callback, but the function is only added to CALLBACKS, so it can be registered on any app (see create_app)"""
+    def add(function):
+        CALLBACKS.append((dependencies, function))
+        return function
+    return add
+
+# The routes of the server (the API and the images), registered on each app made by create_app
+routes = flask.Blueprint('routes', __name__)
 
 # Updates the height o fthe info container based on the Details tabe is open or not
 # @app.callback(Output('report', 'style'),
@@ -448,21 +572,21 @@ app.layout = html.Div([html.Div(className = 'row header-container',  children =
 #         return  {'overflow-y': 'auto', 'height' : 'auto', 'max-height' : '80vh'}
 
 # Updates the  information on the temperature filter
-@app.callback(
+@callback(
     dash.dependencies.Output('output-temperature-slider', 'children'),
     [dash.dependencies.Input('temperatures-range-slider', 'value')])
 def update_temperature_output(value):
     return '{}-{} °C'.format(*value)
 
 # Updates the  information on the surface tension filter 
-@app.callback(
+@callback(
     dash.dependencies.Output('output-surface-tension-slider', 'children'),
     [dash.dependencies.Input('surface-tension-slider', 'value')])
 def update_surface_tension_output(value):
     return '{:.0f}-{:.0f} mN/m'.format(*value)
 
 # Updates the  information on the viscosity filter 
-@app.callback(
+@callback(
     dash.dependencies.Output('output-viscosity-slider', 'children'),
     [dash.dependencies.Input('viscosity-slider', 'value')])
 def update_viscosity_output(value):
@@ -482,7 +606,7 @@ def update_viscosity_output(value):
     # return [' '] + number2scientific(10**value[0]) + ['-'] + number2scientific(10**value[1]) + [' mPa∙s']
 
 # Selector of the method to choose your solute parameters, hides/shows the Input
-@app.callback([Output('hansen-div', 'hidden'),
+@callback([Output('hansen-div', 'hidden'),
                Output('solvent-list-div', 'hidden')],
             [Input('radiobutton-route', 'value')])
 def show_input_method(method):
@@ -492,51 +616,71 @@ def show_input_method(method):
         return False, True 
 
 # Creates the report of the selected solvent
-@app.callback(Output('report', 'children'),
-             [Input('table','selected_rows')],
-             [State('table','data'),
-              State('table','columns'),
-              State('checklist-waste', 'value'),
+@callback(Output('report', 'children'),
+             [Input('table','selected_row_ids')],
+             [State('checklist-waste', 'value'),
               State('checklist-health', 'value'),
               State('checklist-environment', 'value'),
               State('checklist-safety', 'value')])
-def update_report(selected_row, data, columns, waste, health, environment, safety):
-    if selected_row == []:
+def update_report(selected_row_ids, waste, health, environment, safety):
+    if not selected_row_ids:
         # No solvent selected, emty report
         return create_report()
     else:
-        # I first take the name of the selected Solvent (only one is allowed to be selected)
-        n = selected_row[0]
-        name_solvent = data[n]['Solvent Name'] # Selecet the name of the solvent from the key:" Solvent name"
+        # The row id of the selected solvent (only one is allowed to be selected) is its position in df
+        name_solvent = df.index[selected_row_ids[0]]
         
-        return create_report(df.loc[name_solvent], [waste, health, environment, safety])
+        return solvent_report(name_solvent, canonical_scores([waste, health, environment, safety]))
+
+@lru_cache(maxsize = REPORT_CACHE_SIZE)
+def solvent_report(name_solvent, scores):
+    """
+    Report of a solvent, which only depends on the solvent and the selected subcategories, so the last
+    REPORT_CACHE_SIZE reports are kept in memory (see solvent_report.cache_info() for the hits and misses)
+        - name_solvent: the name of the solvent (index of df)
+        - scores: selected subcategories, in its canonical form (see canonical_scores)
+    """
+    scores = [list(category) for category in scores]
+    # The composite score is computed for the selected subcategories, without modifying the global df
+    data = solvent_ranking(df.loc[[name_solvent]], [None] * 3, scores).iloc[0]
+    return create_report(data, scores, static_assets().url('{0:s}.svg'.format(data['CAS Number'])))
     
-# If a solvent is clicked on the graph, it updates selects the same solvent from the table (and therefore, creates a report)
-@app.callback(Output('table', 'selected_rows'),
-              [Input('main-plot', 'clickData')],
-              [State('table', 'data')])
-def update_selected_solvent(clicked_data, data):
+def clicked_solvent(clicked_data):
+    """
+    Row id (position in df) of the solvent clicked in the figure, the last element of its customdata
+    (see solvents_trace), or None if nothing or the solute (which has no customdata) was clicked
+    """
     if clicked_data is None:
-        selected_rows = []
-    else:
-        solvent_selected = clicked_data['points'][0]['text']
-        if solvent_selected == 'Your solute':
-            selected_rows = []
-        else:
-            for i,solvent in enumerate(data):
-                if solvent['Solvent Name'] == solvent_selected: break
-            selected_rows = [i]
-    return selected_rows
+        return None
+    customdata = clicked_data['points'][0].get('customdata')
+    return int(customdata[-1]) if customdata else None
+
+# If a solvent is clicked on the graph, the table goes to the page with the solvent (which update_table selects,
+# and therefore, creates a report). A new ranking starts on the first page
+@callback(Output('table', 'page_current'),
+              [Input('main-plot', 'clickData'),
+               Input('table-query', 'data')],
+              [State('table', 'sort_by'),
+               State('table', 'page_size')])
+def update_selected_solvent(clicked_data, query, sort_by, page_size):
+    triggered = [item['prop_id'] for item in dash.callback_context.triggered]
+    if query is None or 'table-query.data' in triggered:
+        return 0
+    # The page is found from the row id of the clicked point, with the order of the ranking, without scanning its rows
+    location = ranked_table(query).locate(clicked_solvent(clicked_data), page_size, sort_by)
+    if location is None:
+        raise PreventUpdate # Not in the table
+    return location[0]
 
 # updates text from the greeness filter
-@app.callback(Output('greenness-indicator', 'children'),
+@callback(Output('greenness-indicator', 'children'),
              [Input('greenness-filter','value')])
 def update_GSK_filter(value):
     return f'{value:d}'
 
 
 
-@app.callback(Output('refinement-options', 'children'),
+@callback(Output('refinement-options', 'children'),
               [Input('refinement-options', 'n_clicks')])
 def change_text_refinement(n):
     children = html.B('Refinement options (click to open)')
@@ -548,7 +692,7 @@ def change_text_refinement(n):
     
     return children
 
-@app.callback(Output('title-how-it-works', 'children'),
+@callback(Output('title-how-it-works', 'children'),
               [Input('title-how-it-works', 'n_clicks')])
 def change_text_intro(n):
     children = html.B('How it works? (Click to open)')
@@ -566,9 +710,146 @@ def change_text_intro(n):
 # def update_distance_filter(value):
 #     return 'Select number of closest solvents:'
 
+# The solvents shown for a request (the traces of the figure and the rows of the table)
+Selection = namedtuple('Selection', ['ranked', 'trace', 'table', 'highlight', 'path'])
+
+def solvent_selection(mode, solute, scores, greenness, hazard_list, temperature_range, viscosity_range, stension_range,\
+                      ndistance, solvent_list, pareto_objectives):
+    """
+    Ranks the solvents for the solute and selects the ones to show, as the main callback does:
+        - mode: 'update' (Update or Reset), 'path' (Quick path, also before any click) or 'pareto' (Pareto front)
+        - solute: the HSP of the solute [dD, dP, dH], or [None] * 3 if not defined
+        - scores: selected subcategories, one list per scores category
+        - greenness, hazard_list, temperature_range, viscosity_range, stension_range: the filters (see solvents_filter)
+        - ndistance: number of solvents shown
+        - solvent_list: the solvents chosen to approximate the solute
+        - pareto_objectives: the objectives of the Pareto front, besides Ra and G
+    Returns:
+        A Selection with the ranked DataFrame and the solvents of the main trace (None if it is kept as it is),
+        of the table (sorted by Ra, at most ndistance), highlighted (Pareto front) and of the quick path
+    """
+    # Computes the Ra and the composite score (based on the labels the user selected) for this request only,
+    # the global df is never modified, so concurrent callbacks do not see each other's values
+    dfr = solvent_ranking(df, solute, scores, score_cube())
+    # Now, we create the filters for the data to show (greenness, hazards, bp, viscosity and surface tension)
+    data_filter = solvents_filter(dfr, greenness, hazard_list, temperature_range, viscosity_range, stension_range, solvents_hazards())
+    trace = highlight = path = None
+    
+    if mode == 'update':
+        # Updating hte first trace (main one) by with the data filtered and only the n-first values
+        if None in solute:
+            # No solute yet, so no distance to sort by
+            trace = dfr[data_filter][:ndistance]
+        else:
+            # The n-closest solvents are found with the spatial index, sorted by Ra
+            positions, _ = nearest_solvents(solvents_index(), solute, ndistance, np.asarray(data_filter, dtype = bool))
+            trace = dfr.iloc[positions]
+        # Updating the table based on the filtered data 
+        table = trace
+    elif dfr['Ra'].isnull().all():
+        # The distance has not been defined, so just show the data based on the filters
+        table = dfr[data_filter][:ndistance]
+    elif mode == 'pareto':
+        # The solvents shown are the same as with Update, the front is highlighted
+        positions, _ = nearest_solvents(solvents_index(), solute, ndistance, np.asarray(data_filter, dtype = bool))
+        trace = dfr.iloc[positions]
+        table = highlight = pareto_solvents(dfr[data_filter], ['Ra', 'Composite score'] + list(pareto_objectives or []))
+    else:
+        # Add here the PATH algorithm
+        if len(solvent_list) == 1: solvent = dfr.loc[solvent_list[0]]
+        else: solvent = None
+        table = trace = path = suggested_path(dfr[data_filter], ref_solvent = solvent)
+    
+    # Sorts by the ascending distance in the Hansen space, by default
+    # (stable sort, so the order of the solvents with the same Ra given by the spatial index is kept)
+    table = table[list(TABLE_COLUMNS.values())].sort_values('Ra', ascending= True, inplace = False, kind = 'mergesort')[:ndistance]
+    return Selection(dfr, trace, table, highlight, path)
+
+# The ranking of a request: its table (see RankedTable) and the changes of the figure (see selection_update),
+# with their size in bytes (approximate, for the eviction from the cache)
+Ranking = namedtuple('Ranking', ['table', 'update', 'size'])
+
+def ranking_key(query):
+    """
+    Content address of a request, the hash of its query (the arguments of solvent_selection) in a normalized
+    form, so the same ranking asked in a different way (e.g. the hazards or the subcategories in another
+    order) shares its entry in the cache, and of the version of the data, so the entries stored on disk are
+    not used with another data
+    """
+    solute = tuple(None if x is None else float(x) for x in query['solute'])
+    key = (query['mode'], solute, canonical_scores(query['scores']), float(query['greenness']), tuple(sorted(set(query['hazard_list']))),
+           tuple(map(float, query['temperature_range'])), tuple(map(float, query['viscosity_range'])), tuple(map(float, query['stension_range'])),
+           int(query['ndistance']), tuple(query['solvent_list']), tuple(sorted(query['pareto_objectives'])), DATA_KEY)
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+def ranking(query):
+    """The ranking of a request, from the cache or computed from its query, the arguments of solvent_selection"""
+    key = ranking_key(query)
+    entry = RANKINGS.get(key)
+    if entry is None:
+        selection = solvent_selection(**query)
+        table = RankedTable(selection.table, df.index.get_indexer(selection.table.index))
+        update = {'trace' : None, 'annotations' : None, 'highlight' : None}
+        if selection.trace is not None:
+            update['trace'] = solvents_trace_update(selection.trace, df.index.get_indexer(selection.trace.index),\
+                                                    show_path = selection.path is not None)
+            # The quick path is enumerated, no annotations otherwise
+            update['annotations'] = [] if selection.path is None else create_annotations(selection.path)
+        if selection.highlight is not None:
+            update['highlight'] = [selection.highlight[column].tolist() for column in HANSEN_COORDINATES]
+        size = int(table.table.memory_usage(deep = True).sum()) + table.ids.nbytes + len(json.dumps(update, default = float))
+        entry = Ranking(table, update, size)
+        RANKINGS.put(key, entry)
+    return entry
+
+def ranked_table(query):
+    """
+    The table of a request (see RankedTable), e.g. to serve its pages, also if the request that ranked it was
+    served by another worker (see ranking)
+    """
+    return ranking(query).table
+
+def selection_update(query):
+    """
+    The changes of the figure that depend on the selected solvents (see solvent_selection), whose table is
+    also kept for the pages of the table (see ranking):
+        - query: the arguments of solvent_selection
+    Returns:
+        A dictionary with the main 'trace' and its 'annotations' (None if they are kept as they are), and the
+        solvents to 'highlight' (None to keep the default ones)
+    """
+    return ranking(query).update
+
+def selection_outputs(job, pending):
+    """
+    The outputs of the main callback that depend on the selection, once its job (see selection_update) is finished:
+        - job: the job, None if it has been lost
+        - pending: the 'query' of the selection, the 'figure' update without it and whether a button was 'clicked'
+    Returns:
+        The figure update, the query of the table (no_update if there is no result), the error message, the job
+        still pending (None if it is finished) and whether the browser has to keep polling
+    """
+    figure_update = dict(pending['figure'])
+    if job is not None and job['status'] in ('queued', 'running'):
+        message = 'Computing the quick path...' if pending['query']['mode'] == 'path' else 'Computing the Pareto front...'
+        return figure_update, dash.no_update, message, dict(pending, id = job['id']), True
+    if job is None or job['status'] == 'failed':
+        return figure_update, dash.no_update, 'The computation failed, please try again.', None, False
+    
+    update = job['result']
+    error_path = '' # Error message in the case that we haven't defined the Ra yet
+    if update['trace'] is not None:
+        figure_update.update(trace = update['trace'], annotations = update['annotations'])
+    elif pending['clicked']: # Chekc if it is the first call, so it doens't show the error initially
+        # Update the error message and show the user what she should do
+        error_path = 'First, you MUST define the solute coordinates.'
+    if update['highlight'] is not None:
+        figure_update['highlight'] = update['highlight']
+    return figure_update, pending['query'], error_path, None, False
+
 # Main callaback, which gathers all the info and responds to it
-@app.callback([Output('main-plot', 'figure'),
-               Output('table', 'data'),
+@callback([Output('plot-update', 'data'),
+               Output('table-query', 'data'),
                Output('table', 'sort_by'),
                Output('greenness-filter','value'),
                Output('distance-filter', 'value'),
@@ -586,12 +867,15 @@ def change_text_intro(n):
                Output('dP-input', 'value'),
                Output('dH-input', 'value'),
                Output('error-path', 'children'),
-               Output('main-plot', 'clickData')],
+               Output('main-plot', 'clickData'),
+               Output('selection-job', 'data'),
+               Output('job-interval', 'disabled')],
               [Input('button-update', 'n_clicks_timestamp'),
                Input('button-reset', 'n_clicks_timestamp'),
-               Input('button-path', 'n_clicks_timestamp')],
-              [State('main-plot', 'figure'),
-               State('radiobutton-route', 'value'),
+               Input('button-path', 'n_clicks_timestamp'),
+               Input('button-pareto', 'n_clicks_timestamp'),
+               Input('job-interval', 'n_intervals')],
+              [State('radiobutton-route', 'value'),
                State('dD-input', 'value'),
                State('dP-input', 'value'),
                State('dH-input', 'value'),
@@ -605,10 +889,12 @@ def change_text_intro(n):
                State('checklist-safety', 'value'),
                State('temperatures-range-slider', 'value'),
                State('viscosity-slider', 'value'),
-               State('surface-tension-slider', 'value')])
-def main_plot(update,reset,path, figure,method, dD, dP, dH, greenness, ndistance,\
+               State('surface-tension-slider', 'value'),
+               State('pareto-objectives', 'value'),
+               State('selection-job', 'data')])
+def main_plot(update,reset,path, pareto, n_intervals, method, dD, dP, dH, greenness, ndistance,\
               solvent_list, hazard_list, waste, health, environment, safety,\
-                  temperature_range, viscosity_range, stension_range):
+                  temperature_range, viscosity_range, stension_range, pareto_objectives = [], pending = None):
     # Determine which button has been clicked
     ctx = dash.callback_context
 
@@ -617,6 +903,16 @@ def main_plot(update,reset,path, figure,method, dD, dP, dH, greenness, ndistance
     else:
         button_id = ctx.triggered[0]['prop_id'].split('.')[0]
 #    print(button_id)
+    
+    # A quick path or a Pareto front computed in the background (see below): the figure and the table
+    # are updated once it is finished, the rest is kept as it is
+    if button_id == 'job-interval':
+        job = JOBS.get(pending['id']) if pending else None
+        if job is not None and job['status'] in ('queued', 'running'):
+            raise PreventUpdate
+        figure_update, query, error_path, pending, polling = selection_outputs(job, pending)
+        return (figure_update, query, [] if query is not dash.no_update else dash.no_update) + (dash.no_update,) * 15 +\
+            (error_path, dash.no_update, pending, not polling)
         
     # If the Reset button is click, reinitialize all the values
     if button_id == 'button-reset':
@@ -636,10 +932,21 @@ def main_plot(update,reset,path, figure,method, dD, dP, dH, greenness, ndistance
             dD, dP, dH = None, None, None
         
     
+    # Only the changes of the figure are sent, and applied in the browser (see assets/2_figure.js).
+    # The main trace and the annotations are kept as they are if not given
+    figure_update = {'trace' : None, 'annotations' : None}
     # Change the title, which contains the current values for dP, dD and dH
-    figure['layout']['title']['text'] = "<b>Hansen Space</b><br>Solute's HSP: dD = " + f2s(dD) + '  dP = ' + f2s(dP) + '  dH = ' + f2s(dH)
-    # Updatesthe Ra based on the new Hansen coordinates
-    df['Ra'] = update_Ra(df[HANSEN_COORDINATES], [dD,dP,dH])
+    figure_update['title'] = "<b>Hansen Space</b><br>Solute's HSP: dD = " + f2s(dD) + '  dP = ' + f2s(dP) + '  dH = ' + f2s(dH)
+    # The ranking and the solvents to show. The query (the arguments of solvent_selection) is sent to the
+    # table, which asks for the rows of the page it shows (see update_table)
+    if button_id in ('button-update', 'button-reset'): mode = 'update'
+    elif button_id == 'button-pareto': mode = 'pareto'
+    else: mode = 'path'
+    query = dict(mode = mode, solute = [dD, dP, dH], scores = [waste, health, environment, safety], greenness = greenness,\
+                 hazard_list = hazard_list, temperature_range = temperature_range, viscosity_range = viscosity_range,\
+                 stension_range = stension_range, ndistance = ndistance, solvent_list = solvent_list,\
+                 pareto_objectives = list(pareto_objectives or []) if mode == 'pareto' else [])
+    query = json.loads(json.dumps(query, default = float)) # Only plain types, as the query is sent back by the browser
     #    Update the trace that shows the "Virtual solvent" in case it is not one from the list
     if (len(solvent_list) > 1) or  (method == 0):
         # Only if the method is by numerical Input or if th list is larger than 1
@@ -649,9 +956,7 @@ def main_plot(update,reset,path, figure,method, dD, dP, dH, greenness, ndistance
     else:
         x0,y0,z0 =  [],[],[]
         
-    figure['data'][1]['x'] = x0
-    figure['data'][1]['y'] = y0
-    figure['data'][1]['z'] = z0
+    figure_update['solute'] = [x0, y0, z0]
     
     #    Update the trace that highlights the selected solvents"
     if method == 0:
@@ -666,90 +971,395 @@ def main_plot(update,reset,path, figure,method, dD, dP, dH, greenness, ndistance
         else:
             x, y, z = dD, dP, dH
 
-    figure['data'][2]['x'] = x
-    figure['data'][2]['y'] = y
-    figure['data'][2]['z'] = z
+    figure_update['highlight'] = [x, y, z]
     
-
-#    print('This items have been excluded for the GSK_score values')
-#    [print(item) for item in WASTE if item not in waste]
-#    [print(item) for item in HEALTH if item not in health]
-#    [print(item) for item in ENVIRONMENT if item not in environment]
-#    [print(item) for item in SAFETY if item not in safety]
-    #   Updates the composite score based on the labels the user selected    
-    df['Composite score'], _ = GSK_calculator(df, [waste, health, environment, safety])
-#    print('The GSK score has been updated')
-  
-    # Now, we creat ethe filters for the data to show   
-    # 1. Create the greeness filter
-    if greenness > 0:
-        greenness_filter = df['Composite score'] > greenness
+    if mode == 'update':
+        job = {'status' : 'done', 'result' : selection_update(query)}
     else:
-        greenness_filter = True
-    # 2. Creates the hazard filter
-    hazard_filter = filter_by_hazard(hazard_list, df['Hazard Labels'])
+        # The quick path and the Pareto front can take long (e.g. with a large catalog), so they are computed in the
+        # background. If they are not ready in JOB_WAIT seconds, the browser polls until they are (see job-interval)
+        job = JOBS.wait(JOBS.submit('selection', query, lambda: selection_update(query))['id'], JOB_WAIT)
+    pending = {'query' : query, 'figure' : figure_update, 'clicked' : max(path, pareto) > -1}
+    figure_update, query, error_path, pending, polling = selection_outputs(job, pending)
     
-    # 3. Creates the boiling temperature filter based in the range slider
-    temperature_filter = ((df['Boiling Point (°C)'] > temperature_range[0]) & (df['Boiling Point (°C)'] < temperature_range[1])) | df['Boiling Point (°C)'].isnull()
+    sort_by = []
     
-    # 4. Creates the viscosity filter based in the range slider, including all the nan
-    viscosity_filter = ((df['Viscosity (mPa.s)'] > 10**viscosity_range[0]) & (df['Viscosity (mPa.s)'] < 10**viscosity_range[1])) | df['Viscosity (mPa.s)'].isnull()
+    return figure_update, query, sort_by, greenness, ndistance, solvent_list, hazard_list, waste, health, environment, safety,\
+        temperature_range, viscosity_range, stension_range,\
+            method, dDinput, dPinput, dHinput, error_path, None, pending, not polling
+
+# The page of the ranking shown by the table, sorted as asked, and the selected solvent
+@callback([Output('table', 'data'),
+               Output('table', 'page_count'),
+               Output('table', 'selected_rows')],
+              [Input('table-query', 'data'),
+               Input('table', 'page_current'),
+               Input('table', 'sort_by'),
+               Input('main-plot', 'clickData')],
+              [State('table', 'page_size'),
+               State('table', 'selected_row_ids')])
+def update_table(query, page_current, sort_by, clicked_data, page_size, selected_row_ids):
+    if query is None:
+        raise PreventUpdate
+    table = ranked_table(query)
+    page_current = min(page_current or 0, table.page_count(page_size) - 1)
+    page = table.page(page_current, page_size, sort_by)
     
-    # 5. Creates the surface tension filter based in the range slider, including all the nan
-    surface_tension_filter = ((df['Surface Tension (mN/m)'] > stension_range[0]) & (df['Surface Tension (mN/m)'] < stension_range[1]) ) | df['Surface Tension (mN/m)'].isnull()
+    triggered = [item['prop_id'] for item in dash.callback_context.triggered]
+    if 'main-plot.clickData' in triggered:
+        # The solvent clicked in the figure (update_selected_solvent has already moved to its page)
+        selected = clicked_solvent(clicked_data)
+    elif 'table-query.data' in triggered:
+        # New ranking, nothing selected
+        selected = None
+    else:
+        # Other page or sorting: the selected solvent stays selected if it is in the new page
+        selected = selected_row_ids[0] if selected_row_ids else None
+    selected_rows = [row for row, record in enumerate(page) if record['id'] == selected]
+    return page, table.page_count(page_size), selected_rows
+
+# The link to the export of the ranking shown in the table, with its sorting
+@callback(Output('export-link', 'href'),
+              [Input('table-query', 'data'),
+               Input('table', 'sort_by')])
+def update_export_link(query, sort_by):
+    if query is None:
+        raise PreventUpdate
+    return '/api/export?' + urlencode({'format' : 'csv', 'query' : json.dumps(query), 'sort_by' : json.dumps(sort_by or [])})
+
+# I need this lines to upload the images (the precompressed ones from memory, with conditional GET support)
+@routes.route('/static/<resource>')
+def serve_static(resource):
+    response = static_assets().response(resource, flask.request)
+    return flask.send_from_directory(STATIC_PATH, resource) if response is None else response
+
+def parse_ranking_parameters(params):
+    """
+    Reads the solutes and the filters of a batch request (JSON body), with the same defaults as the app:
+        - solutes: list of [dD, dP, dH] (required), each one between the limits of HSP_RANGE
+        - k: number of solvents per solute (10)
+        - greenness: lower limit for G (0, no limit)
+        - hazards: list of hazard labels to exclude
+        - temperature_range, viscosity_range, surface_tension_range: [min, max] in °C, mPa∙s and mN/m
+        - waste, health, environment, safety: lists with the subcategories for the G calculation
+    Raises a ValueError if the parameters are not valid
+    """
+    if not isinstance(params, dict):
+        raise ValueError('The body must be a JSON object')
+    try:
+        solutes = np.array(params['solutes'], dtype = float).reshape(-1, 3)
+    except KeyError:
+        raise ValueError('The list of solutes HSP, "solutes", is required')
+    except (TypeError, ValueError):
+        raise ValueError('"solutes" must be a list of [dD, dP, dH]')
+    if not np.isfinite(solutes).all():
+        raise ValueError('"solutes" contains missing values')
+    if ((solutes < HSP_RANGE[0]) | (solutes > HSP_RANGE[1])).any():
+        raise ValueError(f'The HSP of the solutes must be between {HSP_RANGE[0]:g} and {HSP_RANGE[1]:g} MPa^1/2')
     
-    # 6. Creates the overall filter, an AND product of all he filters (only the all True will survive)
-    data_filter = greenness_filter & hazard_filter & temperature_filter & viscosity_filter & surface_tension_filter
+    scores = []
+    for name, default in zip(['waste', 'health', 'environment', 'safety'], [WASTE, HEALTH, ENVIRONMENT, SAFETY]):
+        selected = string_list(params, name, default)
+        if not set(selected) <= set(default):
+            raise ValueError(f'Unknown subcategories for "{name}": {set(selected) - set(default)}')
+        scores.append(selected)
     
+    greenness = params.get('greenness', 0)
+    if not is_number(greenness):
+        raise ValueError('"greenness" must be a number')
+    viscosity_range = number_range(params, 'viscosity_range', None)
+    if viscosity_range is not None and min(viscosity_range) <= 0:
+        raise ValueError('"viscosity_range" must be positive')
+    return dict(solutes = solutes,
+                k = positive_integer(params, 'k', 10),
+                scores = scores,
+                greenness = float(greenness),
+                hazard_list = string_list(params, 'hazards', []),
+                temperature_range = number_range(params, 'temperature_range', TEMPERATURE_RANGE),
+                viscosity_range = VISCOSITY_RANGE if viscosity_range is None else list(np.log10(viscosity_range)),
+                stension_range = number_range(params, 'surface_tension_range', SURFACE_TENSION_RANGE))
+
+def is_number(value):
+    """True for a JSON number (not a boolean), which is not NaN"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not np.isnan(value)
+
+def positive_integer(params, name, default):
+    """The parameter of a request that is an integer >= 1, or the default if not given. Raises a ValueError if not valid"""
+    value = params.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f'"{name}" must be an integer >= 1')
+    return value
+
+def number_range(params, name, default):
+    """The [min, max] parameter of a request, two numbers, or the default if not given. Raises a ValueError if not valid"""
+    value = params.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, list) or len(value) != 2 or not all(is_number(x) for x in value):
+        raise ValueError(f'"{name}" must be a list of two numbers, [min, max]')
+    return [float(x) for x in value]
+
+def string_list(params, name, default):
+    """The parameter of a request that is a list of strings, or the default if not given. Raises a ValueError if not valid"""
+    value = params.get(name, default)
+    if not isinstance(value, list) or not all(isinstance(x, str) for x in value):
+        raise ValueError(f'"{name}" must be a list of strings')
+    return list(value)
+
+def parse_table_query(query, sort_by):
+    """
+    Checks the query of a ranking of the app (the arguments of solvent_selection, see main_plot) and the sorting
+    of its table, as sent back by the browser (e.g. to export it). Raises a ValueError if they are not valid
+    """
+    if not isinstance(query, dict) or set(query) != set(QUERY_KEYS):
+        raise ValueError(f'The query must be an object with the keys {QUERY_KEYS}')
+    if query['mode'] not in ('update', 'path', 'pareto'):
+        raise ValueError('"mode" must be "update", "path" or "pareto"')
+    solute = query['solute']
+    if not isinstance(solute, list) or len(solute) != 3 or not all(x is None or is_number(x) for x in solute):
+        raise ValueError('"solute" must be [dD, dP, dH]')
+    if not all(x is None or HSP_RANGE[0] <= x <= HSP_RANGE[1] for x in solute):
+        raise ValueError(f'The HSP of the solute must be between {HSP_RANGE[0]:g} and {HSP_RANGE[1]:g} MPa^1/2')
+    scores = query['scores']
+    if not isinstance(scores, list) or len(scores) != 4:
+        raise ValueError('"scores" must be a list with the subcategories of each category')
+    for selected, default in zip(scores, [WASTE, HEALTH, ENVIRONMENT, SAFETY]):
+        if not set(string_list({'scores' : selected}, 'scores', [])) <= set(default):
+            raise ValueError(f'Unknown subcategories: {set(selected) - set(default)}')
+    if not is_number(query['greenness']):
+        raise ValueError('"greenness" must be a number')
+    for name in ['temperature_range', 'viscosity_range', 'stension_range']:
+        number_range(query, name, None)
+    positive_integer(query, 'ndistance', None)
+    unknown = set(string_list(query, 'solvent_list', [])) - set(solvents_catalog().by_name)
+    if unknown:
+        raise ValueError(f'Unknown solvents: {unknown}')
+    string_list(query, 'hazard_list', [])
+    if not set(string_list(query, 'pareto_objectives', [])) <= set(PARETO_OBJECTIVES):
+        raise ValueError('Unknown Pareto objectives')
+    if not isinstance(sort_by, list) or not all(isinstance(column, dict) and column.get('column_id') in TABLE_COLUMNS.values()\
+                                                and column.get('direction') in ('asc', 'desc') for column in sort_by):
+        raise ValueError('"sort_by" must be a list of {"column_id" : <column of the table>, "direction" : "asc" or "desc"}')
+    return query, sort_by
+
+def api_response(kind, params, compute):
+    """
+    Response of a request of the API, once its parameters are validated:
+        - kind: name of the endpoint
+        - params: the JSON body of the request
+        - compute: function without arguments that returns the results (a JSON-serializable dictionary)
+    Returns:
+        The results or, if the body has "async" : true, a 202 with the job that computes them in the
+        background (see jobs.py), whose state and results are at /api/jobs/<id>
+    """
+    if not params.get('async'):
+        return flask.jsonify(compute())
+    job = JOBS.submit(kind, {key : value for key, value in params.items() if key != 'async'}, compute)
+    url = f'/api/jobs/{job["id"]}'
+    return flask.jsonify({'id' : job['id'], 'status' : job['status'], 'url' : url}), 202, {'Location' : url}
 
+# The state of a job of the API, and its results once it is done
+@routes.route('/api/jobs/<job_id>')
+def job_state(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return flask.jsonify({'error' : f'Unknown job "{job_id}" (the results are kept {JOBS.ttl} s)'}), 404
+    return flask.jsonify(job)
+
+# Batch ranking: the k closest solvents for each of the solutes in the request, with the filters of the app
+@routes.route('/api/rank', methods = ['POST'])
+def rank_solutes():
+    params = flask.request.get_json(force = True, silent = True) or {}
+    try:
+        parameters = parse_ranking_parameters(params)
+    except ValueError as error:
+        return flask.jsonify({'error' : str(error)}), 400
     
-    error_path = '' # Error message in the case that we haven't defined the Ra yet
+    def compute():
+        ranking = screen_solutes(solvents_catalog(), cube = score_cube(), **parameters)
+        ranking = ranking.astype(object).where(ranking.notnull(), None) # No NaN in JSON
+        return {'results' : ranking.to_dict('records')}
+    return api_response('rank', params, compute)
 
-    # If show path has not been cliecked, just plot the data with the applied filters
-    if button_id == 'button-update' or button_id == 'button-reset':
-        # Updating hte first trace (main one) by with the data filtered and only the n-first values
-        # OBS: needs some error managing in the cas of ndistance > the filtered data        
-        figure['data'][0] = solvents_trace(df[data_filter].sort_values('Ra')[:ndistance])
-        # Updating the table based on the filtered data 
-        dff = df[list(TABLE_COLUMNS.values())][data_filter]
-        # No annotations
-        figure['layout']['scene']['annotations'] = []
-    else:
-        # QUICK PATH has been clicked. Now, has the the distance been defined?
-        RA_EXIST =  not df['Ra'].isnull().all() # Check if all the values are null (meanning Ra is not defined)
-        if RA_EXIST:
-            # Add here the PATH algorithm
-            if len(solvent_list) == 1: solvent = df.loc[solvent_list[0]]
-            else: solvent = None
-
-            dfpath = suggested_path(df[data_filter], ref_solvent = solvent)
-            
-            figure['data'][0] = solvents_trace(dfpath, show_path = True)
-            # Updates based on the data excluded
-            dff = dfpath[list(TABLE_COLUMNS.values())]
-            figure['layout']['scene']['annotations'] = create_annotations(dfpath)
-        else:
-            # It has not been defined, so just plot the data based on the filters
-            dff = df[data_filter][:ndistance]
-            # Update the error message and show the user what she should do
-            if path > -1: # Chekc if it is the first call, so it doens't show the error initially
-                error_path = 'First, you MUST define the solute coordinates.'
-                
-                
-    # Sorts by the ascending distance in the Hansen space, by default
+# Blends: the Pareto front of Ra against G of the pure solvents and their binary (and ternary) blends, for each solute
+@routes.route('/api/blends', methods = ['POST'])
+def blend_solutes():
+    params = flask.request.get_json(force = True, silent = True) or {}
+    try:
+        parameters = parse_ranking_parameters(params)
+        max_Ra, step, ternary = params.get('max_Ra', 8.0), params.get('step', 0.1), params.get('ternary', True)
+        if not is_number(max_Ra) or not 0 < max_Ra <= BLEND_MAX_RA:
+            raise ValueError(f'"max_Ra" must be a number between 0 and {BLEND_MAX_RA}')
+        # The fractions are multiples of step, which must divide 1 so they add up to 1
+        if not is_number(step) or not BLEND_MIN_STEP <= step <= 0.5 or abs(1 / step - round(1 / step)) > 1e-6:
+            raise ValueError(f'"step" must be 1/n, between {BLEND_MIN_STEP} and 0.5 (e.g. 0.1 or 0.25)')
+        if not isinstance(ternary, bool):
+            raise ValueError('"ternary" must be true or false')
+    except (TypeError, ValueError) as error:
+        return flask.jsonify({'error' : str(error)}), 400
+    
+    def compute():
+        ranked = solvent_ranking(solvents_catalog(), [None] * 3, parameters['scores'], score_cube())
+        mask = solvents_filter(ranked, parameters['greenness'], parameters['hazard_list'], parameters['temperature_range'],\
+                               parameters['viscosity_range'], parameters['stension_range'])
+        results = []
+        for solute in parameters['solutes']:
+            front = blend_search(df, solute, parameters['scores'], max_Ra, step, ternary, mask, solvents_index(), score_cube())
+            results.append(front.astype(object).where(front.notnull(), None).to_dict('records'))
+        return {'results' : results}
+    return api_response('blends', params, compute)
 
-    dfs = dff.sort_values('Ra', ascending= True, inplace = False)[:ndistance]
-    sort_by = []
+def finite(value, decimals = None):
+    """The number as a float (rounded, if decimals is given), or None if it is not finite (there is no NaN or Infinity in JSON)"""
+    value = float(value) if decimals is None else round(float(value), decimals)
+    return value if np.isfinite(value) else None
+
+def parse_fit_parameters(params):
+    """
+    Reads the solubility tests of a sphere fitting request (JSON body):
+        - materials: list of {"good" : [solvent names], "bad" : [solvent names]} (required), with at least
+          two different good solvents and none of them also bad
+        - k: number of solvents, with the lowest RED, returned per material (10)
+    Raises a ValueError if the parameters are not valid
+    """
+    if not isinstance(params, dict):
+        raise ValueError('The body must be a JSON object')
+    materials = params.get('materials')
+    if not isinstance(materials, list):
+        raise ValueError('The list of solubility tests, "materials", is required')
+    observations = []
+    for material in materials:
+        if not isinstance(material, dict):
+            raise ValueError('Each material must be {"good" : [solvent names], "bad" : [solvent names]}')
+        good, bad = string_list(material, 'good', []), string_list(material, 'bad', [])
+        good_positions, bad_positions = solvents_catalog().get_indexer(good), solvents_catalog().get_indexer(bad)
+        unknown = {name for name, position in zip(good + bad, np.concatenate([good_positions, bad_positions])) if position < 0}
+        if unknown:
+            raise ValueError(f'Unknown solvents: {unknown}')
+        if len(set(good)) < 2:
+            raise ValueError('At least two different good solvents are needed to fit the sphere')
+        both = set(good) & set(bad)
+        if both:
+            raise ValueError(f'Solvents both good and bad: {both}')
+        observations.append((good_positions, bad_positions))
+    return observations, positive_integer(params, 'k', 10)
+
+# Sphere fitting: the HSP and R0 of each material from the solvents that dissolve it (good) or not (bad),
+# and the solvents with the lowest RED = Ra/R0
+@routes.route('/api/fit', methods = ['POST'])
+def fit_materials():
+    params = flask.request.get_json(force = True, silent = True) or {}
+    try:
+        observations, k = parse_fit_parameters(params)
+    except ValueError as error:
+        return flask.jsonify({'error' : str(error)}), 400
     
-    return figure, dfs.to_dict('records'), sort_by, greenness, ndistance, solvent_list, hazard_list, waste, health, environment, safety,\
-        temperature_range, viscosity_range, stension_range,\
-            method, dDinput, dPinput, dHinput, error_path, None
+    def compute():
+        results = []
+        # In this process: a worker of the web server (or a thread of JOBS) must not start processes
+        for sphere in fit_spheres(df[HANSEN_COORDINATES], observations, processes = 1):
+            if isinstance(sphere, ValueError):
+                results.append({'error' : str(sphere)})
+                continue
+            RED = relative_energy_difference(df[HANSEN_COORDINATES], sphere)
+            closest = np.argsort(RED, kind = 'mergesort')[:k]
+            # The center is a point of the grid of the search, rounded to the precision of the HSP of the solvents
+            results.append({'dD' : finite(sphere.center[0], 2), 'dP' : finite(sphere.center[1], 2), 'dH' : finite(sphere.center[2], 2),
+                            'R0' : finite(sphere.R0, 2), 'fit' : finite(sphere.fit, 3), 'good_out' : sphere.good_out, 'bad_in' : sphere.bad_in,
+                            'solvents' : [{'Solvent Name' : name, 'RED' : finite(value)} for name, value in zip(df['Solvent Name'].values[closest], RED[closest].round(3))]})
+        return {'results' : results}
+    return api_response('fit', params, compute)
 
+def export_frame(table, sort_by = [], solute = None):
+    """
+    The rows of a ranking with the EXPORT_COLUMNS, built column-wise (no records):
+        - table: a RankedTable, whose row ids are the positions in df
+        - sort_by: the sorting of the table (see RankedTable.order), by default by Ra
+        - solute: number of the solute, added as the first column 'Solute' (exports of many solutes)
+    """
+    order, _ = table.order(sort_by)
+    ranked = table.table.iloc[order]
+    frame = df.iloc[table.ids[order]].assign(**{'Ra' : ranked['Ra'].values, 'Composite score' : ranked['Composite score'].values})[EXPORT_COLUMNS]
+    if solute is not None:
+        frame.insert(0, 'Solute', solute)
+    return frame
 
-# I need this lines to upload the images
-@app.server.route('/static/<resource>')
-def serve_static(resource):
-    return flask.send_from_directory(STATIC_PATH, resource)
+def solute_rankings(parameters, mode = 'update', ndistance = N_SOLVENTS, pareto_objectives = []):
+    """
+    Generator with the ranking of each solute of a batch request (see export_frame), as the table of the
+    app would show it, computed only when the previous one has been sent
+        - parameters: the solutes and the filters, see parse_ranking_parameters
+        - mode, ndistance, pareto_objectives: see solvent_selection
+    """
+    for i, solute in enumerate(parameters['solutes']):
+        table = solvent_selection(mode, list(solute), parameters['scores'], parameters['greenness'], parameters['hazard_list'],\
+                                  parameters['temperature_range'], parameters['viscosity_range'], parameters['stension_range'],\
+                                  ndistance, [], pareto_objectives).table
+        yield export_frame(RankedTable(table, df.index.get_indexer(table.index)), solute = i)
+
+# Export of the rankings, streamed as CSV (or Parquet, if pyarrow is installed). With GET, the ranking of the app
+# (the query of the table and its sorting, see update_export_link); with POST, the rankings of many solutes
+@routes.route('/api/export', methods = ['GET', 'POST'])
+def export_ranking():
+    try:
+        if flask.request.method == 'GET':
+            args = flask.request.args
+            if 'query' not in args:
+                raise ValueError('The query of the ranking, "query", is required')
+            query, sort_by = parse_table_query(json.loads(args['query']), json.loads(args.get('sort_by', '[]')))
+            frames = [export_frame(ranked_table(query), sort_by)]
+            columns, format = EXPORT_COLUMNS, args.get('format', 'csv')
+        else:
+            params = flask.request.get_json(force = True, silent = True) or {}
+            parameters = parse_ranking_parameters(params)
+            mode = params.get('mode', 'update')
+            if mode not in ('update', 'path', 'pareto'):
+                raise ValueError('"mode" must be "update", "path" or "pareto"')
+            pareto_objectives = string_list(params, 'pareto_objectives', [])
+            if not set(pareto_objectives) <= set(PARETO_OBJECTIVES):
+                raise ValueError(f'Unknown Pareto objectives: {set(pareto_objectives) - set(PARETO_OBJECTIVES)}')
+            # Everything is checked here: once the stream starts, the status (200) is already sent
+            frames = solute_rankings(parameters, mode, positive_integer(params, 'k', N_SOLVENTS), pareto_objectives)
+            columns, format = ['Solute'] + EXPORT_COLUMNS, params.get('format', 'csv')
+        stream = export_stream(frames, columns, format)
+    except (TypeError, ValueError) as error:
+        return flask.jsonify({'error' : str(error)}), 400
+    
+    mimetype, extension = FORMATS[format]
+    return flask.Response(flask.stream_with_context(stream), mimetype = mimetype,\
+                          headers = {'Content-Disposition' : f'attachment; filename=solvent_ranking.{extension}'})
+
+def create_app():
+    """
+    Creates a Dash app with the layout, built on the first request (see create_layout), all the CALLBACKS, the
+    routes of the API and the images, and the opt-in instrumentation (see instrumentation.py). All the apps of
+    the process share the data and the tables derived from it, which are built on first use (see warm_up)
+    """
+    # Main stylesheet, so far, fetching it from an open source webpage
+    #external_stylesheets = []
+    dash_app = dash.Dash(__name__)
+    # Some of the callbacks will not exist at the beginning of the page.... check on that.
+    # (it also keeps Dash from building the layout to validate it when it is set)
+    dash_app.config['suppress_callback_exceptions'] = True
+    dash_app.index_string = INDEX_STRING
+    dash_app.layout = create_layout
+    for dependencies, function in CALLBACKS:
+        dash_app.callback(*dependencies)(function)
+    # Applies, in the browser, the changes of the figure sent by the main callback, so the figure is never sent back and forth
+    dash_app.clientside_callback(ClientsideFunction(namespace = 'solvents', function_name = 'update_figure'),
+                                 Output('main-plot', 'figure'),
+                                 [Input('plot-update', 'data')],
+                                 [State('main-plot', 'figure'),
+                                  State('solvents-data', 'data')])
+    dash_app.server.register_blueprint(routes)
+    # Opt-in metrics at /metrics and per-request profiles, once all the callbacks are registered
+    instrument_app(dash_app, caches = {'solvent_report' : solvent_report, 'rankings' : RANKINGS})
+    return dash_app
+
+# I start the dash object instance, saved in the variable app (the one served by gunicorn, see the Procfile)
+app = create_app()
+
+server = app.server # No sure that this line is necessary, not sure what it does...
 
 if __name__ == '__main__':
     # app.run_server(debug=True, port = 8051, host = '130.239.229.125') # wifi
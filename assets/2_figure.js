@@ -0,0 +1,46 @@
+/*
+ * Client-side update of the Hansen space figure. The server only sends what changes on each
+ * request (see main_plot and support_functions.solvents_trace_update), and the full traces are
+ * rebuilt here from the static data of the solvents, sent once with the layout.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    solvents: {
+        update_figure: function(update, figure, solvents) {
+            if (!update || !figure || !solvents) {
+                return window.dash_clientside.no_update;
+            }
+            var data = figure.data.slice();
+
+            // Main trace, only if the solvents to show have changed
+            var trace = update.trace;
+            if (trace) {
+                var pick = function(values) {
+                    return trace.index.map(function(i) { return values[i]; });
+                };
+                data[0] = Object.assign({}, data[0], {
+                    x: pick(solvents.x),
+                    y: pick(solvents.y),
+                    z: pick(solvents.z),
+                    text: pick(solvents.text),
+                    // The hover values, and the row id of the solvent (its position in the full table) last
+                    customdata: trace.index.map(function(i, k) {
+                        var G = trace.G[k] === null ? 'nan' : trace.G[k].toFixed(1);
+                        return [G, trace.Ra[k]].concat(solvents.customdata[i], [i]);
+                    }),
+                    mode: trace.mode,
+                    marker: Object.assign({}, data[0].marker, {color: trace.G, size: trace.size})
+                });
+            }
+            // The solute and the highlighted solvents
+            data[1] = Object.assign({}, data[1], {x: update.solute[0], y: update.solute[1], z: update.solute[2]});
+            data[2] = Object.assign({}, data[2], {x: update.highlight[0], y: update.highlight[1], z: update.highlight[2]});
+
+            var layout = Object.assign({}, figure.layout);
+            layout.title = Object.assign({}, layout.title, {text: update.title});
+            if (update.annotations) {
+                layout.scene = Object.assign({}, layout.scene, {annotations: update.annotations});
+            }
+            return {data: data, layout: layout};
+        }
+    }
+});
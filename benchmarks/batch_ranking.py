@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the batch ranking (support_functions.batch_ranking) against looping over the
+solutes with update_Ra and a sort, as the interactive callback does for a single solute.
+
+Usage: python benchmarks/batch_ranking.py [n_solutes] [k]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import HANSEN_COORDINATES, update_Ra, batch_ranking
+
+
+def loop_ranking(df, solutes, k):
+    """One update_Ra and one sort per solute"""
+    return [update_Ra(df[HANSEN_COORDINATES], list(solute)).sort_values()[:k] for solute in solutes]
+
+
+def catalog(n, seed = 0):
+    """The real table, or a synthetic catalog of n solvents resampled from it with some noise"""
+    if n is None:
+        return app.df
+    dfs = app.df.sample(n, replace = True, random_state = seed).reset_index(drop = True)
+    dfs[HANSEN_COORDINATES] += np.random.default_rng(seed).normal(0, 0.5, (n, 3))
+    return dfs
+
+
+def main(n_solutes = 500, k = 10):
+    solutes = np.random.default_rng(1).uniform([14, 0, 0], [22, 20, 30], (n_solutes, 3)).round(1)
+    for n in [None, 10000]:
+        df = catalog(n)
+        positions, Ra = batch_ranking(df[HANSEN_COORDINATES], solutes, k)
+        reference = loop_ranking(df, solutes, k)
+        assert all((Ra[i] == ref.values).all() for i, ref in enumerate(reference))
+
+        t_loop = timeit.timeit(lambda: loop_ranking(df, solutes, k), number = 1)
+        t_batch = min(timeit.repeat(lambda: batch_ranking(df[HANSEN_COORDINATES], solutes, k), number = 1, repeat = 3))
+        print(f'{n_solutes} solutes x {len(df)} solvents (top {k}): update_Ra loop {1e3 * t_loop:8.1f} ms,'
+              f' batch {1e3 * t_batch:6.1f} ms ({t_loop / t_batch:.0f}x)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmarks of the callbacks on the real table, through Dash's test client (the HTTP path
+of the browser, including the validation and the JSON serialization, see dash_client.py).
+"""
+import pytest
+
+from dash_client import find_output, callback_payload, post_callback
+from jobs import JobQueue
+from cache import LRUCache
+import app
+
+VALUES = {'button-update.n_clicks_timestamp' : 1, 'button-reset.n_clicks_timestamp' : -2, 'button-path.n_clicks_timestamp' : 1,
+          'button-pareto.n_clicks_timestamp' : 1, 'radiobutton-route.value' : 0, 'dD-input.value' : 18.0, 'dP-input.value' : 5.0,
+          'dH-input.value' : 7.0, 'greenness-filter.value' : 0, 'distance-filter.value' : app.N_SOLVENTS, 'solvent-list.value' : [],
+          'hazard-list.value' : ['H351'], 'checklist-waste.value' : app.WASTE, 'checklist-health.value' : app.HEALTH,
+          'checklist-environment.value' : app.ENVIRONMENT, 'checklist-safety.value' : app.SAFETY,
+          'temperatures-range-slider.value' : app.TEMPERATURE_RANGE, 'viscosity-slider.value' : app.VISCOSITY_RANGE,
+          'surface-tension-slider.value' : app.SURFACE_TENSION_RANGE, 'pareto-objectives.value' : []}
+
+
+@pytest.fixture(scope = 'module')
+def client():
+    return app.server.test_client()
+
+
+@pytest.mark.parametrize('cached', [False, True], ids = ['computed', 'cached'])
+@pytest.mark.parametrize('button', ['button-update', 'button-path', 'button-pareto'])
+def bench_main_plot(benchmark, client, button, cached, monkeypatch):
+    # The quick path and the Pareto front are background jobs, reused while kept: a new queue for each round.
+    # The rankings are computed on each round too, unless they are taken from the cache (the same request repeated)
+    monkeypatch.setattr(app, 'JOBS', JobQueue(jobs_path = None))
+    if not cached:
+        monkeypatch.setattr(app, 'RANKINGS', LRUCache(0))
+    payload = callback_payload(app.app, find_output(app.app, 'plot-update.data'), VALUES, [button + '.n_clicks_timestamp'])
+    def post():
+        app.JOBS.memory.clear()
+        return post_callback(client, payload)
+    benchmark(post)
+
+def bench_update_report(benchmark, client):
+    # A different solvent on each round, so the report cache is (mostly) missed
+    rows = iter(range(10**9))
+    def post():
+        values = {'table.selected_row_ids' : [next(rows) % app.N_SOLVENTS],
+                  'checklist-waste.value' : app.WASTE, 'checklist-health.value' : app.HEALTH,
+                  'checklist-environment.value' : app.ENVIRONMENT, 'checklist-safety.value' : app.SAFETY}
+        return post_callback(client, callback_payload(app.app, find_output(app.app, 'report.children'), values, ['table.selected_row_ids']))
+    benchmark(post)
+
+@pytest.mark.parametrize('sort_by', [[], [{'column_id' : 'Composite score', 'direction' : 'desc'}]], ids = ['Ra', 'G desc'])
+def bench_update_table(benchmark, client, sort_by):
+    # A page of the ranking of the last main_plot, sorted in the server
+    response, _ = post_callback(client, callback_payload(app.app, find_output(app.app, 'plot-update.data'), VALUES, ['button-update.n_clicks_timestamp']))
+    values = {'table-query.data' : response['response']['table-query']['data'], 'table.page_current' : 1, 'table.sort_by' : sort_by,
+              'main-plot.clickData' : None, 'table.page_size' : app.PAGE_SIZE, 'table.selected_row_ids' : []}
+    benchmark(post_callback, client, callback_payload(app.app, find_output(app.app, 'table.data'), values, ['table.page_current']))
+
+@pytest.mark.parametrize('n', [1, 10], ids = ['1 solute', '10 solutes'])
+def bench_export(benchmark, client, n):
+    # The full ranking of each solute, streamed as CSV
+    body = {'solutes' : [[15 + i / 2, 5 + i, 7 + i] for i in range(n)], 'k' : app.N_SOLVENTS}
+    benchmark(lambda: client.post('/api/export', json = body).data)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the stages of the main callback (see main_plot in app.py), on the real table and on
+synthetic catalogs of 1k, 10k and 100k solvents (see conftest.py), to track the regressions and the
+scaling of each stage across commits:
+
+    python -m pytest benchmarks --benchmark-autosave
+    python -m pytest benchmarks --benchmark-compare
+"""
+import pytest
+
+from support_functions import HANSEN_COORDINATES, SCORES, update_Ra, GSK_calculator, filter_by_hazard, solvent_ranking,\
+    suggested_path, solvents_trace, create_report, create_annotations, solvents_filter
+from catalog import SolventCatalog
+
+HAZARD_LIST = ['H225', 'H351']
+
+
+@pytest.fixture(scope = 'session')
+def ranked(catalog, solute):
+    """The catalog with the Ra and the composite score (as main_plot ranks it)"""
+    return solvent_ranking(catalog, solute, SCORES)
+
+@pytest.fixture(scope = 'session')
+def solvent_catalog(catalog, hazards):
+    """The catalog as a SolventCatalog (typed arrays)"""
+    return SolventCatalog(catalog, hazards = hazards)
+
+
+def bench_update_Ra(benchmark, catalog, solute):
+    benchmark(update_Ra, catalog[HANSEN_COORDINATES], solute)
+
+def bench_GSK_calculator(benchmark, catalog):
+    benchmark(GSK_calculator, catalog, SCORES)
+
+def bench_filter_by_hazard(benchmark, hazards):
+    benchmark(filter_by_hazard, HAZARD_LIST, hazards)
+
+@pytest.mark.parametrize('kind', ['DataFrame', 'SolventCatalog'])
+def bench_ranking_and_filter(benchmark, catalog, hazards, solvent_catalog, solute, kind):
+    # The same ranking and filters on the DataFrame and on the typed arrays
+    data = catalog if kind == 'DataFrame' else solvent_catalog
+    def rank():
+        ranked = solvent_ranking(data, solute, SCORES)
+        return solvents_filter(ranked, 5, HAZARD_LIST, (50, 200), (-1, 1), (20, 50), hazards if kind == 'DataFrame' else None)
+    benchmark(rank)
+
+def bench_suggested_path(benchmark, ranked):
+    benchmark(suggested_path, ranked)
+
+def bench_solvents_trace(benchmark, ranked):
+    benchmark(solvents_trace, ranked)
+
+def bench_create_report(benchmark, ranked):
+    benchmark(create_report, ranked.iloc[0], SCORES)
+
+def bench_create_annotations(benchmark, ranked):
+    benchmark(create_annotations, suggested_path(ranked))
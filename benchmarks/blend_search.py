@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the blend search (blends.blend_search) against the brute force over all the pairs of
+solvents and fractions, on the catalog and on synthetic catalogs. It checks that the binary front
+is the same and reports the pairs of solvents (times fractions) covered per second. The search with
+the ternary blends is only timed on the catalog, the number of triples grows too fast for the synthetic ones.
+
+Usage: python benchmarks/blend_search.py [n_solutes] [step]
+"""
+import sys
+import time
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import HANSEN_COORDINATES, SCORES, hansen_index, pareto_front
+from catalog import ScoreCube
+from blends import blend_properties, blend_search
+
+
+def brute_force_front(df, cube, reference, max_Ra, step):
+    """Front of the pure solvents and all the binary blends, evaluated by chunks of pairs"""
+    X = df[HANSEN_COORDINATES].values.astype(float)
+    values, weights = cube.frame.values.astype(float), cube.weights(SCORES)
+    n, n_steps = len(df), int(round(1 / step))
+    first, second = np.triu_indices(n, 1)
+    Ra, G = [], []
+    for i in range(n_steps + 1):
+        fractions = np.array([i, n_steps - i]) / n_steps
+        for start in range(0, len(first), 10**6):
+            components = np.column_stack([first[start:start + 10**6], second[start:start + 10**6]])
+            _, blend_Ra, blend_G = blend_properties(X, values, weights, reference, components, np.tile(fractions, (len(components), 1)))
+            keep = blend_Ra <= max_Ra
+            Ra.append(blend_Ra[keep])
+            G.append(blend_G[keep])
+    Ra, G = np.concatenate(Ra), np.concatenate(G)
+    front = pareto_front(Ra, G)
+    return sorted(zip(Ra[front], G[front]))
+
+
+def catalog(n, seed = 0):
+    """The real table, or a synthetic catalog of n solvents resampled from it with some noise"""
+    if n is None:
+        return app.df
+    dfs = app.df.sample(n, replace = True, random_state = seed).reset_index(drop = True)
+    dfs[HANSEN_COORDINATES] += np.random.default_rng(seed).normal(0, 0.5, (n, 3))
+    return dfs
+
+
+def main(n_solutes = 5, step = 0.1):
+    rng = np.random.default_rng(0)
+    for n in [None, 1000, 2000]:
+        df = catalog(n)
+        cube, index = ScoreCube(df), hansen_index(df[HANSEN_COORDINATES])
+        solutes = df[HANSEN_COORDINATES].values[rng.integers(len(df), size = n_solutes)] + rng.normal(0, 1, (n_solutes, 3))
+        n_pairs = len(df) * (len(df) - 1) // 2 * (int(round(1 / step)) + 1)
+        t_brute, t_pairs, t_triples = 0, 0, 0
+        for solute in solutes:
+            start = time.perf_counter()
+            brute = brute_force_front(df, cube, solute, 8.0, step)
+            t_brute += time.perf_counter() - start
+            start = time.perf_counter()
+            front = blend_search(df, solute, max_Ra = 8.0, step = step, ternary = False, index = index, cube = cube)
+            t_pairs += time.perf_counter() - start
+            assert list(zip(front['Ra'], front['Composite score'])) == brute, 'The binary front differs from the brute force'
+            if n is None:
+                start = time.perf_counter()
+                blend_search(df, solute, max_Ra = 8.0, step = step, index = index, cube = cube)
+                t_triples += time.perf_counter() - start
+        print(f'{len(df):5d} solvents: brute force {n_pairs * n_solutes / t_brute:10.3g} pairs/s ({1e3 * t_brute / n_solutes:7.1f} ms),'
+              f' search {n_pairs * n_solutes / t_pairs:10.3g} pairs/s ({1e3 * t_pairs / n_solutes:6.1f} ms)'
+              + (f', with triples {1e3 * t_triples / n_solutes:.1f} ms' if n is None else ''))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5, float(sys.argv[2]) if len(sys.argv) > 2 else 0.1)
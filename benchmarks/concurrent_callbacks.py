@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Stress test of the main callback under concurrency. The same set of random requests
+(solute HSP, score subcategories, hazards, greenness) is sent first serially and then
+from many threads at once, as a threaded gunicorn worker would do. The responses of the
+concurrent run must be identical to the serial ones, i.e. no request sees the solute or
+the scores of another one. Nothing is reused between the runs: the rankings are not
+cached and the background jobs (quick path and Pareto front) run in a new queue, with
+one worker per thread, so every request is computed again, concurrently.
+
+Usage: python benchmarks/concurrent_callbacks.py [n_requests] [n_threads]
+"""
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dash_client import find_output, callback_payload, post_callback
+from jobs import JobQueue
+from cache import LRUCache
+import app
+
+
+def random_values(rng):
+    """Random values for all the inputs and states of the main callback"""
+    method = rng.choice([0, 1])
+    solvents = rng.sample(list(app.df.index), rng.randint(1, 3)) if method == 1 else []
+    scores = [rng.sample(names, rng.randint(0, len(names))) for names in [app.WASTE, app.HEALTH, app.ENVIRONMENT, app.SAFETY]]
+    return {'button-update.n_clicks_timestamp' : 1,
+            'button-reset.n_clicks_timestamp' : -2,
+            'button-path.n_clicks_timestamp' : 1,
+            'button-pareto.n_clicks_timestamp' : 1,
+            'radiobutton-route.value' : method,
+            'dD-input.value' : round(rng.uniform(14, 22), 1),
+            'dP-input.value' : round(rng.uniform(0, 20), 1),
+            'dH-input.value' : round(rng.uniform(0, 30), 1),
+            'greenness-filter.value' : rng.choice([0, 0, 3, 5]),
+            'distance-filter.value' : rng.choice([10, 25, app.N_SOLVENTS]),
+            'solvent-list.value' : solvents,
+            'hazard-list.value' : rng.sample(['H225', 'H302', 'H319', 'H335', 'H351'], rng.randint(0, 2)),
+            'checklist-waste.value' : scores[0],
+            'checklist-health.value' : scores[1],
+            'checklist-environment.value' : scores[2],
+            'checklist-safety.value' : scores[3],
+            'temperatures-range-slider.value' : app.TEMPERATURE_RANGE,
+            'viscosity-slider.value' : app.VISCOSITY_RANGE,
+            'surface-tension-slider.value' : app.SURFACE_TENSION_RANGE,
+            'pareto-objectives.value' : rng.sample(['Boiling Point (°C)', 'Viscosity (mPa.s)'], rng.randint(0, 2))}
+
+
+def uncached(n_threads):
+    """No ranking nor job of a previous request is reused, and the jobs are always waited for"""
+    app.RANKINGS = LRUCache(0)
+    app.JOBS = JobQueue(jobs_path = None, workers = n_threads)
+    app.JOB_WAIT = None
+
+
+def main(n_requests = 200, n_threads = 16):
+    rng = random.Random(0)
+    output = find_output(app.app, 'plot-update.data')
+    payloads = []
+    for _ in range(n_requests):
+        button = rng.choice(['button-update', 'button-path', 'button-pareto'])
+        payloads.append(callback_payload(app.app, output, random_values(rng), [button + '.n_clicks_timestamp']))
+
+    client = app.server.test_client()
+    uncached(n_threads)
+    t0 = time.perf_counter()
+    expected = [post_callback(client, payload)[0] for payload in payloads]
+    t_serial = time.perf_counter() - t0
+
+    uncached(n_threads)
+    with ThreadPoolExecutor(n_threads) as executor:
+        t0 = time.perf_counter()
+        results = list(executor.map(lambda payload: post_callback(app.server.test_client(), payload)[0], payloads))
+        t_threads = time.perf_counter() - t0
+
+    wrong = sum(result != reference for result, reference in zip(results, expected))
+    print(f'{n_requests} requests, serial: {t_serial:.2f} s, {n_threads} threads: {t_threads:.2f} s')
+    print(f'{wrong} responses differ from the serial run')
+    return wrong
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(*map(int, sys.argv[1:])) else 0)
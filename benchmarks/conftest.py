@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures of the benchmark suite: the real table and synthetic catalogs of 1k, 10k and 100k solvents,
+resampled from it with some noise in the HSP, and a solute.
+"""
+import numpy as np
+import pytest
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import HANSEN_COORDINATES, hazard_matrix
+
+CATALOG_SIZES = [None, 1000, 10000, 100000] # None is the real table
+SOLUTE = [18.0, 5.0, 7.0]
+
+_CATALOGS = {}
+
+
+def synthetic_catalog(n, seed = 0):
+    """The real table, or a synthetic catalog of n solvents resampled from it with some noise (and unique names)"""
+    if n is None:
+        return app.df
+    if n not in _CATALOGS:
+        dfs = app.df.sample(n, replace = True, random_state = seed)
+        dfs[HANSEN_COORDINATES] = dfs[HANSEN_COORDINATES].values + np.random.default_rng(seed).normal(0, 0.5, (n, 3))
+        dfs['Solvent Name'] = [f'{name} ({i})' for i, name in enumerate(dfs['Solvent Name'])]
+        dfs.index = dfs['Solvent Name'].values
+        _CATALOGS[n] = dfs
+    return _CATALOGS[n]
+
+
+@pytest.fixture(scope = 'session', params = CATALOG_SIZES, ids = lambda n: 'table' if n is None else f'{n // 1000}k')
+def catalog(request):
+    """The real table and the synthetic catalogs"""
+    return synthetic_catalog(request.param)
+
+
+@pytest.fixture(scope = 'session')
+def solute():
+    return list(SOLUTE)
+
+
+@pytest.fixture(scope = 'session')
+def hazards(catalog):
+    """Hazard matrix of the catalog"""
+    return hazard_matrix(catalog['Hazard Labels'])
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers to call the Dash callbacks of the app through Flask's test client, i.e. the
+same HTTP path (/_dash-update-component) used by the browser, without a browser.
+"""
+import json
+import os
+import sys
+
+# The app loads its data with relative paths, so everything runs from the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+
+def find_output(dash_app, component_property):
+    """Returns the key in the callback map of the callback with the output 'component.property'"""
+    for output in dash_app.callback_map:
+        if component_property in output.strip('.').split('...'):
+            return output
+    raise KeyError(component_property)
+
+
+def callback_payload(dash_app, output, values, triggered):
+    """
+    Builds the JSON body the browser would send to /_dash-update-component:
+        - dash_app: the dash.Dash instance
+        - output: key of the callback in the callback map (see find_output)
+        - values: dictionary {'component.property' : value} for the inputs and states
+        - triggered: list of 'component.property' that triggered the callback
+    """
+    callback = dash_app.callback_map[output]
+    fill = lambda items: [dict(item, value = values.get('{id}.{property}'.format(**item))) for item in items]
+    outputs = [dict(zip(('id', 'property'), o.split('.'))) for o in output.strip('.').split('...')]
+    return {'output' : output,
+            'outputs' : outputs if output.startswith('..') else outputs[0],
+            'inputs' : fill(callback['inputs']),
+            'state' : fill(callback['state']),
+            'changedPropIds' : list(triggered)}
+
+
+def post_callback(client, payload):
+    """Posts the payload with a Flask test client and returns the decoded response and its size in bytes"""
+    response = client.post('/_dash-update-component', data = json.dumps(payload), content_type = 'application/json')
+    if response.status_code != 200:
+        raise RuntimeError(f'Callback failed with status {response.status_code}: {response.data[:500]}')
+    return json.loads(response.data), len(response.data)
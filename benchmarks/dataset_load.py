@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Startup-time benchmark of the data loading: parsing the Excel workbook (cold) against loading
+the binary cache built by dataset.py. Each measurement runs in a fresh interpreter, as a
+gunicorn worker booting. pandas and numpy are imported before the timer (both paths need them),
+the rest of the imports of each path (e.g. the Excel reader) are included.
+
+Usage: python benchmarks/dataset_load.py [repeat]
+"""
+import subprocess
+import sys
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import dataset
+
+CODE = {'xlsx' : 'import dataset; dataset.read_solvents(); dataset.read_statements()',
+        'cache' : 'import dataset; dataset.load_solvents(); dataset.load_statements()'}
+
+
+def run(code):
+    """Wall time, in seconds, of the code in a new interpreter (excluding the interpreter startup)"""
+    timed = f'import time, numpy, pandas; t = time.perf_counter(); {code}; print(time.perf_counter() - t)'
+    return float(subprocess.check_output([sys.executable, '-W', 'ignore', '-c', timed]))
+
+
+def main(repeat = 5):
+    dataset.build_cache()
+    for name, code in CODE.items():
+        times = [run(code) for _ in range(repeat)]
+        print(f'{name:5s}: best {1e3 * min(times):7.1f} ms, mean {1e3 * sum(times) / repeat:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
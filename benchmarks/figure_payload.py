@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Request and response sizes of the main callback, through Flask's test client. The figure is
+not sent anymore: the callback returns a compact update ('plot-update') that the browser applies
+to the static data of the solvents (see assets/2_figure.js). For reference, the size of the full
+figure, which used to be uploaded as a State and downloaded as the Output, is also given.
+
+Usage: python benchmarks/figure_payload.py
+"""
+import json
+
+import plotly.utils
+
+from dash_client import find_output, callback_payload, post_callback
+import app
+
+SCENARIOS = {'update, all solvents' : ('button-update', app.N_SOLVENTS),
+             'update, 25 solvents' : ('button-update', 25),
+             'quick path' : ('button-path', app.N_SOLVENTS),
+             'pareto front' : ('button-pareto', app.N_SOLVENTS)}
+
+
+def main():
+    output = find_output(app.app, 'plot-update.data')
+    client = app.server.test_client()
+    full_figure = app.initial_figure()
+    figure_size = len(json.dumps(full_figure, cls = plotly.utils.PlotlyJSONEncoder))
+    print(f'Static solvents data (sent once with the layout): {len(json.dumps(app.solvents_data()))} bytes')
+    print(f'Full figure, all the solvents: {figure_size} bytes')
+    for name, (button, ndistance) in SCENARIOS.items():
+        values = {'button-update.n_clicks_timestamp' : 1, 'button-reset.n_clicks_timestamp' : -2, 'button-path.n_clicks_timestamp' : 1, 'button-pareto.n_clicks_timestamp' : 1,
+                  'radiobutton-route.value' : 0, 'dD-input.value' : 18.0, 'dP-input.value' : 5.0, 'dH-input.value' : 7.0,
+                  'greenness-filter.value' : 0, 'distance-filter.value' : ndistance, 'solvent-list.value' : [], 'hazard-list.value' : [],
+                  'checklist-waste.value' : app.WASTE, 'checklist-health.value' : app.HEALTH,
+                  'checklist-environment.value' : app.ENVIRONMENT, 'checklist-safety.value' : app.SAFETY,
+                  'temperatures-range-slider.value' : app.TEMPERATURE_RANGE, 'viscosity-slider.value' : app.VISCOSITY_RANGE,
+                  'surface-tension-slider.value' : app.SURFACE_TENSION_RANGE, 'pareto-objectives.value' : []}
+        payload = callback_payload(app.app, output, values, [button + '.n_clicks_timestamp'])
+        response, response_size = post_callback(client, payload)
+        update_size = len(json.dumps(response['response']['plot-update']['data']))
+        print(f'{name:22s}: request {len(json.dumps(payload)):6d} bytes, response {response_size:6d} bytes'
+              f' (figure update {update_size} bytes)')
+
+
+if __name__ == '__main__':
+    main()
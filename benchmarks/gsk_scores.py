@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the composite score for a selection of subcategories: GSK_calculator (pandas, one
+product and power per category) against the log-space ScoreCube (one matrix-vector product) and
+its precomputed table of the 2^10 selections. It first checks, for every selection, that the
+results are bit-identical, on the catalog and on a synthetic one.
+
+Usage: python benchmarks/gsk_scores.py [n_rows]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import SCORES, GSK_calculator
+from catalog import ScoreCube
+
+
+def selections(columns):
+    """All the selections of subcategories, as lists of scores category"""
+    for mask in range(2**len(columns)):
+        yield [[name for name in category if 1 << columns.index(name) & mask] for category in SCORES]
+
+
+def check(df, cube):
+    """Number of selections where the cube and GSK_calculator differ (in any bit)"""
+    differences = 0
+    for scores in selections(cube.columns):
+        G = np.broadcast_to(np.asarray(GSK_calculator(df, scores)[0], dtype = float), (len(df),))
+        differences += G.tobytes() != cube.composite(scores).tobytes()
+    return differences
+
+
+def main(n = 100000):
+    columns = [name for category in SCORES for name in category]
+    dfs = app.df.sample(n, replace = True, random_state = 0).reset_index(drop = True)
+    # Non-integer scores, so the values close to the rounding boundaries are also exercised
+    dfs[columns] = (dfs[columns] + np.random.default_rng(0).uniform(-0.5, 0.5, (n, len(columns)))).clip(1, 10)
+
+    for name, df in [('catalog', app.df), (f'synthetic ({n} rows)', dfs[:5000])]:
+        cube = ScoreCube(df)
+        assert check(df, cube) == 0, f'{name}: the cube differs from GSK_calculator'
+        assert check(df, cube.precompute()) == 0, f'{name}: the table differs from GSK_calculator'
+    print('Bit-identical to GSK_calculator for all the 1024 selections')
+
+    scores = [SCORES[0][:2], SCORES[1], [], SCORES[3][1:]]
+    for name, df in [('catalog', app.df), (f'{n} rows', dfs)]:
+        cube = ScoreCube(df)
+        t_pandas = min(timeit.repeat(lambda: GSK_calculator(df, scores), number = 20, repeat = 3)) / 20
+        t_cube = min(timeit.repeat(lambda: cube.composite(scores), number = 20, repeat = 3)) / 20
+        t_pre = timeit.timeit(cube.precompute, number = 1) if len(df) <= 10000 else None
+        line = f'{name:>12}: GSK_calculator {1e3 * t_pandas:8.3f} ms, cube {1e3 * t_cube:8.3f} ms ({t_pandas / t_cube:.0f}x)'
+        if t_pre is not None:
+            t_table = min(timeit.repeat(lambda: cube.composite(scores), number = 100, repeat = 3)) / 100
+            line += f', table lookup {1e3 * t_table:6.3f} ms (precomputed in {1e3 * t_pre:.0f} ms)'
+        print(line)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the hover text of the main trace (support_functions.solvents_trace) on a synthetic
+catalog: one str.format per row with DataFrame.iterrows (previous implementation) against the
+column-wise formatting into customdata with a single shared template.
+
+Usage: python benchmarks/hover_text.py [n_rows]
+"""
+import re
+import sys
+import timeit
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import HANSEN_COORDINATES, HOVER_TEMPLATE, hover_customdata, solvents_trace
+
+
+def hovertemplate_iterrows(df):
+    """Previous implementation, one template per row"""
+    return ['<b>{0:s}</b><br>G = {1:.1f}<br>dD = {2:.1f}<br>dP = {3:.1f}<br>dH = {4:.1f} <extra>Ra = {5:.1f}<br>mp  = {6:.0f} °C<br>bp  = {7:.0f} °C<br>η  = {8:.2g} mPa∙s<br>𝜎  = {9:.2g} mN/m</extra>'.format(*data[['Solvent Name','Composite score','dD - Dispersion', 'dP - Polarity', 'dH - Hydrogen bonding' ,'Ra', 'Melting Point (°C)','Boiling Point (°C)', 'Viscosity (mPa.s)', 'Surface Tension (mN/m)']]) for index, data in df.iterrows()]
+
+
+def render(df, customdata):
+    """Hover strings as plotly renders them from the shared template, to check they did not change"""
+    strings = []
+    for (name, x, y, z), values in zip(df[['Solvent Name'] + HANSEN_COORDINATES].values, customdata):
+        text = HOVER_TEMPLATE.replace('%{text}', name)
+        for axis, value in zip('xyz', (x, y, z)):
+            text = text.replace('%{' + axis + ':.1f}', f'{value:.1f}')
+        strings.append(re.sub(r'%\{customdata\[(\d)\]\}', lambda match: values[int(match.group(1))], text))
+    return strings
+
+
+def main(n = 50000):
+    dfs = app.df.sample(n, replace = True, random_state = 0).reset_index(drop = True)
+    dfs[HANSEN_COORDINATES] += np.random.default_rng(0).normal(0, 0.5, (n, 3)).round(1)
+    dfs['Ra'] = np.random.default_rng(1).uniform(0, 30, n).round(2)
+    assert render(dfs[:2000], hover_customdata(dfs[:2000])) == hovertemplate_iterrows(dfs[:2000])
+
+    t_old = timeit.timeit(lambda: hovertemplate_iterrows(dfs), number = 1)
+    t_new = min(timeit.repeat(lambda: hover_customdata(dfs), number = 1, repeat = 3))
+    t_trace = min(timeit.repeat(lambda: solvents_trace(dfs), number = 1, repeat = 3))
+    print(f'{n} rows: iterrows + format {1e3 * t_old:7.1f} ms, column-wise customdata {1e3 * t_new:6.1f} ms'
+          f' ({t_old / t_new:.0f}x), whole solvents_trace now {1e3 * t_trace:6.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the skyline (Pareto front) engine: the 2-D and 3-D sweeps and the sort-filter-skyline
+for 4+ objectives. It first checks the fronts against a brute-force O(n^2) dominance test on small
+random sets (with ties and anti-correlated objectives), and then times the engine on large ones.
+
+Usage: python benchmarks/pareto_front.py [n_rows]
+"""
+import sys
+import time
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import skyline, pareto_solvents, PARETO_OBJECTIVES
+
+
+def brute_force(values):
+    """Non-dominated points (only the first of identical ones), comparing all the pairs"""
+    ge = (values[:, None, :] >= values[None, :, :]).all(axis = -1)
+    gt = (values[:, None, :] > values[None, :, :]).any(axis = -1)
+    equal_earlier = np.tril(ge & ~gt, -1).any(axis = 1)
+    return ~((ge & gt).any(axis = 1) | equal_earlier)
+
+
+def samples(rng, n, k):
+    """Random, rounded (many ties) and anti-correlated sets of n points in k dimensions"""
+    yield rng.random((n, k))
+    yield rng.integers(0, 5, (n, k)).astype(float)
+    x = rng.random((n, k))
+    yield x / x.sum(axis = 1, keepdims = True) + 0.01 * rng.random((n, k))
+
+
+def main(n = 100000):
+    rng = np.random.default_rng(0)
+    for k in range(1, 6):
+        for values in samples(rng, 2000, k):
+            front = skyline(values)
+            assert np.array_equal(front, brute_force(values)), f'{k} objectives: the front differs from the brute force'
+    print('Same fronts as the brute force for 1 to 5 objectives')
+
+    t0 = time.perf_counter()
+    front = pareto_solvents(app.df.assign(Ra = rng.random(len(app.df)) * 20), list(PARETO_OBJECTIVES))
+    print(f'Catalog, {len(PARETO_OBJECTIVES)} objectives: {len(front)} solvents in the front, {1e3 * (time.perf_counter() - t0):.1f} ms')
+
+    for k in range(2, 6):
+        for name, values in zip(['uniform', 'ties', 'anti-correlated'], samples(rng, n, k)):
+            if k > 3 and name == 'anti-correlated':
+                # Almost every point is in the front: the sort-filter-skyline is O(n x front), i.e. quadratic
+                values = values[:n // 10]
+            t0 = time.perf_counter()
+            front = skyline(values)
+            print(f'{k} objectives, {len(values):6d} {name:>15} points: {front.sum():6d} in the front, {time.perf_counter() - t0:6.3f} s')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the Hansen sphere fitting (hansen_sphere.fit_sphere) on synthetic solubility tests:
+materials with a random sphere, a random subset of tested solvents and some wrong labels. It reports
+the time of a single fit (as in a callback) and of a batch, in this process and over a process pool.
+
+Usage: python benchmarks/sphere_fit.py [n_materials] [n_tested]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import HANSEN_COORDINATES
+from hansen_sphere import SphereFit, fit_sphere, fit_spheres, relative_energy_difference, MAX_PROCESSES
+
+
+def synthetic_tests(X, n_materials, n_tested, seed = 0):
+    """Good and bad solvents of random spheres, with 5 % of the tested solvents labelled wrong"""
+    rng = np.random.default_rng(seed)
+    observations = []
+    while len(observations) < n_materials:
+        sphere = SphereFit(X[rng.integers(len(X))] + rng.normal(0, 1, 3), rng.uniform(4, 9), 1, 0, 0)
+        tested = np.zeros(len(X), dtype = bool)
+        tested[rng.choice(len(X), n_tested, replace = False)] = True
+        good = (relative_energy_difference(X, sphere) < 1) ^ (rng.random(len(X)) < 0.05)
+        if (good & tested).any():
+            observations.append((good & tested, ~good & tested))
+    return observations
+
+
+def main(n_materials = 200, n_tested = 40):
+    X = app.df[HANSEN_COORDINATES].values.astype(float)
+    observations = synthetic_tests(X, n_materials, n_tested)
+
+    times = []
+    for good, bad in observations[:20]:
+        start = time.perf_counter()
+        fit_sphere(X, good, bad)
+        times.append(time.perf_counter() - start)
+    print(f'Single fit ({n_tested} tested solvents): median {1e3 * np.median(times):.1f} ms, max {1e3 * max(times):.1f} ms')
+
+    start = time.perf_counter()
+    serial = fit_spheres(X, observations, processes = 1)
+    t_serial = time.perf_counter() - start
+    start = time.perf_counter()
+    pooled = fit_spheres(X, observations)
+    t_pool = time.perf_counter() - start
+    assert all(np.array_equal(a.center, b.center) and a.R0 == b.R0 for a, b in zip(serial, pooled))
+    fits = np.array([sphere.fit for sphere in serial])
+    print(f'{n_materials} materials: {t_serial:.2f} s in this process, {t_pool:.2f} s over {min(os.cpu_count(), MAX_PROCESSES)} processes (including their start-up),'
+          f' median DATAFIT {np.median(fits):.3f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Start-up time of the app, in fresh processes: the time to import app.py and the time until the
+first response (the import and the first page load, which builds the layout), and the heaviest
+imports according to `python -X importtime`. With --max-import, it exits with an error if the
+import takes longer (in seconds), e.g. to catch an eager import of a slow module.
+
+Usage: python benchmarks/startup_time.py [rounds] [--max-import seconds]
+"""
+import statistics
+import subprocess
+import sys
+
+import dash_client # Runs from the repository root
+
+N_TOP = 15
+
+FIRST_RESPONSE = '''
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.server.test_client().get('/')
+assert response.status_code == 200
+print(t1 - t0, time.perf_counter() - t0)
+'''
+
+
+def startup_times():
+    """Import time and time to the first response of app.py, in a new process"""
+    output = subprocess.run([sys.executable, '-c', FIRST_RESPONSE], capture_output = True, text = True, check = True).stdout
+    return [float(value) for value in output.split()]
+
+def import_times():
+    """
+    The modules imported by app.py (directly or not), with their own and cumulative import time in
+    seconds and their depth in the import tree (0 for app), from the output of python -X importtime
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], capture_output = True, text = True, check = True).stderr
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6, (len(name) - len(name.lstrip()) - 1) // 2))
+    # The imports of a module are listed right before it, deeper in the tree
+    end = [name for name, _, _, depth in modules].index('app')
+    start = end
+    while start > 0 and modules[start - 1][3] > 0:
+        start -= 1
+    return modules[start:end + 1]
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    max_import = None
+    if '--max-import' in arguments:
+        i = arguments.index('--max-import')
+        max_import = float(arguments[i + 1])
+        del arguments[i:i + 2]
+    rounds = int(arguments[0]) if arguments else 5
+
+    import_time, first_response = zip(*[startup_times() for _ in range(rounds)])
+    print(f'import app: {statistics.median(import_time):.3f} s, first response: {statistics.median(first_response):.3f} s (median of {rounds})')
+
+    modules = import_times()
+    print('Heaviest imports of app.py (cumulative, -X importtime):')
+    for name, own, cumulative, depth in sorted((m for m in modules if m[3] == 1), key = lambda m: -m[2])[:N_TOP]:
+        print(f'  {name:30s} {cumulative * 1000:8.1f} ms')
+    print(f'  {"app.py itself":30s} {modules[-1][1] * 1000:8.1f} ms')
+
+    if max_import is not None and statistics.median(import_time) > max_import:
+        sys.exit(f'The import of app.py takes longer than {max_import} s')
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the static assets route: the structures SVGs sent from disk with send_from_directory
+(as before) against the precompressed variants in memory, with a first visit (gzip accepted) and a
+revalidation (If-None-Match), and the bytes sent for all the structures.
+
+Usage: python benchmarks/static_assets.py [repeat]
+"""
+import sys
+import time
+
+import flask
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+
+
+def main(repeat = 5):
+    names = [name for name in app.static_assets().etags if name.endswith('.svg')]
+    # The route as it was, from disk (added before the first request)
+    app.server.add_url_rule('/static-disk/<resource>', 'serve_static_disk',
+                            lambda resource: flask.send_from_directory(app.STATIC_PATH, resource))
+    client = app.server.test_client()
+
+    scenarios = {'from disk' : lambda name: client.get(f'/static-disk/{name}', headers = {'Accept-Encoding' : 'gzip'}),
+                 'precompressed' : lambda name: client.get(app.static_assets().url(name), headers = {'Accept-Encoding' : 'gzip'}),
+                 'revalidation (304)' : lambda name: client.get(app.static_assets().url(name), headers = {'Accept-Encoding' : 'gzip',
+                                                                'If-None-Match' : f'"{app.static_assets().etags[name]}-gz"'})}
+    for scenario, get in scenarios.items():
+        sizes = [len(get(name).data) for name in names]
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for name in names:
+                get(name)
+        t = (time.perf_counter() - t0) / (repeat * len(names))
+        print(f'{scenario:>20}: {1e6 * t:6.0f} us per request, {sum(sizes) / 1024:6.1f} kB for the {len(names)} structures')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Equivalence check and benchmark of the quick path engine (support_functions.suggested_path)
+against the previous implementation, which re-filtered and re-sorted the table at each step.
+
+Usage: python benchmarks/suggested_path.py
+"""
+import random
+import sys
+import timeit
+
+import numpy as np
+
+import dash_client  # noqa: F401 (sets the working directory and the path)
+import app
+from support_functions import solvent_ranking, solvents_filter, suggested_path, quick_path_mask
+
+
+def suggested_path_reference(df, ref_solvent = None, min_score = 1.0):
+    """Previous implementation of suggested_path, kept as the reference"""
+    solvent_path = []
+    if ref_solvent is None:
+        ref_GSK = min_score
+    else:
+        ref_GSK = ref_solvent['Composite score']
+        solvent_path.append(ref_solvent['Solvent Name'])
+    while True:
+        df1 = (df[(df['Composite score'] > ref_GSK) & (df['Ra'] > 0.0)]).sort_values(by = 'Ra', inplace = False)
+        if len(df1) == 0: break
+        ref_solvent = df1.iloc[0]
+        solvent_path.append(ref_solvent['Solvent Name'])
+        ref_GSK = ref_solvent['Composite score']
+    index = df.index.intersection(solvent_path)
+    return (df.loc[index]).sort_values(by = 'Ra', inplace = False)
+
+
+def is_greedy_path(df, path, ref_GSK):
+    """
+    True if each solvent of the path is one of the closest solvents with a G higher than the previous
+    one, i.e. the path differs from the reference only in the choice between solvents with the same Ra
+    """
+    candidates = df[(df['Ra'] > 0) & df['Composite score'].notnull()]
+    for name in path.index:
+        eligible = candidates[candidates['Composite score'] > ref_GSK]
+        if not len(eligible) or candidates.loc[name, 'Ra'] != eligible['Ra'].min():
+            return False
+        ref_GSK = candidates.loc[name, 'Composite score']
+    return not (candidates['Composite score'] > ref_GSK).any()
+
+
+def check_equivalence(n_cases = 2000):
+    rng = random.Random(0)
+    names = list(app.df.index)
+    different, ties = 0, 0
+    for _ in range(n_cases):
+        scores = [rng.sample(group, rng.randint(0, len(group))) for group in [app.WASTE, app.HEALTH, app.ENVIRONMENT, app.SAFETY]]
+        if rng.random() < 0.5:
+            solvent = rng.choice(names)
+            reference = app.df.loc[solvent, app.HANSEN_COORDINATES].values.astype(float)
+        else:
+            solvent = None
+            reference = [rng.uniform(14, 22), rng.uniform(0, 20), rng.uniform(0, 30)]
+        dfr = solvent_ranking(app.df, list(np.round(reference, 2)), scores)
+        dfr = dfr[solvents_filter(dfr, rng.choice([0, 0, 4]), rng.sample(['H225', 'H302', 'H319'], rng.randint(0, 2)),
+                                  app.TEMPERATURE_RANGE, app.VISCOSITY_RANGE, app.SURFACE_TENSION_RANGE)]
+        ref_solvent = None if solvent is None else dfr.loc[solvent] if solvent in dfr.index else None
+        new = suggested_path(dfr, ref_solvent = ref_solvent)
+        old = suggested_path_reference(dfr, ref_solvent = ref_solvent)
+        if list(new.index) != list(old.index):
+            start = 1.0 if ref_solvent is None else ref_solvent['Composite score']
+            if is_greedy_path(dfr, new[new.index != solvent], start):
+                ties += 1
+            else:
+                different += 1
+    print(f'{n_cases} random cases: {different} different paths, {ties} different only due to ties in Ra')
+    return different
+
+
+def synthetic(n, seed = 0):
+    """Synthetic catalog of n solvents, resampled from the real table with some noise"""
+    rng = np.random.default_rng(seed)
+    dfs = app.df.sample(n, replace = True, random_state = seed).reset_index(drop = True)
+    dfs['Solvent Name'] = [f'Solvent {i}' for i in range(n)]
+    dfs.index = dfs['Solvent Name']
+    dfs[app.HANSEN_COORDINATES] += rng.normal(0, 0.5, (n, 3))
+    dfs['Composite score'] = (dfs['Composite score'] + rng.normal(0, 0.5, n)).round(1)
+    return solvent_ranking(dfs, [18, 6, 8], [app.WASTE, app.HEALTH, app.ENVIRONMENT, app.SAFETY])
+
+
+def benchmark():
+    for n in [1000, 10000, 100000]:
+        dfs = synthetic(n)
+        number = max(1, 20000 // n)
+        t_old = timeit.timeit(lambda: suggested_path_reference(dfs), number = number) / number
+        t_new = timeit.timeit(lambda: suggested_path(dfs), number = number) / number
+        print(f'n = {n:6d}: previous {1e3 * t_old:8.2f} ms, new {1e3 * t_new:7.2f} ms ({t_old / t_new:.0f}x)')
+
+    # Many solutes at once (2D engine)
+    dfs = synthetic(10000)
+    solutes = np.random.default_rng(1).uniform([14, 0, 0], [22, 20, 30], (100, 3))
+    X = dfs[app.HANSEN_COORDINATES].values
+    Ra = np.sqrt(((4, 1, 1) * (X[None, :, :] - solutes[:, None, :])**2).sum(axis = 2)).round(2)
+    t = timeit.timeit(lambda: quick_path_mask(Ra, dfs['Composite score'].values), number = 5) / 5
+    print(f'100 solutes x 10000 solvents in one call: {1e3 * t:.1f} ms')
+
+
+if __name__ == '__main__':
+    wrong = check_equivalence()
+    benchmark()
+    sys.exit(1 if wrong else 0)
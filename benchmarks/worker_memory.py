@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Memory and start-up time of the gunicorn workers, with the configuration of the repository
+(gunicorn.conf.py: the app preloaded in the master, shared by the workers) and without it (each
+worker imports the app). For each number of workers, gunicorn is started, a few requests are sent
+to warm up the workers, and the memory of all its processes is read from /proc (Linux only):
+PSS, the memory shared between processes being split among them, and USS, the memory of each
+process alone. The start-up time is the time until all the workers have loaded the app.
+
+Usage: python benchmarks/worker_memory.py [max_workers] (requires gunicorn)
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import dash_client # Runs from the repository root
+
+PORT = 8765
+N_REQUESTS = 50
+
+# Configuration wrapper: the configuration under test, and a hook that records when each worker is ready
+CONFIG = '''
+import os, time
+{base}
+def post_worker_init(worker):
+    with open({ready!r}, 'a') as f:
+        f.write(f'{{os.getpid()}} {{time.time()}}\\n')
+'''
+CONFIGS = {'preloaded (gunicorn.conf.py)' : "exec(open('gunicorn.conf.py').read())",
+           'one import per worker' : 'preload_app = False'}
+
+
+def memory(pid):
+    """PSS and USS of the process, in bytes"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+def warm_up(n_requests = N_REQUESTS):
+    """Rankings of random solutes, spread among the workers"""
+    for i in range(n_requests):
+        body = json.dumps({'solutes' : [[15 + i % 7, 2 + i % 13, 3 + i % 17]], 'k' : 20}).encode()
+        request = urllib.request.Request(f'http://127.0.0.1:{PORT}/api/rank', data = body, headers = {'Content-Type' : 'application/json'})
+        urllib.request.urlopen(request, timeout = 30).read()
+    urllib.request.urlopen(f'http://127.0.0.1:{PORT}/', timeout = 30).read()
+
+def run(base, n_workers):
+    """Starts gunicorn with the configuration, returns the start-up time and the memory of its processes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ready, config = os.path.join(tmp, 'ready'), os.path.join(tmp, 'config.py')
+        with open(config, 'w') as f:
+            f.write(CONFIG.format(base = base, ready = ready))
+        t0 = time.time()
+        process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:server', '-c', config, '-w', str(n_workers),
+                                    '-b', f'127.0.0.1:{PORT}', '--log-level', 'warning'], stderr = subprocess.DEVNULL)
+        try:
+            workers = []
+            while len(workers) < n_workers:
+                if process.poll() is not None:
+                    raise RuntimeError('gunicorn exited')
+                time.sleep(0.05)
+                if os.path.exists(ready):
+                    with open(ready) as f:
+                        workers = [line.split() for line in f]
+            startup = max(float(t) for _, t in workers) - t0
+            warm_up()
+            pss, uss = zip(*[memory(pid) for pid in [process.pid] + [int(pid) for pid, _ in workers]])
+        finally:
+            process.terminate()
+            process.wait()
+    return startup, sum(pss), uss[0], sum(uss[1:]) / n_workers
+
+
+if __name__ == '__main__':
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    MB = 2**20
+    for name, base in CONFIGS.items():
+        print(name)
+        for n_workers in sorted({1, 2, max_workers}):
+            startup, pss, master, worker = run(base, n_workers)
+            print(f'  {n_workers} workers: all ready in {startup:5.2f} s, total PSS {pss / MB:6.1f} MB,'
+                  f' USS master {master / MB:6.1f} MB, USS per worker {worker / MB:6.1f} MB')
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Search of binary and ternary solvent blends that match a solute.
+
+The HSP of a blend is the volume-fraction-weighted average of the HSP of its solvents, and its
+subcategory scores are averaged in the same way before computing the composite score with the logic
+of GSK_calculator (geometric mean of the subcategories, then of the categories). The fractions are
+taken from a grid (multiples of step).
+
+The result is the Pareto front of Ra against G (support_functions.pareto_front). To avoid the brute
+force over all the pairs (and triples) of solvents, the blends are found with range queries on the
+spatial index of the solvents: the blend phi*a + (1 - phi)*b is within R of the solute s only if b is
+within R/(1 - phi) of (s - phi*a)/(1 - phi), in the scaled Hansen space (2dD, dP, dH). R is bounded
+by the front found so far: the G of a blend is at most the mean of the (weighted arithmetic) scores of
+its solvents, and a blend further than the first point of the front with such a G is dominated. So
+the binary search is exhaustive, while the ternary blends are pruned to those that extend one of the
+pairs with a binary blend close to the front, with the third solvent found by the same kind of query.
+"""
+from itertools import chain
+
+import numpy as np
+from pandas import DataFrame
+
+from support_functions import HANSEN_COORDINATES, HANSEN_SCALE, SCORES, hansen_index, pareto_front
+from catalog import ScoreCube
+
+BLEND_COLUMNS = ['Solvent 1', 'Solvent 2', 'Solvent 3', 'Fraction 1', 'Fraction 2', 'Fraction 3'] + HANSEN_COORDINATES + ['Ra', 'Composite score']
+
+
+def blend_properties(hansen_coordinates, values, weights, reference, components, fractions):
+    """
+    HSP, Ra and composite score of blends:
+        - hansen_coordinates: N x 3 array with the HSP of the solvents
+        - values: N x C array with the subcategory scores of the solvents (the columns of a ScoreCube)
+        - weights: vector with the weight of each subcategory in log G (see ScoreCube.weights)
+        - reference: 3-element vector with the HSP of the solute
+        - components: M x K array with the positions of the solvents of each blend
+        - fractions: M x K array with their volume fractions (summing 1)
+    Returns:
+        The M x 3 HSP of the blends and their Ra (rounded to 2 decimals), and G (rounded to 1 decimal)
+    """
+    hsp = np.einsum('mk,mkj->mj', fractions, hansen_coordinates[components])
+    Ra = np.sqrt(((((hsp - reference) * HANSEN_SCALE))**2).sum(axis = 1)).round(2)
+    selected = weights > 0
+    if not selected.any():
+        return hsp.round(2), Ra, np.full(len(hsp), np.nan)
+    scores = np.einsum('mk,mkj->mj', fractions, values[:, selected][components]) # nan if any solvent has no score
+    G = np.exp(np.log(scores) @ weights[selected]).round(1)
+    return hsp.round(2), Ra, G
+
+def front_radius(front_Ra, front_G, G_bound, max_Ra):
+    """
+    Largest Ra for which a blend with G up to G_bound could be in the front: the Ra of the first point
+    of the front with a G as high (max_Ra if there is none), as any further blend would be dominated:
+        - front_Ra, front_G: the current front, sorted by Ra (so G is increasing)
+        - G_bound: array with an upper bound of the G of the blends (nan if they have no score)
+        - max_Ra: maximum distance of the blends to the solute
+    Returns:
+        An array with the radius for each bound (-1 for nan bounds, nothing to find)
+    """
+    position = np.searchsorted(front_G, np.nan_to_num(G_bound, nan = np.inf), side = 'left')
+    radius = np.append(front_Ra, max_Ra)[position]
+    return np.where(np.isnan(G_bound), -1.0, np.minimum(radius, max_Ra))
+
+def range_query(index, centers, radii, bins = 1.25):
+    """
+    Range queries with a different radius for each center. The centers are grouped by their radius
+    (in geometric bins) to query them at once, so some points slightly out of their radius are returned:
+        - index: spatial index of the solvents (see support_functions.hansen_index)
+        - centers: M x 3 array with the centers of the queries, in the scaled Hansen space
+        - radii: array with the radius of each query, no query for the negative ones
+        - bins: ratio between the radii of consecutive groups
+    Returns:
+        Two arrays with the position of the center and the position of the solvent, for each match
+    """
+    queries, found = [np.empty(0, dtype = int)], [np.empty(0, dtype = int)]
+    valid = np.flatnonzero(radii >= 0)
+    groups = np.ceil(np.log(np.maximum(radii[valid], 1e-3)) / np.log(bins))
+    for group in np.unique(groups):
+        members = valid[groups == group]
+        matches = index.query_ball_point(centers[members], bins**group)
+        counts = np.array([len(match) for match in matches], dtype = int)
+        queries.append(np.repeat(members, counts))
+        found.append(np.fromiter(chain.from_iterable(matches), dtype = int, count = counts.sum()))
+    return np.concatenate(queries), np.concatenate(found)
+
+def pair_blends(index, reference, step, mask, radius):
+    """
+    The binary blends (fractions multiples of step) that can be in the front, from range queries:
+    the blend of a (fraction phi) and b is within R of the solute s only if b is within R/(1 - phi)
+    of (s - phi*a)/(1 - phi), in the scaled Hansen space. The queries are done from the solvent
+    with the largest fraction (phi >= 0.5), so their radius is at most 2R.
+        - index: spatial index of the solvents (see support_functions.hansen_index)
+        - reference: 3-element vector with the HSP of the solute
+        - step: step of the volume fractions
+        - mask: boolean array, only the True solvents are used
+        - radius: function of the fractions (K x 2) and solvents (K x 2, -1 for any solvent) returning
+          the maximum Ra of the blends that can be in the front, evaluated when each fraction is searched
+    Yields:
+        For each fraction, two arrays: M x 2 with the positions of the solvents and M x 2 with their fractions
+    """
+    solute = np.asarray(reference, dtype = float) * HANSEN_SCALE
+    candidates = np.flatnonzero(mask)
+    n_steps = int(round(1 / step))
+    for i in range(n_steps - 1, (n_steps - 1) // 2, -1):
+        phi = np.array([i, n_steps - i]) / n_steps
+        centers = (solute - phi[0] * index.data[candidates]) / phi[1]
+        seeds = np.column_stack([candidates, np.full(len(candidates), -1)])
+        queries, second = range_query(index, centers, radius(np.tile(phi, (len(seeds), 1)), seeds) / phi[1])
+        first = candidates[queries]
+        keep = (first != second) & mask[second]
+        if 2 * i == n_steps: # 50:50, each blend is found twice
+            keep &= first < second
+        yield np.column_stack([first[keep], second[keep]]), np.tile(phi, (keep.sum(), 1))
+
+def triple_blends(index, reference, step, mask, radius, pairs, chunk = 10**4):
+    """
+    The ternary blends (fractions multiples of step) that can be in the front and contain one of the pairs
+    (a blend may be found more than once, from each of its pairs):
+        - index, reference, step, mask, radius: see pair_blends (with K x 3 fractions and solvents)
+        - pairs: P x 2 array with the positions of the pairs of solvents to extend with a third one
+        - chunk: number of pairs extended at once, to bound the memory
+    Yields:
+        Two arrays, M x 3 with the positions of the solvents and M x 3 with their fractions
+    """
+    solute = np.asarray(reference, dtype = float) * HANSEN_SCALE
+    n_steps = int(round(1 / step))
+    for i in range(1, n_steps - 1):
+        for j in range(1, n_steps - i):
+            phi = np.array([i, j, n_steps - i - j]) / n_steps
+            for start in range(0, len(pairs), chunk):
+                seeds = pairs[start:start + chunk]
+                centers = (solute - phi[0] * index.data[seeds[:, 0]] - phi[1] * index.data[seeds[:, 1]]) / phi[2]
+                queries, third = range_query(index, centers, radius(np.tile(phi, (len(seeds), 1)), np.column_stack([seeds, np.full(len(seeds), -1)])) / phi[2])
+                blend = np.column_stack([seeds[queries], third])
+                keep = (third != blend[:, 0]) & (third != blend[:, 1]) & mask[third]
+                yield blend[keep], np.tile(phi, (keep.sum(), 1))
+
+def blend_search(df, reference, scores = SCORES, max_Ra = 8.0, step = 0.1, ternary = True, mask = None, index = None, cube = None, slack = 2.0):
+    """
+    Finds the blends (and pure solvents) within max_Ra of the solute and returns the Pareto front of Ra against G:
+        - df: DataFrame structure with the solvent info (HSP and score columns at least)
+        - reference: 3-element vector with the HSP of the solute
+        - scores: list of scores category, each element containing a list with the subcategories names
+        - max_Ra: maximum distance of the blends to the solute
+        - step: step of the volume fractions of the solvents, 1 / step must be an integer
+        - ternary: if False, only the binary blends are searched
+        - mask: boolean array (e.g. from solvents_filter), only the True solvents are used
+        - index: spatial index of df (see support_functions.hansen_index), built if not given
+        - cube: ScoreCube of df, built if not given
+        - slack: the ternary blends extend the pairs with a binary blend less than slack below the G of the binary front
+    Returns:
+        A DataFrame with the blends in the front, sorted by Ra, with the columns of BLEND_COLUMNS
+        (the missing solvents of the pure solvents and binary blends are None, with fraction 0).
+        Raises a ValueError if 1 / step is not an integer
+    """
+    if not 0 < step <= 0.5 or abs(1 / step - round(1 / step)) > 1e-6:
+        raise ValueError(f'The step of the fractions must divide 1 (e.g. 0.1 or 0.25), not {step}')
+    hansen_coordinates = df[HANSEN_COORDINATES].values.astype(float)
+    mask = np.ones(len(df), dtype = bool) if mask is None else np.asarray(mask, dtype = bool)
+    index = hansen_index(hansen_coordinates) if index is None else index
+    cube = ScoreCube(df) if cube is None else cube
+    values, weights = cube.frame.values.astype(float), cube.weights(scores)
+
+    # Upper bound of the G of a blend (weighted geometric mean of its scores): the weighted arithmetic
+    # mean of the scores, i.e. the mean of the arithmetic scores of its solvents (plus the rounding)
+    selected = weights > 0
+    arithmetic = values[:, selected] @ weights[selected] if selected.any() else np.full(len(df), np.nan)
+    best_arithmetic = np.nanmax(np.where(mask, arithmetic, np.nan), initial = -np.inf)
+
+    # The front found so far, sorted by Ra: solvents (-1 if none), fractions, HSP, Ra and G
+    front = [np.empty((0, 3), dtype = int), np.empty((0, 3)), np.empty((0, 3)), np.empty(0), np.empty(0)]
+    def radius(fractions, components):
+        solvent_scores = np.where(components >= 0, arithmetic[components], best_arithmetic)
+        return front_radius(front[3], front[4], (fractions * solvent_scores).sum(axis = 1) + 0.05, max_Ra) + 0.005
+
+    def add_blends(components, fractions):
+        """Updates the front with the blends, returns their Ra and G"""
+        hsp, Ra, G = blend_properties(hansen_coordinates, values, weights, reference, components, fractions)
+        keep = Ra <= max_Ra
+        padding = ((0, 0), (0, 3 - components.shape[1]))
+        candidates = [np.pad(components[keep], padding, constant_values = -1), np.pad(fractions[keep], padding), hsp[keep], Ra[keep], G[keep]]
+        candidates = [np.concatenate([old, new]) for old, new in zip(front, candidates)]
+        best = np.flatnonzero(pareto_front(candidates[3], candidates[4]))
+        best = best[np.argsort(candidates[3][best], kind = 'mergesort')]
+        front[:] = [column[best] for column in candidates]
+        return Ra, G
+
+    # The pure solvents first, then the blends that could improve the front found so far
+    pure = np.flatnonzero(mask)
+    add_blends(pure[:, None], np.ones((len(pure), 1)))
+    pairs, pairs_Ra, pairs_G = [], [], []
+    for components, fractions in pair_blends(index, reference, step, mask, radius):
+        Ra, G = add_blends(components, fractions)
+        pairs.append(components)
+        pairs_Ra.append(Ra)
+        pairs_G.append(G)
+    if ternary and pairs:
+        # Only the pairs with a blend close to the binary front (less than slack below its G) are extended
+        pairs, pairs_Ra, pairs_G = np.concatenate(pairs), np.concatenate(pairs_Ra), np.concatenate(pairs_G)
+        front_G = np.append(-np.inf, front[4])[np.searchsorted(front[3], pairs_Ra, side = 'right')]
+        pairs = np.unique(np.sort(pairs[pairs_G > front_G - slack], axis = 1), axis = 0)
+        for components, fractions in triple_blends(index, reference, step, mask, radius, pairs):
+            add_blends(components, fractions)
+
+    components, fractions, hsp, Ra, G = front
+    names = np.where(components >= 0, df['Solvent Name'].values[components], None)
+    return DataFrame(np.column_stack([names, fractions, hsp, Ra, G]), columns = BLEND_COLUMNS)\
+        .astype({column : float for column in BLEND_COLUMNS[3:]})
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded, thread-safe cache of the values computed in one request and reused in the following ones
+(e.g. the rankings of the app), optionally stored on disk, with the same cache_info() as
+functools.lru_cache, so its hits and misses are exported in the same way (see instrumentation.py).
+"""
+import os
+import pickle
+import tempfile
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+
+# Same fields as the cache_info() of functools.lru_cache
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class LRUCache:
+    """
+    A thread-safe dictionary that keeps only the maxsize last used items, for values that are
+    computed in one callback and used in the following ones (see cache_info() for the hits and misses).
+    Optionally, the items are also evicted by size, and stored on disk, to be shared by the processes
+    and kept after a restart:
+        - maxsize: maximum number of items in memory
+        - maxbytes: maximum size of the items in memory, in bytes, as given by sizeof (no limit if None)
+        - sizeof: function that returns the (approximate) size of an item in bytes, required by maxbytes
+        - path: folder where the items are also stored (pickled, one file per key), None for memory only.
+          The keys must be valid file names (e.g. hashes)
+        - disk_maxbytes: maximum size of the folder, the least recently used files are removed above it
+    """
+    def __init__(self, maxsize = 64, maxbytes = None, sizeof = None, path = None, disk_maxbytes = 2**30):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.currbytes = 0
+        self.lock = Lock()
+        self.hits = self.misses = self.disk_hits = 0
+        if path is not None:
+            try:
+                os.makedirs(path, exist_ok = True)
+            except OSError:
+                path = None
+        self.path = path
+        self.disk_maxbytes = disk_maxbytes
+
+    def get(self, key, default = None):
+        with self.lock:
+            if key in self.items:
+                self.hits += 1
+                self.items.move_to_end(key)
+                return self.items[key]
+        value = self._load(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+            self._add(key, value)
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self._add(key, value)
+        self._store(key, value)
+
+    def _add(self, key, value):
+        if key in self.items:
+            self.currbytes -= self.sizes.pop(key, 0)
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if self.maxbytes is not None:
+            self.sizes[key] = self.sizeof(value)
+            self.currbytes += self.sizes[key]
+        # The last item is kept even if it is larger than maxbytes, as it is about to be used
+        while len(self.items) > self.maxsize or (self.maxbytes is not None and self.currbytes > self.maxbytes and len(self.items) > 1):
+            old, _ = self.items.popitem(last = False)
+            self.currbytes -= self.sizes.pop(old, 0)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.pkl')
+
+    def _load(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                value = pickle.load(f)
+            os.utime(self._file(key)) # The modification time is the last use, for the eviction
+            return value
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None # Not stored, or stored by another version of the code
+
+    def _store(self, key, value):
+        if self.path is None:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix = '.', suffix = '.tmp', dir = self.path)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(value, f, protocol = pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self._file(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            files = [entry for entry in os.scandir(self.path) if entry.name.endswith('.pkl')]
+            total = sum(entry.stat().st_size for entry in files)
+            for entry in sorted(files, key = lambda entry: entry.stat().st_mtime):
+                if total <= self.disk_maxbytes:
+                    break
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+        except OSError:
+            pass # Another process removed the files, or the disk is full: the item is only kept in memory
+
+    def cache_info(self):
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self.items))
+
+    def cache_stats(self):
+        """The hits that were found on disk, and the size of the items in memory (and its limit), in bytes"""
+        with self.lock:
+            return {'disk_hits' : self.disk_hits, 'bytes' : self.currbytes, 'maxbytes' : self.maxbytes or 0}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Data structures of the solvents built once from the table and shared by all the requests: the
+solvents as contiguous typed arrays (SolventCatalog), which the functions of support_functions accept
+in place of the DataFrame, and the subcategory scores in log-space (ScoreCube), from which the
+composite score of any selection of subcategories is one matrix-vector product, or a lookup.
+"""
+import sys
+from copy import copy
+
+import numpy as np
+from pandas import DataFrame
+
+from instrumentation import timed
+from support_functions import HANSEN_COORDINATES, SCORES, PROPERTIES, GSK_calculator, hazard_matrix
+
+
+class SolventCatalog:
+    """
+    The solvents as contiguous typed arrays, to rank and filter them without the overhead of pandas
+    on each call: the HSP (N x 3), the subcategory scores and the physical properties as matrices,
+    the hazard matrix as a boolean array, and the names, CAS numbers and GHS labels interned. The columns are
+    looked up by name, as in the DataFrame (catalog['Boiling Point (°C)'] is a column of a matrix,
+    catalog[HANSEN_COORDINATES] the HSP matrix), and the functions of support_functions that rank, filter
+    and screen the solvents, and those of the figure and the reports, accept it in place of the DataFrame. A boolean mask (or positions) gives
+    the catalog of those solvents, catalog[mask], and a solvent is found by name or CAS in O(1):
+        - df: DataFrame structure with the solvent info (see dataset.load_solvents)
+        - scores: list of scores category, each element containing a list with the subcategories names
+        - properties: columns of the physical properties
+        - hazards: hazard matrix of df (see hazard_matrix), it is created if not given
+        - dtype: type of the HSP matrix, float64 by default, for the same rankings as the DataFrame. With
+          float32 it takes half the memory, but the rounded Ra of a few solvents may change by 0.01
+    """
+    def __init__(self, df, scores = SCORES, properties = PROPERTIES, hazards = None, dtype = np.float64):
+        intern = lambda column: np.array([sys.intern(str(value)) for value in df[column]], dtype = object)
+        self.names = intern('Solvent Name')
+        self.cas = intern('CAS Number')
+        self.labels = np.column_stack([intern('Hazard Labels'), intern('Precautionary Labels')]) # GHS labels, for the reports
+        self.hsp = np.ascontiguousarray(df[HANSEN_COORDINATES].values, dtype = dtype)
+        self.score_columns = [name for category in scores for name in category]
+        self.scores = np.ascontiguousarray(df[self.score_columns].values, dtype = float)
+        self.property_columns = list(properties)
+        self.properties = np.ascontiguousarray(df[self.property_columns].values, dtype = float)
+        hazards = hazard_matrix(df['Hazard Labels']) if hazards is None else hazards
+        self.hazards = np.ascontiguousarray(hazards.values, dtype = bool)
+        self.hazard_columns = {label : i for i, label in enumerate(hazards.columns)}
+        self.positions = np.arange(len(self.names)) # Position of each solvent in the full catalog
+        self.extra = {} # Request-dependent columns, e.g. 'Ra' and 'Composite score' (see assign)
+        self._lookups()
+
+    def _lookups(self):
+        self._by_name = self._by_cas = None # Built on first use, so taking some solvents stays cheap
+        self.columns = {'Solvent Name' : self.names, 'CAS Number' : self.cas,
+                        'Hazard Labels' : self.labels[:, 0], 'Precautionary Labels' : self.labels[:, 1]}
+        for names, matrix in [(HANSEN_COORDINATES, self.hsp), (self.score_columns, self.scores), (self.property_columns, self.properties)]:
+            self.columns.update({name : matrix[:, i] for i, name in enumerate(names)})
+        self.columns.update(self.extra)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, key):
+        """A column (by name), a matrix of columns (a list of names) or the catalog of some solvents (a boolean mask or positions)"""
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, list) and len(key) and all(isinstance(name, str) for name in key):
+            if key == HANSEN_COORDINATES:
+                return self.hsp
+            return np.column_stack([self.columns[name] for name in key])
+        return self.take(key)
+
+    def take(self, rows):
+        """The catalog of the solvents in rows, a boolean mask or an array of positions (in this catalog)"""
+        catalog = copy(self)
+        for attribute in ['names', 'cas', 'labels', 'hsp', 'scores', 'properties', 'hazards', 'positions']:
+            setattr(catalog, attribute, getattr(self, attribute)[rows])
+        catalog.extra = {name : values[rows] for name, values in self.extra.items()}
+        catalog._lookups()
+        return catalog
+
+    def assign(self, **columns):
+        """The same catalog (the arrays are shared) with the request-dependent columns added (arrays or numbers)"""
+        catalog = copy(self)
+        catalog.extra = dict(self.extra)
+        for name, values in columns.items():
+            catalog.extra[name] = np.full(len(self), values, dtype = float) if np.ndim(values) == 0 else np.asarray(values)
+        catalog._lookups()
+        return catalog
+
+    @property
+    def by_name(self):
+        """Position of each solvent, by name"""
+        if self._by_name is None:
+            self._by_name = {name : i for i, name in enumerate(self.names)}
+        return self._by_name
+
+    @property
+    def by_cas(self):
+        """Position of each solvent, by CAS number"""
+        if self._by_cas is None:
+            self._by_cas = {cas : i for i, cas in enumerate(self.cas)}
+        return self._by_cas
+
+    def position(self, name):
+        """Position of the solvent, by name, or by CAS number"""
+        return self.by_name[name] if name in self.by_name else self.by_cas[name]
+
+    def get_indexer(self, names):
+        """Positions of the solvents, by name, -1 for the ones not in the catalog (as pandas.Index.get_indexer)"""
+        return np.array([self.by_name.get(name, -1) for name in names], dtype = int)
+
+    def row(self, position):
+        """All the columns of a solvent, as a dictionary, e.g. for its report (see create_report)"""
+        return {name : values[position] for name, values in self.columns.items()}
+
+    def to_frame(self):
+        """The catalog as a DataFrame structure indexed by name"""
+        return DataFrame({name : values for name, values in self.columns.items()}, index = self.names.copy())
+
+class ScoreCube:
+    """
+    Subcategory scores of the solvents in log-space, so the composite score of any selection of
+    subcategories is a single matrix-vector product: log G = sum_i log(x_i) / (len(category_i) * k).
+    The result is the same, bit by bit, as GSK_calculator: the few values that fall close to a
+    rounding boundary (where the floating point error of both paths may matter) are recomputed
+    with GSK_calculator.
+        - df: DataFrame structure with all the scores columns, or a SolventCatalog
+        - scores: list of scores category, each element containing a list with the subcategories names
+    """
+    def __init__(self, df, scores = SCORES):
+        self.scores = [list(category) for category in scores]
+        self.columns = [name for category in self.scores for name in category]
+        self.frame = df if isinstance(df, SolventCatalog) else df[self.columns]
+        values = np.ascontiguousarray(self.frame[self.columns], dtype = float)
+        self.missing = np.isnan(values)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            self.logs = np.ascontiguousarray(np.where(self.missing, 0.0, np.log(values)))
+        self.table = None
+
+    def weights(self, scores):
+        """
+        Weight of each subcategory (column of the cube) in log G:
+            - scores: list of scores category, each element containing a list with the subcategories names
+        Returns:
+            A vector with one weight per column, 0 for the subcategories not selected
+        """
+        selected = [category for category in scores if len(category)]
+        weights = np.zeros(len(self.columns))
+        for category in selected:
+            for name in category:
+                weights[self.columns.index(name)] = 1 / (len(category) * len(selected))
+        return weights
+
+    def _composite(self, weights, scores):
+        """Rounded composite score from the weights of the selection"""
+        # Only the selected columns: the log of a 0 score is -inf, and -inf * 0 would be nan for the others
+        selected = weights > 0
+        with np.errstate(invalid = 'ignore'):
+            G = np.exp(self.logs[:, selected] @ weights[selected])
+            G[(self.missing @ (weights > 0)) > 0] = np.nan
+            # Close to x.x5 the rounding may depend on the last bits, those values are computed as before
+            ambiguous = np.flatnonzero(np.abs(np.modf(10 * G)[0] - 0.5) < 1e-9)
+        G = G.round(1)
+        if len(ambiguous):
+            rows = self.frame[ambiguous] if isinstance(self.frame, SolventCatalog) else self.frame.iloc[ambiguous]
+            G[ambiguous] = GSK_calculator(rows, scores)[0]
+        return G
+
+    @timed
+    def composite(self, scores):
+        """
+        Composite score of the solvents (rounded to 1 decimal, as GSK_calculator) for the selected subcategories:
+            - scores: list of scores category, each element containing a list with the subcategories names
+        Returns:
+            An array with the composite score of each solvent, all nan if no subcategory is selected
+        """
+        if self.table is not None:
+            return self.table[:, self.subset(scores)]
+        if not any(len(category) for category in scores):
+            return np.full(len(self.logs), np.nan)
+        return self._composite(self.weights(scores), scores)
+
+    def subset(self, scores):
+        """Position of the selection of subcategories in the precomputed table (one bit per column)"""
+        return sum(1 << i for i, name in enumerate(self.columns) if any(name in category for category in scores))
+
+    def compute_table(self):
+        """The composite score of every possible selection of subcategories (solvents x 2^columns, see subset)"""
+        n = len(self.columns)
+        table = np.full((len(self.logs), 2**n), np.nan)
+        for mask in range(1, 2**n):
+            scores = [[name for name in category if 1 << self.columns.index(name) & mask] for category in self.scores]
+            table[:, mask] = self._composite(self.weights(scores), scores)
+        return table
+
+    def precompute(self, table = None):
+        """
+        Sets the table with the composite score of every possible selection of subcategories, after
+        which composite is a lookup. Returns the cube itself
+            - table: the table, if it is already computed (e.g. memory-mapped, see dataset.shared_array),
+              otherwise it is computed (see compute_table)
+        """
+        self.table = self.compute_table() if table is None else table
+        return self
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Loading of the solvent data from the Excel workbook.
+
+Parsing the workbook is slow, so it is converted once into a binary cache (an uncompressed .npz
+with one typed array per column and the strings as unicode arrays) that is rebuilt when the
+workbook changes (the SHA-1 of the workbook is stored in the cache). The cache can be built
+beforehand, e.g. at deploy time, with:
+
+    python dataset.py
+
+The arrays derived from the data that are expensive to build (e.g. the precomputed composite scores)
+can be stored in SHARED_PATH and memory-mapped read-only (see shared_array), so all the processes
+serving the app (the gunicorn workers) read the same pages instead of holding a copy each.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+XLSX_PATH = 'solventSelectionTool_table.xlsx'
+CACHE_PATH = 'solventSelectionTool_table.npz'
+CACHE_VERSION = 1 # Increase it if the content of the cache changes, so old caches are rebuilt
+SHARED_PATH = 'solventSelectionTool_shared'
+
+
+def read_solvents(xlsx_path = XLSX_PATH):
+    """
+    Reads the solvents and its properties (first sheet of the workbook) into a DataFrame,
+    indexed by the solvent name
+    """
+    df = pd.read_excel(xlsx_path, sheet_name = 0, header = 2)
+    df['index'] = df['Solvent Name']
+    df.set_index('index', inplace=True, drop=True) # The column name is set as a index, not sure is the wisest option
+    return df[1:] # Here I am manually dropping the first row, as it is empty
+
+def read_statements(xlsx_path = XLSX_PATH):
+    """Reads the full text of the GHS statements (second sheet of the workbook), indexed by the statement"""
+    df2 = pd.read_excel(xlsx_path, sheet_name = 1, header = 0, usecols=(0,1))
+    df2.set_index('Statements', inplace=True, drop=True)
+    return df2
+
+def file_hash(path):
+    """SHA-1 of the file content"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def frame_to_arrays(name, frame):
+    """Typed arrays of the columns and index of the DataFrame, with the keys prefixed by name"""
+    arrays = {f'{name}.columns' : np.array(frame.columns, dtype = str),
+              f'{name}.index' : np.array(frame.index, dtype = str),
+              f'{name}.index_name' : np.array(frame.index.name or '', dtype = str)}
+    for i, column in enumerate(frame.columns):
+        values = frame[column]
+        if values.dtype == object:
+            arrays[f'{name}.{i}'] = np.array(values.fillna(''), dtype = str)
+            arrays[f'{name}.{i}.null'] = values.isnull().values
+        else:
+            arrays[f'{name}.{i}'] = values.values
+    return arrays
+
+def arrays_to_frame(name, arrays):
+    """Inverse of frame_to_arrays"""
+    columns = list(arrays[f'{name}.columns'])
+    data = {}
+    for i, column in enumerate(columns):
+        values = arrays[f'{name}.{i}']
+        if values.dtype.kind == 'U':
+            values = values.astype(object)
+            values[arrays[f'{name}.{i}.null']] = np.nan
+        data[column] = values
+    index = pd.Index(arrays[f'{name}.index'].astype(object), name = str(arrays[f'{name}.index_name']) or None)
+    return pd.DataFrame(data, index = index, columns = columns)
+
+def build_cache(xlsx_path = XLSX_PATH, cache_path = CACHE_PATH):
+    """
+    Parses the workbook and writes the binary cache (atomically, so concurrent workers never read
+    a partial file). Returns the solvents and statements DataFrames
+    """
+    df, df2 = read_solvents(xlsx_path), read_statements(xlsx_path)
+    arrays = dict(frame_to_arrays('solvents', df), **frame_to_arrays('statements', df2))
+    arrays['version'] = np.array(CACHE_VERSION)
+    arrays['sha1'] = np.array(file_hash(xlsx_path))
+
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    fd, tmp_path = tempfile.mkstemp(suffix = '.npz', dir = directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return df, df2
+
+def cache_is_valid(npz, xlsx_path = XLSX_PATH):
+    """
+    True if the cache (opened with numpy.load) is up to date with the workbook
+    (if the workbook is not available, the cache is used as it is)
+    """
+    if int(npz['version']) != CACHE_VERSION:
+        return False
+    return not os.path.exists(xlsx_path) or str(npz['sha1']) == file_hash(xlsx_path)
+
+def load_frame(name, xlsx_path = XLSX_PATH, cache_path = CACHE_PATH):
+    """
+    Loads the DataFrame 'solvents' or 'statements' from the cache (only its arrays are read),
+    building the cache first if needed. If the cache can not be written (e.g. read-only file system),
+    the workbook is parsed every time
+    """
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle = False) as npz:
+            if cache_is_valid(npz, xlsx_path):
+                return arrays_to_frame(name, npz)
+    try:
+        frames = build_cache(xlsx_path, cache_path)
+    except OSError:
+        frames = read_solvents(xlsx_path), read_statements(xlsx_path)
+    return frames[['solvents', 'statements'].index(name)]
+
+def load_solvents(xlsx_path = XLSX_PATH, cache_path = CACHE_PATH):
+    """The solvents and its properties, indexed by the solvent name (see read_solvents)"""
+    return load_frame('solvents', xlsx_path, cache_path)
+
+def load_statements(xlsx_path = XLSX_PATH, cache_path = CACHE_PATH):
+    """The full text of the GHS statements, indexed by the statement (see read_statements)"""
+    return load_frame('statements', xlsx_path, cache_path)
+
+def data_key(xlsx_path = XLSX_PATH, cache_path = CACHE_PATH):
+    """Identifier of the version of the data (SHA-1 of the cache, or of the workbook if there is no cache)"""
+    return file_hash(cache_path if os.path.exists(cache_path) else xlsx_path)
+
+def shared_array(name, build, key, shared_path = SHARED_PATH):
+    """
+    Array derived from the data, stored once as an .npy file and memory-mapped read-only, so that
+    every process that uses it shares the same physical memory (the page cache). The file is
+    rebuilt when the key changes, and written atomically:
+        - name: name of the array (and of the file)
+        - build: function without arguments that computes the array
+        - key: string identifying the content of the array, e.g. data_key() and the parameters of build
+    Returns:
+        The read-only memory-mapped array, or the array built (in memory) if it can not be written
+    """
+    prefix = os.path.join(shared_path, name + '-')
+    path = prefix + hashlib.sha1(key.encode()).hexdigest()[:16] + '.npy'
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode = 'r', allow_pickle = False)
+        except (OSError, ValueError):
+            pass # Unreadable file, rebuilt below
+    array = np.ascontiguousarray(build())
+    try:
+        os.makedirs(shared_path, exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(suffix = '.npy', dir = shared_path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array, allow_pickle = False)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        return array
+    # The files of older versions are no longer needed (the processes that map them keep them open)
+    for old in os.listdir(shared_path):
+        old = os.path.join(shared_path, old)
+        if old.startswith(prefix) and old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return np.load(path, mmap_mode = 'r', allow_pickle = False)
+
+
+if __name__ == '__main__':
+    build_cache()
+    print(f'{CACHE_PATH} built from {XLSX_PATH}')
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Export of the rankings as CSV or Parquet, streamed chunk by chunk.
+
+The rankings are given as an iterable of DataFrames with the same columns (e.g. a generator with
+one ranking per solute), which is only consumed as the response is sent, so the memory used does
+not grow with the number of solutes or the size of the catalog. Each chunk is written with the
+vectorized writers of pandas (CSV) or pyarrow (Parquet), never row by row. Parquet needs the
+optional pyarrow package.
+"""
+import tempfile
+
+from pandas import DataFrame
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+CHUNK_SIZE = 10000 # Rows written at once
+FLOAT_FORMAT = '%.10g' # Numbers of the CSV, without the noise of their binary representation (e.g. 0.5630000000000001)
+SPOOL_SIZE = 2**24 # Bytes of a Parquet file kept in memory, larger files go to a temporary file
+BLOCK_SIZE = 2**16 # Bytes sent at once from a Parquet file
+
+FORMATS = {'csv' : ('text/csv', 'csv'), 'parquet' : ('application/vnd.apache.parquet', 'parquet')}
+
+
+def frame_chunks(frames, chunk_size = CHUNK_SIZE):
+    """The DataFrames split in chunks of at most chunk_size rows (the empty ones are skipped)"""
+    for frame in frames:
+        for start in range(0, len(frame), chunk_size):
+            yield frame.iloc[start:start + chunk_size]
+
+def csv_stream(frames, columns, chunk_size = CHUNK_SIZE, float_format = FLOAT_FORMAT):
+    """
+    CSV text of the DataFrames, as a generator of strings:
+        - frames: iterable of DataFrames, with (at least) the columns
+        - columns: the columns written, in order
+        - chunk_size: number of rows converted at once
+        - float_format: format of the floats (see pandas.DataFrame.to_csv)
+    """
+    yield DataFrame(columns = columns).to_csv(index = False)
+    for chunk in frame_chunks(frames, chunk_size):
+        yield chunk.to_csv(columns = columns, header = False, index = False, float_format = float_format)
+
+def parquet_stream(frames, columns, chunk_size = CHUNK_SIZE):
+    """
+    Parquet file of the DataFrames (one row group per chunk), as a generator of bytes. The file is
+    written first, in memory or a temporary file if it is large, as its footer goes at the end:
+        - frames: iterable of DataFrames, with (at least) the columns
+        - columns: the columns written, in order
+        - chunk_size: number of rows per row group
+    Raises a RuntimeError if pyarrow is not installed
+    """
+    if pyarrow is None:
+        raise RuntimeError('The Parquet export requires the pyarrow package')
+    with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as f:
+        writer = None
+        for chunk in frame_chunks(frames, chunk_size):
+            table = pyarrow.Table.from_pandas(chunk[columns], preserve_index = False)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(f, table.schema)
+            writer.write_table(table.cast(writer.schema))
+        if writer is None: # No rows, but still a valid file with the columns
+            writer = pyarrow.parquet.ParquetWriter(f, pyarrow.schema([(column, pyarrow.string()) for column in columns]))
+        writer.close()
+        f.seek(0)
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            yield block
+
+def export_stream(frames, columns, format = 'csv', chunk_size = CHUNK_SIZE):
+    """
+    The export of the DataFrames in the format, 'csv' or 'parquet' (see csv_stream and parquet_stream).
+    Raises a ValueError if the format is not known or not available
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format "{format}", it must be one of {list(FORMATS)}')
+    if format == 'parquet' and pyarrow is None:
+        raise ValueError('The Parquet export requires the pyarrow package')
+    return (csv_stream if format == 'csv' else parquet_stream)(frames, columns, chunk_size)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration of gunicorn (read automatically by `gunicorn app:server`, see the Procfile).
+
+The app is imported once, in the master (preload_app), before forking the workers: the data, the
+precomputed tables and the figure are built only once, and the workers start serving right after
+the fork, sharing the memory of the master (copy-on-write). To keep it shared, the garbage
+collector is kept off in the master while the app is imported and the objects created until the
+fork are frozen (gc.freeze), so the collections in the workers never write on their pages.
+"""
+import gc
+
+# The bind address ($PORT) and the number of workers ($WEB_CONCURRENCY) are taken from the environment
+preload_app = True
+
+# Disabled until the fork, so the import of the app does not leave freed holes in the shared pages
+gc.disable()
+
+def when_ready(server):
+    # What the app defers to the first requests (see app.warm_up) is built here too, once for all the workers
+    if server.cfg.preload_app:
+        import app
+        app.warm_up()
+
+def pre_fork(server, worker):
+    # Everything in the master goes to the permanent generation, ignored by the collections
+    gc.freeze()
+
+def post_fork(server, worker):
+    gc.enable()
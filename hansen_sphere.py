@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Fitting of the Hansen solubility sphere of a material from solubility tests: which solvents
+dissolve it (good) and which do not (bad).
+
+The fit maximizes the desirability function of Hansen's SPHERE program, DATAFIT = (prod A_i)^(1/n),
+with A_i = exp(-|Ra_i - R0|) for the solvents on the wrong side of the sphere (good outside or bad
+inside) and A_i = 1 otherwise. For a given center, the error is a piecewise linear (convex) function
+of R0, so the best R0 is one of the distances to the solvents and it is found exactly; the center is
+found by a grid search in the scaled Hansen space (2dD, dP, dH), zooming in around the best point.
+Everything is vectorized over the candidate centers, so a fit takes ~20 ms and can be
+used inside a callback (the app fits in the process of the request), and fit_spheres can distribute
+many materials over a pool of processes, e.g. in a script.
+"""
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from support_functions import HANSEN_SCALE
+
+# Result of a fit: center (dD, dP, dH), radius R0, DATAFIT (1 for a perfect fit) and the number of
+# good solvents outside and bad solvents inside the sphere
+SphereFit = namedtuple('SphereFit', ['center', 'R0', 'fit', 'good_out', 'bad_in'])
+# Smallest radius of a fitted sphere, so the RED = Ra/R0 is always finite (e.g. with a single good solvent)
+MIN_R0 = 0.5
+
+
+def solvent_positions(selection):
+    """Positions of the solvents from a boolean mask or a list of positions"""
+    selection = np.asarray([] if selection is None else selection)
+    if selection.dtype == bool:
+        return np.flatnonzero(selection)
+    return selection.astype(int)
+
+def best_radius(distances, good):
+    """
+    The radius with the smallest error for each center, where the error is the sum of |Ra - R0| of the
+    good solvents outside and the bad solvents inside. The error is convex and piecewise linear in R0,
+    so the best radius is one of the distances to the solvents: all of them are evaluated at once with
+    cumulative sums over the sorted distances, and the smallest radius is taken if several are as good.
+        - distances: M x N array with the distance (Ra) from each center to the solvents
+        - good: boolean vector, True for the good solvents and False for the bad ones
+    Returns:
+        The radius and its error, two vectors of length M
+    """
+    order = np.argsort(distances, axis = 1)
+    R0 = np.take_along_axis(distances, order, axis = 1)
+    is_good = good[order]
+    good_distances = np.where(is_good, R0, 0)
+    bad_distances = R0 - good_distances
+    # Good solvents further than each candidate radius, bad solvents closer (the ties do not add any error)
+    good_sum = good_distances.sum(axis = 1, keepdims = True) - np.cumsum(good_distances, axis = 1)
+    good_count = is_good.sum(axis = 1, keepdims = True) - np.cumsum(is_good, axis = 1)
+    bad_sum = np.cumsum(bad_distances, axis = 1) - bad_distances
+    bad_count = np.cumsum(~is_good, axis = 1) - ~is_good
+    errors = (good_sum - R0 * good_count) + (R0 * bad_count - bad_sum)
+    # The first minimum (with some tolerance for the rounding of the sums) is the smallest radius
+    best = np.argmax(errors <= errors.min(axis = 1, keepdims = True) + 1e-9, axis = 1)
+    rows = np.arange(len(best))
+    return R0[rows, best], np.maximum(errors[rows, best], 0)
+
+def fit_sphere(hansen_coordinates, good, bad = None, points = 9, iterations = 6):
+    """
+    Fits the Hansen sphere of a material:
+        - hansen_coordinates: a DataFrame with the three Hansen coordinates columns (or a N x 3 array)
+        - good, bad: the solvents that dissolve (and do not) the material, as boolean masks or positions in hansen_coordinates
+        - points: size of the grid of centers, per dimension
+        - iterations: number of times the grid is zoomed in around the best center
+    Returns:
+        A SphereFit, with R0 >= MIN_R0. Raises a ValueError if there are no good solvents or a solvent
+        is both good and bad
+    """
+    hansen_coordinates = np.asarray(hansen_coordinates, dtype = float)
+    good = np.unique(solvent_positions(good))
+    bad = np.unique(solvent_positions(bad))
+    if len(good) == 0:
+        raise ValueError('At least one good solvent is needed to fit the sphere')
+    if len(np.intersect1d(good, bad)):
+        raise ValueError('A solvent can not be both good and bad')
+
+    solvents = hansen_coordinates[np.concatenate([good, bad])] * HANSEN_SCALE
+    is_good = np.arange(len(solvents)) < len(good)
+
+    # The first grid covers the good solvents, with a margin of half their extent
+    low, high = solvents[is_good].min(axis = 0), solvents[is_good].max(axis = 0)
+    step = np.maximum(2 * (high - low), 1.0) / (points - 1)
+    best_center, best_error, best_R0 = None, np.inf, np.inf
+    center = (low + high) / 2
+    offsets = np.arange(points) - (points - 1) / 2
+    for i in range(iterations + 1):
+        grid = np.stack(np.meshgrid(*[center[j] + step[j] * offsets for j in range(3)], indexing = 'ij'), axis = -1).reshape(-1, 3)
+        distances = np.sqrt(((grid[:, None, :] - solvents[None, :, :])**2).sum(axis = -1))
+        R0, error = best_radius(distances, is_good)
+        best = np.lexsort((R0, error))[0] # Smallest error, then smallest sphere
+        if (error[best], R0[best]) < (best_error, best_R0):
+            best_center, best_error, best_R0 = grid[best], error[best], R0[best]
+        center = best_center
+        step = 2 * step / (points - 1)
+
+    distances = np.sqrt(((solvents - best_center)**2).sum(axis = 1))
+    if best_R0 < MIN_R0:
+        # The error of the larger sphere, the bad solvents closer than MIN_R0 are now inside
+        best_R0 = MIN_R0
+        best_error = np.where(is_good, distances - best_R0, best_R0 - distances).clip(min = 0).sum()
+    return SphereFit(center = best_center / HANSEN_SCALE,
+                     R0 = best_R0,
+                     fit = np.exp(-best_error / len(solvents)),
+                     # Same tolerance as best_radius: the solvents that define the radius are on the surface
+                     good_out = int((distances[is_good] > best_R0 + 1e-9).sum()),
+                     bad_in = int((distances[~is_good] < best_R0 - 1e-9).sum()))
+
+def relative_energy_difference(hansen_coordinates, sphere):
+    """
+    RED = Ra/R0 of the solvents for a fitted sphere (RED < 1 inside the sphere, i.e. good solvents):
+        - hansen_coordinates: a DataFrame with the three Hansen coordinates columns (or a N x 3 array)
+        - sphere: a SphereFit (or any object with center and R0)
+    Returns:
+        An array with the RED of each solvent
+    """
+    scaled = (np.asarray(hansen_coordinates, dtype = float) - sphere.center) * HANSEN_SCALE
+    return np.sqrt((scaled**2).sum(axis = 1)) / sphere.R0
+
+MAX_PROCESSES = 4 # Size of the pool of fit_spheres, at most
+_COORDINATES = None # Hansen coordinates in the worker processes of fit_spheres
+_POOL = None # The pool of fit_spheres, with its key (process, size, coordinates)
+_POOL_LOCK = threading.Lock()
+
+def _set_coordinates(hansen_coordinates):
+    global _COORDINATES
+    _COORDINATES = hansen_coordinates
+
+def _fit(hansen_coordinates, observation):
+    try:
+        return fit_sphere(hansen_coordinates, *observation)
+    except ValueError as error:
+        return error
+
+def _fit_observation(observation):
+    return _fit(_COORDINATES, observation)
+
+def _pool(hansen_coordinates, processes):
+    """
+    The pool of processes of fit_spheres, created on first use and reused while the coordinates and the
+    size are the same. The processes are spawned, not forked, so it is safe from a multithreaded process
+    """
+    global _POOL
+    key = (os.getpid(), processes, hashlib.sha1(hansen_coordinates.tobytes()).hexdigest())
+    with _POOL_LOCK:
+        if _POOL is None or _POOL[0] != key:
+            if _POOL is not None and _POOL[0][0] == os.getpid():
+                _POOL[1].shutdown(wait = False)
+            _POOL = key, ProcessPoolExecutor(processes, mp_context = multiprocessing.get_context('spawn'),\
+                                             initializer = _set_coordinates, initargs = (hansen_coordinates,))
+        return _POOL[1]
+
+def fit_spheres(hansen_coordinates, observations, processes = None, chunksize = 8):
+    """
+    Fits the spheres of many materials, over a pool of processes (see _pool):
+        - hansen_coordinates: a DataFrame with the three Hansen coordinates columns (or a N x 3 array)
+        - observations: list of (good, bad) for each material, see fit_sphere
+        - processes: number of processes, by default one per CPU up to MAX_PROCESSES. With 1 the fits run in this process
+        - chunksize: number of materials sent to a process at once
+    Returns:
+        A list with the SphereFit of each material (a ValueError, instead, if it can not be fitted)
+    """
+    hansen_coordinates = np.asarray(hansen_coordinates, dtype = float)
+    observations = [tuple(observation) for observation in observations]
+    processes = min(processes or os.cpu_count() or 1, MAX_PROCESSES)
+    if processes == 1 or len(observations) <= 1:
+        return [_fit(hansen_coordinates, observation) for observation in observations]
+    return list(_pool(hansen_coordinates, processes).map(_fit_observation, observations, chunksize = chunksize))
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in instrumentation of the app: timings of the Dash callbacks and of the stages of the pipeline
+(the hot paths of support_functions and catalog), payload sizes and call counts, exposed at /metrics in the
+Prometheus text format, and per-request profiles. It is configured with environment variables,
+read once at import time:
+
+    OPEG_METRICS=1            records the metrics and serves /metrics
+    OPEG_PROFILE=<folder>     writes a profile of each callback request to the folder
+    OPEG_PROFILER=pyinstrument  uses pyinstrument (if installed, HTML reports) instead of cProfile
+
+When they are not set, timed returns the functions unchanged and nothing is registered in the
+server, so there is no overhead at all.
+
+The metrics are kept per process: with several gunicorn workers, each scrape of /metrics is served
+by one of them and returns only its own counters. All the series have a pid label, so that Prometheus
+keeps one series per worker (aggregate them with e.g. sum without (pid) (...)) instead of one that
+jumps between the counters of different workers.
+"""
+import cProfile
+import os
+import threading
+import time
+from functools import wraps
+
+import flask
+
+METRICS_ENABLED = os.environ.get('OPEG_METRICS', '').lower() in ('1', 'true', 'yes')
+PROFILE_PATH = os.environ.get('OPEG_PROFILE') or None
+PROFILER = os.environ.get('OPEG_PROFILER', 'cprofile').lower()
+ENABLED = METRICS_ENABLED or PROFILE_PATH is not None
+
+# Upper bounds (in seconds) of the buckets of the latency histograms
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DASH_UPDATE_PATH = '/_dash-update-component'
+
+
+class Histogram:
+    """Cumulative counts per bucket, sum and count of the observed values, as Prometheus histograms"""
+    def __init__(self, buckets = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        for bound, count in zip(self.buckets, self.counts):
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.9g}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Registry:
+    """
+    The metrics of the process, shared by all the threads: histograms and counters with one label,
+    and collectors, functions called at each scrape that return (name, help, type, {label: value}), by name.
+    The exposition adds the pid label of the process to all of them
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {} # (name, label) -> Histogram
+        self.counters = {} # (name, label) -> value
+        self.help = {}
+        self.collectors = {}
+
+    def describe(self, name, help, kind):
+        self.help[name] = (help, kind)
+
+    def observe(self, name, label, value):
+        with self.lock:
+            if (name, label) not in self.histograms:
+                self.histograms[name, label] = Histogram()
+            self.histograms[name, label].observe(value)
+
+    def increment(self, name, label, value = 1):
+        with self.lock:
+            self.counters[name, label] = self.counters.get((name, label), 0) + value
+
+    def add_collector(self, name, collector):
+        """Adds the collector, or replaces the one with the same name (e.g. of another app of the process)"""
+        self.collectors[name] = collector
+
+    def exposition(self):
+        """All the metrics in the Prometheus text format, labelled with the pid of the process"""
+        pid = f'pid="{os.getpid()}"' # At each scrape, as the workers are forked after the import
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines, described = [], set()
+        def header(name, help = None, kind = None):
+            if name not in described:
+                described.add(name)
+                help, kind = self.help.get(name, (help, kind))
+                lines.extend([f'# HELP {name} {help}', f'# TYPE {name} {kind}'])
+        for (name, label), histogram in histograms:
+            header(name, name, 'histogram')
+            lines.extend(histogram.lines(name, f'{pid},{label}'))
+        for (name, label), value in counters:
+            header(name, name, 'counter')
+            lines.append(f'{name}{{{pid},{label}}} {value}')
+        for collector in list(self.collectors.values()):
+            for name, help, kind, values in collector():
+                header(name, help, kind)
+                lines.extend(f'{name}{{{pid},{label}}} {value}' for label, value in values.items())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REGISTRY.describe('opeg_stage_seconds', 'Time spent in each stage of the pipeline (support_functions and catalog)', 'histogram')
+REGISTRY.describe('opeg_callback_seconds', 'Time spent in each Dash callback function', 'histogram')
+REGISTRY.describe('opeg_callback_serialization_seconds', 'Rest of the callback request: validation and JSON serialization', 'histogram')
+REGISTRY.describe('opeg_callback_response_bytes_total', 'Size of the responses of each Dash callback', 'counter')
+REGISTRY.describe('opeg_callback_calls_total', 'Number of requests of each Dash callback', 'counter')
+REGISTRY.describe('opeg_callback_errors_total', 'Number of callback requests that did not return 200', 'counter')
+
+
+def timed(function):
+    """
+    Decorator for the stages of the pipeline: the time of each call is recorded in opeg_stage_seconds
+    (the stages can be nested, each one includes the time of the inner ones). Without OPEG_METRICS it
+    returns the function itself
+    """
+    if not METRICS_ENABLED:
+        return function
+    label = f'stage="{function.__name__}"'
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            REGISTRY.observe('opeg_stage_seconds', label, time.perf_counter() - t0)
+    return wrapper
+
+def _start_profile():
+    """A started profiler, or None if another one is running (Python >= 3.12 allows only one at a time)"""
+    if PROFILER == 'pyinstrument':
+        try:
+            import pyinstrument
+        except ImportError:
+            pass
+        else:
+            profiler = pyinstrument.Profiler()
+            try:
+                profiler.start()
+            except RuntimeError:
+                return None
+            return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+def _save_profile(profiler, name):
+    """Writes the profile to PROFILE_PATH, as <time>-<callback>.prof (or .html for pyinstrument)"""
+    os.makedirs(PROFILE_PATH, exist_ok = True)
+    path = os.path.join(PROFILE_PATH, f'{time.strftime("%Y%m%d-%H%M%S")}-{time.perf_counter_ns()}-{name}')
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(path + '.prof')
+    else:
+        profiler.stop()
+        with open(path + '.html', 'w') as f:
+            f.write(profiler.output_html())
+
+def instrument_app(app, caches = None):
+    """
+    Instruments a Dash app, if enabled: wraps its callbacks, times the update requests and their
+    responses, profiles them (OPEG_PROFILE) and adds the /metrics route (OPEG_METRICS), which serves
+    the metrics of the process that handles the request (see the pid label)
+        - app: the Dash app, after all its callbacks are defined
+        - caches: functions with a cache_info (functools.lru_cache), by name, exported as gauges with
+          their hit ratio, and the fields of their cache_stats if they have one (see cache.LRUCache)
+    """
+    if not ENABLED:
+        return
+    caches = caches or {}
+    server = app.server
+    for entry in app.callback_map.values():
+        if 'callback' not in entry:
+            continue # Clientside callback
+        function = entry['callback']
+        @wraps(function)
+        def wrapper(*args, _function = function, **kwargs):
+            flask.g.opeg_callback = _function.__name__
+            t0 = time.perf_counter()
+            try:
+                return _function(*args, **kwargs)
+            finally:
+                flask.g.opeg_callback_time = time.perf_counter() - t0
+        entry['callback'] = wrapper
+
+    @server.before_request
+    def start_request():
+        if flask.request.path == DASH_UPDATE_PATH:
+            flask.g.opeg_start = time.perf_counter()
+            flask.g.opeg_profiler = _start_profile() if PROFILE_PATH else None
+
+    @server.after_request
+    def end_request(response):
+        if flask.request.path != DASH_UPDATE_PATH or 'opeg_start' not in flask.g:
+            return response
+        name = flask.g.get('opeg_callback', 'unknown')
+        total = time.perf_counter() - flask.g.opeg_start
+        if flask.g.opeg_profiler is not None:
+            _save_profile(flask.g.opeg_profiler, name)
+        if METRICS_ENABLED:
+            label = f'callback="{name}"'
+            callback_time = flask.g.get('opeg_callback_time', 0.0)
+            REGISTRY.observe('opeg_callback_seconds', label, callback_time)
+            REGISTRY.observe('opeg_callback_serialization_seconds', label, max(total - callback_time, 0.0))
+            REGISTRY.increment('opeg_callback_calls_total', label)
+            REGISTRY.increment('opeg_callback_response_bytes_total', label, response.calculate_content_length() or 0)
+            if response.status_code != 200:
+                REGISTRY.increment('opeg_callback_errors_total', label)
+        return response
+
+    if not METRICS_ENABLED:
+        return
+
+    def cache_collector():
+        infos = {name : function.cache_info() for name, function in caches.items()}
+        for field, kind in [('hits', 'counter'), ('misses', 'counter'), ('currsize', 'gauge'), ('maxsize', 'gauge')]:
+            suffix = '_total' if kind == 'counter' else ''
+            yield (f'opeg_cache_{field}{suffix}', f'{field} of the lru_cache', kind,
+                   {f'cache="{name}"' : getattr(info, field) for name, info in infos.items()})
+        yield ('opeg_cache_hit_ratio', 'hits / (hits + misses) of the cache', 'gauge',
+               {f'cache="{name}"' : info.hits / max(info.hits + info.misses, 1) for name, info in infos.items()})
+        stats = {name : function.cache_stats() for name, function in caches.items() if hasattr(function, 'cache_stats')}
+        for field, kind in [('disk_hits', 'counter'), ('bytes', 'gauge'), ('maxbytes', 'gauge')]:
+            suffix = '_total' if kind == 'counter' else ''
+            yield (f'opeg_cache_{field}{suffix}', f'{field} of the cache', kind,
+                   {f'cache="{name}"' : values[field] for name, values in stats.items()})
+    REGISTRY.add_collector('caches', cache_collector)
+
+    @server.route('/metrics')
+    def metrics():
+        return flask.Response(REGISTRY.exposition(), mimetype = 'text/plain; version=0.0.4')
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Local queue of background jobs, for the computations that can take long (the batch screens of the
+API, and the quick path and the Pareto front of the app), so they do not hold a request, and the
+gunicorn worker that serves it, while they run. There is no broker: the jobs run in a small pool of
+threads of the process that receives them, and their state and results are stored as JSON files in
+JOBS_PATH, shared by all the processes of the app, so any worker can answer the polling. A job is
+identified by the hash of its kind and parameters (and the version of the data it depends on): a job
+submitted again is not run again while its result is kept (JOB_TTL seconds). It is configured with environment variables:
+
+    OPEG_JOBS_PATH=<folder>   where the jobs are stored (by default, in the temporary folder)
+    OPEG_JOB_WORKERS=<n>      number of jobs run at the same time by each process (2)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+JOBS_PATH = os.environ.get('OPEG_JOBS_PATH') or os.path.join(tempfile.gettempdir(), 'opeg_jobs')
+JOB_WORKERS = int(os.environ.get('OPEG_JOB_WORKERS', 2))
+JOB_TTL = 3600 # Seconds the finished jobs (and their results) are kept
+JOB_TIMEOUT = 900 # Seconds after which an unfinished job is considered lost (e.g. its worker was restarted)
+
+
+def job_id(kind, params, version = ''):
+    """Identifier of a job, the hash of its kind, parameters (a JSON-serializable dictionary) and version (see JobQueue)"""
+    key = json.dumps([kind, params, version], sort_keys = True, default = _plain)
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+def _plain(value):
+    """Plain Python value of the numpy types, for the JSON encoder"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class JobQueue:
+    """
+    Background jobs, run by a pool of threads (created on first use, so also after a fork) and
+    stored in a folder (or in memory, if the folder can not be written):
+        - jobs_path: folder where the jobs are stored (None to keep them in memory)
+        - workers: number of jobs run at the same time by this process
+        - ttl: seconds the finished jobs are kept
+        - timeout: seconds after which an unfinished job is considered lost, and run again if submitted
+        - version: identifier of the data the results depend on (e.g. dataset.data_key()), part of the id of
+          the jobs, so the results stored for another data (e.g. before a restart) are never used
+    A job is a dictionary with its 'id', 'kind', 'status' ('queued', 'running', 'done' or 'failed'),
+    the times it was 'submitted', 'started' and 'finished', and its 'result' or 'error'
+    """
+    def __init__(self, jobs_path = JOBS_PATH, workers = JOB_WORKERS, ttl = JOB_TTL, timeout = JOB_TIMEOUT, version = ''):
+        if jobs_path is not None:
+            try:
+                os.makedirs(jobs_path, exist_ok = True)
+            except OSError:
+                jobs_path = None
+        self.path = jobs_path
+        self.workers = workers
+        self.ttl = ttl
+        self.timeout = timeout
+        self.version = version
+        self.memory = {} # The jobs, if there is no folder
+        self.futures = {} # The jobs submitted by this process, by id
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+        self.last_cleanup = 0.0
+
+    def _file(self, id):
+        return os.path.join(self.path, id + '.json')
+
+    def _write(self, job):
+        if self.path is None:
+            self.memory[job['id']] = dict(job)
+            return
+        fd, tmp_path = tempfile.mkstemp(prefix = '.', suffix = '.tmp', dir = self.path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job, f, default = _plain)
+            os.replace(tmp_path, self._file(job['id']))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _read(self, id):
+        if self.path is None:
+            return self.memory.get(id)
+        try:
+            with open(self._file(id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _expired(self, job, now):
+        if job['status'] in ('done', 'failed'):
+            return now - job['finished'] > self.ttl
+        return job['id'] not in self.futures and now - job['submitted'] > self.timeout
+
+    def get(self, id):
+        """The job, or None if it does not exist or it has expired"""
+        job = self._read(id)
+        if job is None or self._expired(job, time.time()):
+            return None
+        return job
+
+    def submit(self, kind, params, function):
+        """
+        Runs function() in the background, unless the same job (kind and parameters) is already
+        queued, running or done, and it returns a JSON-serializable result:
+            - kind: name of the kind of job
+            - params: its parameters (a JSON-serializable dictionary), which identify it with the kind
+            - function: function without arguments that computes the result
+        Returns:
+            The job
+        """
+        id = job_id(kind, params, self.version)
+        with self.lock:
+            job = self.get(id)
+            if job is not None and job['status'] != 'failed':
+                return job
+            if self.pid != os.getpid():
+                # The threads of the pool do not survive a fork (e.g. the gunicorn workers of a preloaded app)
+                self.executor, self.futures, self.pid = ThreadPoolExecutor(self.workers, thread_name_prefix = 'job'), {}, os.getpid()
+            job = {'id' : id, 'kind' : kind, 'status' : 'queued', 'submitted' : time.time(), 'started' : None, 'finished' : None}
+            self._write(job)
+            self.futures[id] = self.executor.submit(self._run, dict(job), function)
+        self.cleanup()
+        return job
+
+    def _run(self, job, function):
+        job.update(status = 'running', started = time.time())
+        self._write(job)
+        try:
+            # Serialized here, so a result that can not be stored fails the job
+            result = json.loads(json.dumps(function(), default = _plain))
+        except Exception as error:
+            job.update(status = 'failed', finished = time.time(),\
+                       error = str(error) if isinstance(error, ValueError) else f'{type(error).__name__}: {error}')
+        else:
+            job.update(status = 'done', finished = time.time(), result = result)
+        self._write(job)
+        with self.lock:
+            self.futures.pop(job['id'], None)
+        return job
+
+    def wait(self, id, timeout = None):
+        """
+        Waits until the job is finished, at most timeout seconds if it runs in this process (it does
+        not wait for the jobs of other processes). Returns the job, as get
+        """
+        future = self.futures.get(id)
+        if future is not None:
+            wait([future], timeout)
+        return self.get(id)
+
+    def cleanup(self):
+        """Removes the expired jobs, at most once every ttl / 10 seconds"""
+        now = time.time()
+        if now - self.last_cleanup < self.ttl / 10:
+            return
+        self.last_cleanup = now
+        ids = list(self.memory) if self.path is None else [name[:-5] for name in os.listdir(self.path) if name.endswith('.json')]
+        for id in ids:
+            job = self._read(id)
+            if job is not None and self._expired(job, now):
+                if self.path is None:
+                    self.memory.pop(id, None)
+                else:
+                    try:
+                        os.remove(self._file(id))
+                    except OSError:
+                        pass
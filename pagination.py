@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Pagination and sorting, in the server, of the Solvent Ranking Table of the app: the browser only
+receives the page it shows (see update_table in app.py).
+"""
+import numpy as np
+
+
+class RankedTable:
+    """
+    The rows of the Solvent Ranking Table for a request, from which only the page shown is sent to
+    the browser. The order of the rows for each sorting (column and direction) is computed once and
+    kept, with its inverse, so the page of a solvent is found without scanning the rows
+        - table: DataFrame with the table columns, in the default order
+        - ids: the row id of each row (e.g. its position in the full table), sent as the 'id' of the
+          records, i.e. the row_id of the DataTable. By default, the positions in table
+    """
+    def __init__(self, table, ids = None):
+        self.table = table
+        self.ids = np.arange(len(table)) if ids is None else np.asarray(ids)
+        self.rows = {row_id : row for row, row_id in enumerate(self.ids.tolist())} # Row id -> row of table
+        self.orders = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    def order(self, sort_by = []):
+        """
+        The rows sorted as the table (stable, the solvents without a value go last in both directions):
+            - sort_by: the sort_by of the DataTable, [{'column_id' : ..., 'direction' : 'asc' or 'desc'}] or []
+        Returns:
+            The order of the rows, and the position of each row in that order
+        """
+        key = (sort_by[0]['column_id'], sort_by[0]['direction']) if sort_by else None
+        if key not in self.orders:
+            if key is None:
+                order = np.arange(len(self.table))
+            else:
+                ranks = self.table[key[0]].rank(method = 'dense').values
+                ranks = np.where(np.isnan(ranks), np.inf, -ranks if key[1] == 'desc' else ranks)
+                order = np.argsort(ranks, kind = 'mergesort')
+            positions = np.empty_like(order)
+            positions[order] = np.arange(len(order))
+            self.orders[key] = order, positions
+        return self.orders[key]
+
+    def page(self, page_current, page_size, sort_by = []):
+        """The records of the rows in the page (page_current starts at 0), with their row id"""
+        order, _ = self.order(sort_by)
+        rows = order[page_current * page_size:(page_current + 1) * page_size]
+        records = self.table.iloc[rows].to_dict('records')
+        for record, row_id in zip(records, self.ids[rows].tolist()):
+            record['id'] = row_id
+        return records
+
+    def page_count(self, page_size):
+        return max(1, -(-len(self.table) // page_size))
+
+    def locate(self, row_id, page_size, sort_by = []):
+        """The page of a row, by its id, and its position in that page, or None if it is not in the table"""
+        row = self.rows.get(row_id)
+        if row is None:
+            return None
+        _, positions = self.order(sort_by)
+        return divmod(int(positions[row]), page_size)
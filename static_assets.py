@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Precompressed static assets (the chemical structures SVGs and the logos).
+
+The assets are minified (SVGs only) and compressed with gzip (and brotli, if the optional brotli
+package is installed) once, by a build step that writes the variants and a manifest with the
+content hash of each asset to BUILD_PATH. The build is redone automatically when the sources
+change (the SHA-1 of every source is stored in the manifest) and it can be done beforehand, e.g.
+at deploy time, with:
+
+    python static_assets.py
+
+At run time all the variants are kept in memory, so serving an asset is a dictionary lookup: the
+encoding is negotiated with Accept-Encoding, conditional GETs (If-None-Match) are answered with a
+304, and the URLs returned by StaticAssets.url carry the content hash, so they can be cached by the
+browser forever (Cache-Control immutable).
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_PATH = 'static'
+BUILD_PATH = 'static_build'
+MANIFEST = 'manifest.json'
+BUILD_VERSION = 1 # Increase it if the minification or the compression change, so old builds are redone
+EXTENSIONS = {'.svg' : 'image/svg+xml', '.png' : 'image/png'}
+COMPRESSIBLE = {'.svg'} # PNGs are already compressed
+ENCODINGS = {'br' : '.br', 'gzip' : '.gz'} # In order of preference
+LONG_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache' # Cached, but always validated with the ETag
+
+# XML declaration, DOCTYPE and comments, the whitespace around the tags and the repeated whitespace
+_SVG_PROLOG = re.compile(rb'<\?xml.*?\?>|<!DOCTYPE[^>]*>|<!--.*?-->', re.S)
+_SVG_AROUND_TAGS = re.compile(rb'\s*(/?>|<)\s*')
+_SVG_SPACES = re.compile(rb'\s+')
+_SVG_LONG_COLOR = re.compile(rb'#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3\b')
+
+
+def minify_svg(data):
+    """
+    Removes from an SVG what does not change the image: the XML declaration, DOCTYPE, comments and
+    the whitespace around the tags and repeated (the SVG text strips and collapses it anyway), and
+    the colors #rrggbb that can be written as #rgb
+    """
+    data = _SVG_SPACES.sub(b' ', _SVG_PROLOG.sub(b'', data))
+    data = _SVG_LONG_COLOR.sub(rb'#\1\2\3', data)
+    return _SVG_AROUND_TAGS.sub(rb'\1', data).strip()
+
+def compress(data, encoding):
+    """Data compressed with the maximum level, for 'gzip' or 'br'"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel = 9, mtime = 0) # mtime = 0, so the output is reproducible
+    return brotli.compress(data, quality = 11)
+
+def available_encodings():
+    """The encodings that can be built, in order of preference"""
+    return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+def source_files(static_path = STATIC_PATH):
+    """Names of the assets in static_path"""
+    return sorted(name for name in os.listdir(static_path) if os.path.splitext(name)[1] in EXTENSIONS)
+
+def file_hash(path):
+    """SHA-1 of the file content"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def build_assets(static_path = STATIC_PATH, build_path = BUILD_PATH):
+    """
+    Minifies and compresses all the assets in static_path into build_path (the old build is
+    replaced atomically, so concurrent workers never read a partial build). Returns the manifest:
+    for each asset, the SHA-1 of its source, the ETag (content hash of the minified asset), its size
+    and the encodings for which a compressed variant is smaller
+    """
+    encodings = available_encodings()
+    manifest = {'version' : BUILD_VERSION, 'encodings' : encodings, 'assets' : {}}
+    parent = os.path.dirname(os.path.abspath(build_path))
+    tmp_path = tempfile.mkdtemp(prefix = '.static_build', dir = parent)
+    try:
+        for name in source_files(static_path):
+            with open(os.path.join(static_path, name), 'rb') as f:
+                source = f.read()
+            extension = os.path.splitext(name)[1]
+            data = minify_svg(source) if extension == '.svg' else source
+            entry = {'sha1' : hashlib.sha1(source).hexdigest(),
+                     'etag' : hashlib.sha1(data).hexdigest()[:16],
+                     'size' : len(data),
+                     'encodings' : []}
+            with open(os.path.join(tmp_path, name), 'wb') as f:
+                f.write(data)
+            for encoding in encodings if extension in COMPRESSIBLE else []:
+                compressed = compress(data, encoding)
+                if len(compressed) < len(data):
+                    with open(os.path.join(tmp_path, name + ENCODINGS[encoding]), 'wb') as f:
+                        f.write(compressed)
+                    entry['encodings'].append(encoding)
+            manifest['assets'][name] = entry
+        with open(os.path.join(tmp_path, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent = 1)
+        os.chmod(tmp_path, 0o755)
+        # A directory can not be replaced atomically if it exists: the old one is first moved aside
+        old_path = None
+        if os.path.exists(build_path):
+            old_path = tempfile.mkdtemp(prefix = '.static_old', dir = parent)
+            os.replace(build_path, os.path.join(old_path, 'build'))
+        os.replace(tmp_path, build_path)
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors = True)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors = True)
+        raise
+    return manifest
+
+def build_is_valid(manifest, static_path = STATIC_PATH):
+    """
+    True if the build is up to date with the sources and has all the available encodings
+    (if the sources are not available, the build is used as it is)
+    """
+    if manifest.get('version') != BUILD_VERSION or manifest.get('encodings') != available_encodings():
+        return False
+    if not os.path.isdir(static_path):
+        return True
+    assets = manifest['assets']
+    names = source_files(static_path)
+    return sorted(assets) == names and all(assets[name]['sha1'] == file_hash(os.path.join(static_path, name)) for name in names)
+
+def read_manifest(build_path = BUILD_PATH):
+    """The manifest of the build, or None if there is no (readable) build"""
+    try:
+        with open(os.path.join(build_path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StaticAssets:
+    """
+    All the variants of the static assets, in memory, built if needed (see build_assets). If the
+    build can not be written (e.g. read-only file system), the assets are minified and compressed
+    in a temporary directory
+        - static_path: folder with the sources
+        - build_path: folder with the build
+    """
+    def __init__(self, static_path = STATIC_PATH, build_path = BUILD_PATH):
+        manifest = read_manifest(build_path)
+        if manifest is None or not build_is_valid(manifest, static_path):
+            try:
+                manifest = build_assets(static_path, build_path)
+            except OSError:
+                build_path = os.path.join(tempfile.mkdtemp(prefix = 'static_build'), 'build')
+                manifest = build_assets(static_path, build_path)
+        self.etags = {}
+        self.variants = {}
+        for name, entry in manifest['assets'].items():
+            self.etags[name] = entry['etag']
+            for encoding in [None] + entry['encodings']:
+                with open(os.path.join(build_path, name + ENCODINGS.get(encoding, '')), 'rb') as f:
+                    self.variants[name, encoding] = f.read()
+
+    def __contains__(self, name):
+        return name in self.etags
+
+    def url(self, name):
+        """URL of the asset, versioned with its content hash (so it can be cached forever)"""
+        return f'/static/{name}?v={self.etags[name]}' if name in self.etags else f'/static/{name}'
+
+    def variant(self, name, accept_encodings = ()):
+        """
+        The best variant of an asset for the accepted encodings:
+            - name: name of the asset
+            - accept_encodings: the encodings accepted by the client (in any order)
+        Returns:
+            The encoding (None for the uncompressed asset), the data and its ETag, or a KeyError if
+            the asset does not exist
+        """
+        etag = self.etags[name]
+        for encoding in ENCODINGS:
+            if encoding in accept_encodings and (name, encoding) in self.variants:
+                return encoding, self.variants[name, encoding], f'{etag}-{ENCODINGS[encoding][1:]}'
+        return None, self.variants[name, None], etag
+
+    def response(self, name, request):
+        """
+        Flask response for the asset, from the variants in memory:
+            - name: name of the asset
+            - request: the flask (werkzeug) request, for Accept-Encoding, If-None-Match and the version
+        Returns:
+            The response: 200 with the best variant, 304 if the client has it, None if the asset does not exist
+        """
+        if name not in self.etags:
+            return None
+        accepted = [encoding for encoding in ENCODINGS if request.accept_encodings[encoding]]
+        encoding, data, etag = self.variant(name, accepted)
+        if etag in request.if_none_match:
+            response = flask.Response(status = 304)
+        else:
+            response = flask.Response(data, mimetype = EXTENSIONS[os.path.splitext(name)[1]])
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Only the URLs with the current content hash can be cached forever
+        versioned = request.args.get('v') == self.etags[name]
+        response.headers['Cache-Control'] = LONG_CACHE if versioned else REVALIDATE
+        return response
+
+
+if __name__ == '__main__':
+    manifest = build_assets()
+    print(f'{len(manifest["assets"])} assets from {STATIC_PATH} built in {BUILD_PATH} ({", ".join(manifest["encodings"])})')
@@ -5,10 +5,13 @@ Created on Thu Mar 26 11:47:57 2020
 @author: JOANRR
 """
 import numpy as np
+from bisect import bisect_right
 import dash_html_components as html
-from pandas import read_excel
-import plotly.graph_objs as go
+from pandas import DataFrame, Series
+from dataset import load_statements
+from instrumentation import timed
 import dash_core_components as dcc
+from plotly.colors import diverging
 
 HANSEN_COORDINATES = ['dD - Dispersion','dP - Polarity','dH - Hydrogen bonding']
 WASTE = ['Incineration','Recycling','Biotreatment','VOC Emissions'] # Columns' names defining the waste score
@@ -16,72 +19,278 @@ HEALTH = ['Health Hazard', 'Exposure Potential']                    # Columns' n
 ENVIRONMENT = ['Aquatic Impact', 'Air Impact']                      # Idem
 SAFETY = ['Flammability and Explosion', 'Reactivity and Stability'] #Idem
 
+HANSEN_SCALE = np.array([2.0, 1.0, 1.0]) # Scaling of the coordinates (2dD, dP, dH) for which Ra is an Euclidean distance
+
 SCORES = [WASTE, HEALTH, ENVIRONMENT, SAFETY] 
 SCORES_NAMES = ['Waste', 'Health', 'Environment', 'Safety']
 
-df2 = read_excel('solventSelectionTool_table.xlsx', sheet_name = 1, header = 0, usecols=(0,1))
-df2.set_index('Statements', inplace=True, drop=True)
+# Physical properties of the solvents, kept by SolventCatalog
+PROPERTIES = ['Melting Point (°C)', 'Boiling Point (°C)', 'Viscosity (mPa.s)', 'Surface Tension (mN/m)']
+# Objectives of the Pareto front of the solvents, {column : True if it is maximized}, see pareto_solvents
+PARETO_OBJECTIVES = {'Ra' : False, 'Composite score' : True, 'Boiling Point (°C)' : False, 'Viscosity (mPa.s)' : False}
+
+df2 = load_statements() # Full text of the GHS statements (second sheet of the Excel file), indexed by the label
+STATEMENTS = dict(zip(df2.index, df2['Fulltext'])) # Same, as a dictionary {label : full text}, for the lookups
+
+GHS_HTML = {} # Cache of the GHS html fragments of each solvent, {CAS Number : (hazard_html, precaution_html)}
 
-def solvents_trace(df, show_path = False):
+# Columns shown when hovering on a solvent and their format, see hover_customdata
+HOVER_COLUMNS = [('Composite score', '%.1f'), ('Ra', '%.1f'), ('Melting Point (°C)', '%.0f'), ('Boiling Point (°C)', '%.0f'),\
+                 ('Viscosity (mPa.s)', '%.2g'), ('Surface Tension (mN/m)', '%.2g')]
+HOVER_TEMPLATE = '<b>%{text}</b><br>G = %{customdata[0]}<br>dD = %{x:.1f}<br>dP = %{y:.1f}<br>dH = %{z:.1f} <extra>Ra = %{customdata[1]}<br>mp  = %{customdata[2]} °C<br>bp  = %{customdata[3]} °C<br>η  = %{customdata[4]} mPa∙s<br>𝜎  = %{customdata[5]} mN/m</extra>'
+# Colorscale of G, as plotly expands 'RdYlGn' (plotly.js does not know it by name)
+G_COLORSCALE = [[i / (len(diverging.RdYlGn) - 1), color] for i, color in enumerate(diverging.RdYlGn)]
+
+def hover_customdata(df, columns = HOVER_COLUMNS):
+    """
+    Formats, column-wise, the values shown when hovering on the solvents:
+        - df: a DataFrame structure with the solvent info, or a SolventCatalog
+        - columns: list of (column, format), by default the HOVER_COLUMNS
+    Returns:
+        A N x len(columns) array of strings, to be used as customdata with HOVER_TEMPLATE
+    """
+    formatted = [np.char.mod(fmt, np.asarray(df[column], dtype = float)) for column, fmt in columns]
+    return np.column_stack(formatted) if len(df) else np.empty((0, len(columns)), dtype = str)
+
+def marker_size(G):
+    """
+    Some function that scales the size of the markers with the greeness score:
+        - G: array with the composite scores
+    """
+    G = np.asarray(G, dtype = float)
+    size = 2*np.sqrt(3) * 3**(G/6)
+    size[np.isnan(size)] = 6
+    size[G < 3] = 6
+    size[G > 9] = 18
+    return size
+
+@timed
+def solvents_trace(df, show_path = False, ids = None):
     """
     Creates the the main trace in the green-solvent program. It needs:
-        - df: a DataFrame structure with the solvent info
+        - df: a DataFrame structure with the solvent info, or a SolventCatalog
         - show_path: if True, it will plot a line between the solvent from the df structure in the input order
+        - ids: the row id of each solvent (its position in the full table), the last element of its customdata.
+          By default, the positions in df
     Returns:
-        A trace, as a plotly object
+        A trace, as a dictionary with the plotly JSON of a Scatter3d (built without the validation of
+        plotly.graph_objs, which is slow and not needed for a trace defined here)
     """
        
-    x = df['dD - Dispersion']
-    y = df['dP - Polarity']
-    z = df['dH - Hydrogen bonding']
+    x = np.asarray(df['dD - Dispersion'])
+    y = np.asarray(df['dP - Polarity'])
+    z = np.asarray(df['dH - Hydrogen bonding'])
     
-    hovertemplate = ['<b>{0:s}</b><br>G = {1:.1f}<br>dD = {2:.1f}<br>dP = {3:.1f}<br>dH = {4:.1f} <extra>Ra = {5:.1f}<br>mp  = {6:.0f} °C<br>bp  = {7:.0f} °C<br>η  = {8:.2g} mPa∙s<br>𝜎  = {9:.2g} mN/m</extra>'.format(*data[['Solvent Name','Composite score','dD - Dispersion', 'dP - Polarity', 'dH - Hydrogen bonding' ,'Ra', 'Melting Point (°C)','Boiling Point (°C)', 'Viscosity (mPa.s)', 'Surface Tension (mN/m)']]) for index, data in df.iterrows()]  
-                  
-                                         
-    # Some function that scales the size with the greeness score                                     
-    size = 2*np.sqrt(3) * 3**(df['Composite score']/6).values
-    size[np.isnan(size)] = 6
-    size[df['Composite score'] < 3] = 6
-    size[df['Composite score'] > 9] = 18
+    # The values shown on hover go, already formatted, to the customdata, with a template shared by all the points,
+    # followed by the row id, so a click is mapped to the solvent without looking for its name
+    ids = np.arange(len(df)) if ids is None else np.asarray(ids)
+    customdata = np.column_stack([hover_customdata(df), ids.astype(str)])
+    
+    size = marker_size(df['Composite score'])
     
     # Just print lines when the SHOW PATH has been selected
     if show_path: mode = 'markers+lines'
     else: mode = 'markers'
     
-    trace = go.Scatter3d(x = x, y = y, z = z,\
-                         mode=mode,\
-                         marker=dict(color = df['Composite score'],
-                                    colorscale = 'RdYlGn',
-                                    size = size,
-                                    opacity = 1,
-                                    showscale = True,
-                                    cmin = 3,
-                                    cmid = 6,
-                                    cmax = 9,
-                                    colorbar = dict(title = 'G',\
-                                                thickness = 20, len = 0.66, x = 0.9, y = 0.5,\
-                                                xanchor = 'center',  yanchor = 'middle'),
-                                    line = dict(width = .25, color = 'rgb(50, 50, 50)')
-                                    ),\
-                        line = dict(color = 'rgb(50, 50, 50)', width = 3, dash = 'dot'),\
-                        hovertemplate = hovertemplate,
-                        text = df['Solvent Name'])
+    trace = dict(type = 'scatter3d', x = x, y = y, z = z,\
+                 mode=mode,\
+                 marker=dict(color = np.asarray(df['Composite score']),
+                            colorscale = G_COLORSCALE,
+                            size = size,
+                            opacity = 1,
+                            showscale = True,
+                            cmin = 3,
+                            cmid = 6,
+                            cmax = 9,
+                            colorbar = dict(title = dict(text = 'G'),\
+                                        thickness = 20, len = 0.66, x = 0.9, y = 0.5,\
+                                        xanchor = 'center',  yanchor = 'middle'),
+                            line = dict(width = .25, color = 'rgb(50, 50, 50)')
+                            ),\
+                 line = dict(color = 'rgb(50, 50, 50)', width = 3, dash = 'dot'),\
+                 customdata = customdata,
+                 hovertemplate = HOVER_TEMPLATE,
+                 text = np.asarray(df['Solvent Name']))
 
     return trace
 
+def solvents_base_data(df):
+    """
+    The static data of the main trace for all the solvents, sent only once to the browser, 
+    where the updates of the trace are applied (see solvents_trace_update and assets/2_figure.js):
+        - df: a DataFrame structure with all the solvents, or a SolventCatalog
+    Returns:
+        A dictionary with the coordinates, names and the hover values that do not depend on the solute
+    """
+    return {'x' : np.asarray(df['dD - Dispersion']).tolist(),
+            'y' : np.asarray(df['dP - Polarity']).tolist(),
+            'z' : np.asarray(df['dH - Hydrogen bonding']).tolist(),
+            'text' : np.asarray(df['Solvent Name']).tolist(),
+            'customdata' : hover_customdata(df, HOVER_COLUMNS[2:]).tolist()}
 
+@timed
+def solvents_trace_update(df, positions, show_path = False):
+    """
+    Compact update of the main trace, instead of the whole trace (see solvents_base_data):
+        - df: a DataFrame structure (or SolventCatalog) with the solvents to show, in order ('Composite score' and 'Ra' at least)
+        - positions: the positions of these solvents in the data given to solvents_base_data, also their row ids
+        - show_path: if True, it will plot a line between the solvents in the input order
+    Returns:
+        A dictionary with the positions of the solvents and the values that depend on the request
+    """
+    G = np.asarray(df['Composite score'], dtype = float)
+    return {'index' : np.asarray(positions).tolist(),
+            'G' : [None if np.isnan(value) else value for value in G.tolist()],
+            'Ra' : np.char.mod(HOVER_COLUMNS[1][1], np.asarray(df['Ra'], dtype = float)).tolist(),
+            'size' : marker_size(G).round(2).tolist(),
+            'mode' : 'markers+lines' if show_path else 'markers'}
+
+
+@timed
 def update_Ra(hansen_coordinates, reference = [None] * 3):
     """Calculates the Hansen parameter as Ra**2 = 4(dD - dD_0)**2 + (dP - dP_0)**2 + (dH - dH_0)**2.
-        - hansen_coordinates: a DataFrame the three Hansen coordinates columns
+        - hansen_coordinates: a DataFrame the three Hansen coordinates columns (or a N x 3 array, or a SolventCatalog)
         - reference: 3-element vector to which to calculate the distance"""
     for value in reference:
         if value == None:
             return np.nan
+    if not isinstance(hansen_coordinates, DataFrame):
+        distance = (hansen_matrix(hansen_coordinates) - np.asarray(reference, dtype = float))**2
+        return np.sqrt(4*distance[:, 0] + distance[:, 1] + distance[:, 2]).round(2)
     distance = (hansen_coordinates - reference)**2
     Ra = 4*distance['dD - Dispersion'] + distance['dP - Polarity']+ distance['dH - Hydrogen bonding']
     return np.sqrt(Ra).round(2)
 
-def create_report(data = None, scores = SCORES):
+def is_catalog(data):
+    """
+    True for a SolventCatalog (see catalog.py, which builds on this module, so it is recognized by its
+    HSP matrix instead of its class), which the functions of this module accept in place of a DataFrame
+    """
+    return isinstance(getattr(data, 'hsp', None), np.ndarray)
+
+def hansen_matrix(hansen_coordinates):
+    """The N x 3 array (float) of the Hansen coordinates, from a DataFrame with their columns, an array or a SolventCatalog"""
+    if is_catalog(hansen_coordinates):
+        hansen_coordinates = hansen_coordinates.hsp
+    return np.asarray(hansen_coordinates, dtype = float)
+
+def hansen_index(hansen_coordinates):
+    """
+    Builds a spatial index (KD-tree) of the solvents in the scaled Hansen space (2dD, dP, dH),
+    where Ra is the plain Euclidean distance. It should be built once and reused.
+        - hansen_coordinates: a DataFrame with the three Hansen coordinates columns (or a N x 3 array, or a SolventCatalog)
+    Returns:
+        A scipy.spatial.cKDTree, the solvents are identified by their position in hansen_coordinates
+    """
+    from scipy.spatial import cKDTree # Imported on first use, it is slow to import
+    return cKDTree(hansen_matrix(hansen_coordinates) * HANSEN_SCALE)
+
+@timed
+def nearest_solvents(index, reference, k, mask = None):
+    """
+    Finds the k solvents closest to the reference, without computing and sorting all the distances:
+        - index: KD-tree as returned by hansen_index
+        - reference: 3-element vector to which to calculate the distance
+        - k: number of solvents to return
+        - mask: boolean array (one element per solvent), only the True solvents are considered
+    Returns:
+        The positions of the solvents sorted by Ra (ascending) and their Ra
+    """
+    n = index.n
+    n_valid = n if mask is None else int(np.count_nonzero(mask))
+    k = min(k, n_valid)
+    if k <= 0:
+        return np.array([], dtype = int), np.array([])
+
+    point = np.asarray(reference, dtype = float) * HANSEN_SCALE
+    # Queries more neighbours than needed if some solvents are masked, doubling them until there are enough
+    k_query = min(n, int(np.ceil(k * n / n_valid)))
+    while True:
+        Ra, positions = index.query(point, k = k_query)
+        Ra, positions = np.atleast_1d(Ra), np.atleast_1d(positions)
+        if mask is not None:
+            valid = mask[positions]
+            Ra, positions = Ra[valid], positions[valid]
+        if len(positions) >= k or k_query == n:
+            return positions[:k], Ra[:k]
+        k_query = min(n, 2 * k_query)
+
+def solvents_within(index, reference, radius, mask = None):
+    """
+    Finds all the solvents with Ra <= radius from the reference:
+        - index: KD-tree as returned by hansen_index
+        - reference: 3-element vector to which to calculate the distance
+        - radius: maximum Ra
+        - mask: boolean array (one element per solvent), only the True solvents are considered
+    Returns:
+        The positions of the solvents sorted by Ra (ascending) and their Ra
+    """
+    point = np.asarray(reference, dtype = float) * HANSEN_SCALE
+    positions = np.array(index.query_ball_point(point, r = radius), dtype = int)
+    if mask is not None:
+        positions = positions[mask[positions]]
+    Ra = np.sqrt((((index.data[positions] - point))**2).sum(axis = 1))
+    order = np.argsort(Ra, kind = 'mergesort')
+    return positions[order], Ra[order]
+
+def ghs_html(hazard_labels, precautionary_labels):
+    """
+    Creates the html fragments with the full text of the GHS statements of a solvent:
+        - hazard_labels: string with the H-statements, separated by spaces
+        - precautionary_labels: string with the P-statements, separated by spaces (combined ones with '+')
+    Returns:
+        The hazard and the precaution fragments, as lists of strings and line breaks
+    """
+    # Hazard string
+    if hazard_labels == 'No Data':
+        labels = ['No Data']
+    elif hazard_labels == 'Not Hazardous':
+        labels = ['Not Hazardous']
+    else:
+        labels = hazard_labels.split(' ')
+    hazard_html = []
+    for hazard in labels:
+        hazard_html.append('{:s}: {:s}'.format(hazard, STATEMENTS[hazard]))
+        hazard_html.append(html.Br())
+        
+    # Precaution string
+    if precautionary_labels == 'No Data':
+        labels = ['No Data']
+    elif hazard_labels == 'Not Hazardous':
+        labels = ['Not Hazardous']
+    else:
+        labels = precautionary_labels.split(' ')
+    precaution_html = []
+    for precaution in labels:
+        text = ''.join(STATEMENTS[s_precaution] for s_precaution in precaution.split('+'))
+        precaution_html.append('{:s}: {:s}'.format(precaution, text))
+        precaution_html.append(html.Br())
+    
+    return hazard_html, precaution_html
+
+def solvent_ghs_html(data):
+    """
+    GHS html fragments of a solvent (see ghs_html), computed only the first time and cached by CAS number:
+        - data: Series structure (or SolventCatalog.row) with the solvent info ('CAS Number', 'Hazard Labels' and 'Precautionary Labels')
+    """
+    cas = data['CAS Number']
+    if cas not in GHS_HTML:
+        GHS_HTML[cas] = ghs_html(data['Hazard Labels'], data['Precautionary Labels'])
+    return GHS_HTML[cas]
+
+def precompute_ghs_html(df):
+    """Fills the cache of the GHS html fragments for all the solvents of the DataFrame"""
+    for cas, hazard_labels, precautionary_labels in df[['CAS Number', 'Hazard Labels', 'Precautionary Labels']].values:
+        GHS_HTML[cas] = ghs_html(hazard_labels, precautionary_labels)
+
+@timed
+def create_report(data = None, scores = SCORES, image_url = None):
+    """
+    Report of a solvent (an empty one if data is None):
+        - data: the row of the solvent, with its composite score (a Series or a SolventCatalog.row)
+        - scores: selected subcategories
+        - image_url: URL of the chemical structure, by default the unversioned /static/<CAS>.svg
+    """
     if data is None:
         # text = [html.H3('Solvent Information'),
         #         html.P('CAS', title = 'The CAS universally identifies the solvent'),
@@ -105,7 +314,7 @@ def create_report(data = None, scores = SCORES):
         for label, score in zip(SCORES_NAMES, scores):
             if len(score):
                 # value = ((data[score]).prod(axis =1, skipna = False)).pow(1/len(score))
-                value = ((data[score]).prod(skipna = False))**(1/len(score))
+                value = np.prod([data[el] for el in score])**(1/len(score))
                 
                 hovering = ''
                 for el in score:
@@ -119,44 +328,17 @@ def create_report(data = None, scores = SCORES):
         
         scores_text.pop()
         
-        # Hazard string
-        if data['Hazard Labels'] == 'No Data':
-            hazard_labels = ['No Data']
-        elif data['Hazard Labels'] == 'Not Hazardous':
-            hazard_labels = ['Not Hazardous']
-        else:
-            hazard_labels = data['Hazard Labels'].split(' ')
-        hazard_html = []
-        for hazard in hazard_labels:
-            text_hazard = df2.Fulltext[df2.index == hazard].values[0]
-            hazard_html.append('{:s}: {:s}'.format(hazard, text_hazard))
-            hazard_html.append(html.Br())
-            
-        # Precaution string
-        if data['Precautionary Labels'] == 'No Data':
-            precaution_labels = ['No Data']
-        elif data['Hazard Labels'] == 'Not Hazardous':
-            precaution_labels = ['Not Hazardous']
-        else:
-            precaution_labels = data['Precautionary Labels'].split(' ')
-        precaution_html = []
-        for precaution in precaution_labels:
-            splitted_precaution = precaution.split('+')
-            text = ''
-            for s_precaution in splitted_precaution:
-                text_precaution = df2.Fulltext[df2.index == s_precaution].values[0]
-                text += text_precaution
-            precaution_html.append('{:s}: {:s}'.format(precaution, text))
-            precaution_html.append(html.Br())
+        hazard_html, precaution_html = solvent_ghs_html(data)
     
-    
-        text = [html.Img(src = '\\static\\' + '{0:s}.svg'.format(data['CAS Number']),\
+        if image_url is None:
+            image_url = '/static/{0:s}.svg'.format(data['CAS Number'])
+        text = [html.Img(src = image_url,\
                                  alt='Chemical structure',\
                                  title = 'Chemical strcuture of {}'.format(data['Solvent Name']),\
                                 style = {'width' : '250px','max-height' : '125px','float':'right', 'margin-left' : '10px'}),
                 html.H3('{}'.format(data['Solvent Name'])),
                 html.P(['CAS: ', html.A(data['CAS Number'], href = 'https://pubchem.ncbi.nlm.nih.gov/compound/{}'.format(data['CAS Number']), target='_blank')]),
-                html.P('HSP: dD = {:.1f}, dP = {:.1f}, dH = {:.1f}'.format(*data[HANSEN_COORDINATES])),
+                html.P('HSP: dD = {:.1f}, dP = {:.1f}, dH = {:.1f}'.format(*[data[name] for name in HANSEN_COORDINATES])),
                 html.P('Melting point: {:.0f} °C. Boiling point:  {:.0f} °C.'.format(data['Melting Point (°C)'], data['Boiling Point (°C)'])),
                 html.P([html.Span('Viscosity:', title = 'Data given in 20-40 °C range', className = 'hover-span'), ' {:.1f} mPa∙s. '.format(data['Viscosity (mPa.s)']),\
                         html.Span('Surface tension:', title = 'Data given in 20-40 °C range', className = 'hover-span'), '  {:.1f} mN/m.'.format(data['Surface Tension (mN/m)'])]),
@@ -169,29 +351,63 @@ def create_report(data = None, scores = SCORES):
         return text
     
     
+def hazard_matrix(data_hazards):
+    """
+    Parses the hazard labels, only once, into a boolean matrix (solvents x H-statements):
+        - data_hazards: DataFrame column with the labels for each solvent, separated by spaces
+    Returns:
+        A boolean DataFrame with the same index as data_hazards and one column per label
+    """
+    return data_hazards.str.get_dummies(sep = ' ').astype(bool)
+
+def hazard_columns(hazards, labels):
+    """The boolean array of the hazard matrix (or of a SolventCatalog), and the columns of the labels (-1 if not in it)"""
+    if is_catalog(hazards):
+        return hazards.hazards, np.array([hazards.hazard_columns.get(label, -1) for label in labels], dtype = int)
+    return hazards.values, hazards.columns.get_indexer(labels)
+
+def any_hazard(hazards, labels):
+    """
+    Vectorized "any of" query on the hazard matrix:
+        - hazards: boolean DataFrame as returned by hazard_matrix, or a SolventCatalog
+        - labels: list with the hazard labels to look for
+    Returns:
+        A boolean array, True for the solvents with at least one of the labels
+    """
+    values, columns = hazard_columns(hazards, labels)
+    return values[:, columns[columns >= 0]].any(axis = 1)
+
+def all_hazards(hazards, labels):
+    """
+    Vectorized "all of" query on the hazard matrix:
+        - hazards: boolean DataFrame as returned by hazard_matrix, or a SolventCatalog
+        - labels: list with the hazard labels to look for
+    Returns:
+        A boolean array, True for the solvents with all the labels
+    """
+    values, columns = hazard_columns(hazards, labels)
+    if (columns < 0).any():
+        # No solvent has a label that is not in the matrix
+        return np.zeros(values.shape[0], dtype = bool)
+    return values[:, columns].all(axis = 1)
+
+@timed
 def filter_by_hazard(hazards_to_remove, data_hazards):
     """ 
     Excludes the solvents with the input hazards:
         - hazards_to_remove: list with the labels of the hazards to be excluded
-        - data_hazards: DataFrame column with the labels for each solvent
+        - data_hazards: hazard matrix (see hazard_matrix), SolventCatalog or DataFrame column with the labels for
+          each solvent. The matrix should be built once and reused, the column is parsed on every call
     """
-        
-    hazards_filter = np.ones((data_hazards.shape[0]), dtype = bool)
-    
-    for hazard in hazards_to_remove:
-#        print(hazard)
-        for i, solvent in enumerate(data_hazards):
-#            print(solvent)
-            for solvent_hazard in solvent.split(' '):
-                if solvent_hazard == hazard:
-                    hazards_filter[i] = False
-                    break
-    return hazards_filter
+    if not isinstance(data_hazards, DataFrame) and not is_catalog(data_hazards):
+        data_hazards = hazard_matrix(data_hazards)
+    return ~any_hazard(data_hazards, hazards_to_remove)
 
+@timed
 def GSK_calculator(df, scores):
     """ 
     Updates the compounds score based on the selected scores only
-        - df: DataFrame structure that should contain at least all the scores columns (that are at least 10)
+        - df: DataFrame structure that should contain at least all the scores columns (that are at least 10), or a SolventCatalog
         - scores: list of scores category, each element containing a list with the subcategories names
     """
     k = 0
@@ -201,7 +417,10 @@ def GSK_calculator(df, scores):
     
     for element in scores:
         if len(element):
-            value = ((df[element]).prod(axis =1, skipna = False)).pow(1/len(element))
+            if is_catalog(df):
+                value = np.power(df[element].prod(axis = 1), 1/len(element))
+            else:
+                value = ((df[element]).prod(axis =1, skipna = False)).pow(1/len(element))
             G *= value
             broken_down_scores.append(value)
             k += 1
@@ -215,6 +434,134 @@ def GSK_calculator(df, scores):
     
     return G, broken_down_scores
 
+def canonical_scores(scores):
+    """
+    Canonical, hashable, form of the selected subcategories (e.g. to be used as a cache key), 
+    independent of the order in which they were selected:
+        - scores: list of scores category, each element containing a list with the subcategories names
+    Returns:
+        A tuple (one element per category of SCORES) of tuples, with the subcategories in the order of SCORES
+    """
+    return tuple(tuple(name for name in category if name in selected) for category, selected in zip(SCORES, scores))
+
+@timed
+def solvent_ranking(df, reference, scores, cube = None):
+    """
+    Computes the request-dependent columns without modifying the input DataFrame,
+    so the base dataset can be shared (read-only) between concurrent callbacks:
+        - df: DataFrame structure with the solvent info (HSP and score columns at least), or a SolventCatalog
+        - reference: 3-element vector with the HSP of the solute
+        - scores: list of scores category, each element containing a list with the subcategories names
+        - cube: ScoreCube of df, to compute the composite score without GSK_calculator (optional)
+    Returns:
+        A new DataFrame structure (or SolventCatalog) with the 'Ra' and 'Composite score' columns for this request
+    """
+    G = GSK_calculator(df, scores)[0] if cube is None else cube.composite(scores)
+    return df.assign(**{'Ra' : update_Ra(df[HANSEN_COORDINATES], reference), 'Composite score' : G})
+
+@timed
+def solvents_filter(df, greenness, hazard_list, temperature_range, viscosity_range, stension_range, hazards = None):
+    """
+    Creates the overall filter of the solvents, an AND product of all the filters:
+        - df: DataFrame structure (or SolventCatalog) as returned by solvent_ranking
+        - greenness: lower limit (excluded) for the composite score, not applied if 0
+        - hazard_list: list with the labels of the hazards to be excluded
+        - temperature_range, stension_range: [min, max] of the boiling point and surface tension
+        - viscosity_range: [min, max] of the log10 of the viscosity
+        - hazards: hazard matrix of df (see hazard_matrix), it is created from the 'Hazard Labels' column if not given.
+          A SolventCatalog has its own
+    The solvents without data for the boiling point, viscosity or surface tension are kept.
+    Returns:
+        A boolean Series (a boolean array for a SolventCatalog), True for the solvents that pass all the filters
+    """
+    column = lambda name: np.asarray(df[name], dtype = float)
+    # 1. Create the greeness filter
+    if greenness > 0:
+        greenness_filter = column('Composite score') > greenness
+    else:
+        greenness_filter = True
+    # 2. Creates the hazard filter
+    if is_catalog(df):
+        hazards = df
+    hazard_filter = filter_by_hazard(hazard_list, df['Hazard Labels'] if hazards is None else hazards)
+
+    # 3. Creates the boiling temperature filter based in the range slider
+    bp = column('Boiling Point (°C)')
+    temperature_filter = ((bp > temperature_range[0]) & (bp < temperature_range[1])) | np.isnan(bp)
+
+    # 4. Creates the viscosity filter based in the range slider, including all the nan
+    viscosity = column('Viscosity (mPa.s)')
+    viscosity_filter = ((viscosity > 10**viscosity_range[0]) & (viscosity < 10**viscosity_range[1])) | np.isnan(viscosity)
+
+    # 5. Creates the surface tension filter based in the range slider, including all the nan
+    stension = column('Surface Tension (mN/m)')
+    surface_tension_filter = ((stension > stension_range[0]) & (stension < stension_range[1]) ) | np.isnan(stension)
+
+    # 6. Creates the overall filter, an AND product of all he filters (only the all True will survive)
+    data_filter = greenness_filter & hazard_filter & temperature_filter & viscosity_filter & surface_tension_filter
+    return data_filter if is_catalog(df) else Series(data_filter, index = df.index)
+
+def batch_ranking(hansen_coordinates, solutes, k = 10, mask = None, max_elements = 10**7):
+    """
+    Ranks the solvents for many solutes in one vectorized call. The distances are computed as one
+    broadcast (solutes x solvents) matrix, by chunks of solutes to bound the memory:
+        - hansen_coordinates: a DataFrame with the three Hansen coordinates columns (or a N x 3 array, or a SolventCatalog)
+        - solutes: M x 3 array with the HSP of the solutes
+        - k: number of solvents to return per solute
+        - mask: boolean array (one element per solvent), only the True solvents are ranked
+        - max_elements: maximum number of elements of the temporary arrays of each chunk
+    Returns:
+        Two M x k arrays, with the positions of the closest solvents sorted by Ra, and their Ra
+        (k is reduced to the number of available solvents)
+    """
+    X = hansen_matrix(hansen_coordinates) * HANSEN_SCALE
+    solutes = np.atleast_2d(np.asarray(solutes, dtype = float)) * HANSEN_SCALE
+    if mask is not None:
+        valid = np.flatnonzero(mask)
+        X = X[valid]
+    k = min(k, X.shape[0])
+    positions = np.empty((solutes.shape[0], k), dtype = int)
+    Ra = np.empty((solutes.shape[0], k))
+
+    chunk = max(1, max_elements // (3 * max(X.shape[0], 1)))
+    for start in range(0, solutes.shape[0], chunk):
+        distance = np.sqrt(((solutes[start:start + chunk, None, :] - X[None, :, :])**2).sum(axis = 2))
+        # Only the k closest are sorted
+        closest = np.argpartition(distance, k - 1, axis = 1)[:, :k] if 0 < k < X.shape[0] else np.tile(np.arange(k), (len(distance), 1))
+        closest_Ra = np.take_along_axis(distance, closest, axis = 1)
+        order = np.argsort(closest_Ra, axis = 1, kind = 'mergesort')
+        positions[start:start + chunk] = np.take_along_axis(closest, order, axis = 1)
+        Ra[start:start + chunk] = np.take_along_axis(closest_Ra, order, axis = 1)
+
+    if mask is not None:
+        positions = valid[positions]
+    return positions, Ra.round(2)
+
+def screen_solutes(df, solutes, k = 10, scores = SCORES, greenness = 0, hazard_list = [], temperature_range = (-np.inf, np.inf),\
+                   viscosity_range = (-np.inf, np.inf), stension_range = (-np.inf, np.inf), hazards = None, cube = None):
+    """
+    Batch version of the ranking of the app: the k closest solvents to each solute, with the same filters:
+        - df: DataFrame structure with the solvent info, or a SolventCatalog
+        - solutes: M x 3 array with the HSP of the solutes
+        - k: number of solvents per solute
+        - scores: list of scores category, each element containing a list with the subcategories names
+        - greenness, hazard_list, temperature_range, viscosity_range, stension_range: filters, see solvents_filter
+        - hazards: hazard matrix of df (see hazard_matrix), optional
+        - cube: ScoreCube of df, optional
+    Returns:
+        A DataFrame with one row per solute and solvent: 'Solute' (position in solutes), 'Rank', 
+        'Solvent Name', 'Ra' and 'Composite score'
+    """
+    dfr = solvent_ranking(df, [None] * 3, scores, cube)
+    data_filter = solvents_filter(dfr, greenness, hazard_list, temperature_range, viscosity_range, stension_range, hazards)
+    positions, Ra = batch_ranking(df[HANSEN_COORDINATES], solutes, k, np.asarray(data_filter, dtype = bool))
+    n_solutes, k = positions.shape
+    return DataFrame({'Solute' : np.repeat(np.arange(n_solutes), k),
+                      'Rank' : np.tile(np.arange(1, k + 1), n_solutes),
+                      'Solvent Name' : np.asarray(dfr['Solvent Name'])[positions.ravel()],
+                      'Ra' : Ra.ravel(),
+                      'Composite score' : np.asarray(dfr['Composite score'])[positions.ravel()]})
+
 def f2s(x):
     """
     Just a simple numebr to string function. Needs a number.
@@ -224,53 +571,187 @@ def f2s(x):
     return f'{x: 3.1f}'
 
 
+def quick_path_mask(Ra, G, min_score = 1.0):
+    """
+    Vectorized engine of the quick path. The path takes, at each step, the closest solvent with a G
+    higher than the previous one. As G increases along the path, the next solvent is also further
+    away, so the path is found in a single pass over the solvents sorted by Ra: a solvent is in the
+    path if its G is higher than the start score and than all the G of the closer solvents.
+        - Ra: array with the distance of the solvents to the solute, or a 2D array (solutes x solvents)
+        - G: array with the composite score of the solvents (nan are never in the path)
+        - min_score: G to start the path with, a number or an array with one value per solute
+    The solvents with Ra = 0 (or nan) are excluded. Ties in Ra are taken in the input order.
+    Returns:
+        A boolean array with the shape of Ra, True for the solvents in the path
+    """
+    Ra = np.asarray(Ra, dtype = float)
+    Ra2d = np.atleast_2d(Ra)
+    valid = Ra2d > 0.0
+    G = np.where(valid & ~np.isnan(G), G, -np.inf)
+
+    # Sorts once by Ra (stable, the excluded solvents go to the end)
+    order = np.argsort(np.where(valid, Ra2d, np.inf), axis = 1, kind = 'mergesort')
+    G_sorted = np.take_along_axis(G, order, axis = 1)
+    # Highest G among the start score and all the closer solvents
+    start = np.broadcast_to(np.reshape(min_score, (-1, 1)), (Ra2d.shape[0], 1)).astype(float)
+    frontier = np.maximum.accumulate(np.concatenate([start, G_sorted[:, :-1]], axis = 1), axis = 1)
+
+    in_path = np.zeros(Ra2d.shape, dtype = bool)
+    np.put_along_axis(in_path, order, G_sorted > frontier, axis = 1)
+    return in_path.reshape(Ra.shape)
+
+def pareto_front(Ra, G):
+    """
+    Pareto front of the distance to the solute (lower is better) against the composite score (higher
+    is better): the points not dominated by any other point, i.e. with a G higher than all the points
+    with a lower (or equal) Ra. Like the quick path, it is found in a single pass sorted by Ra.
+        - Ra: array with the distances to the solute
+        - G: array with the composite scores (the points with nan, in Ra or G, are never in the front)
+    Returns:
+        A boolean array, True for the points in the front (of two identical points, only the first one)
+    """
+    Ra = np.asarray(Ra, dtype = float)
+    G = np.where(np.isnan(Ra), np.nan, np.asarray(G, dtype = float))
+    G = np.where(np.isnan(G), -np.inf, G)
+    order = np.lexsort((-G, np.where(np.isnan(Ra), np.inf, Ra))) # By Ra, and the highest G first
+    G_sorted = G[order]
+    frontier = np.maximum.accumulate(np.concatenate([[-np.inf], G_sorted[:-1]]))
+    front = np.zeros(len(Ra), dtype = bool)
+    front[order] = G_sorted > frontier
+    return front
+
+def skyline(values, maximize = None, block = 512, max_elements = 10**7):
+    """
+    Pareto front (skyline) for any number of objectives, without comparing all the pairs of points:
+      * 2 objectives: the single pass of pareto_front, O(n log n)
+      * 3 objectives: sweep by the first objective, keeping the 2D front of the other two sorted, O(n log n)
+      * more: the points are sorted by the sum of their normalized objectives, so no point can be
+        dominated by a later one, and then they are only compared (by blocks, vectorized) with the front
+        found so far (sort-filter-skyline)
+        - values: N x K array with the objectives of each point
+        - maximize: K booleans, True for the objectives to maximize (by default all are minimized)
+        - block: number of points added to the front at once (more than 3 objectives)
+        - max_elements: maximum number of elements of the temporary comparison arrays (more than 3 objectives)
+    The points with nan in any objective are never in the front.
+    Returns:
+        A boolean array, True for the points in the front (of two identical points, only the first one)
+    """
+    values = np.array(values, dtype = float, ndmin = 2)
+    if maximize is not None:
+        values[:, np.asarray(maximize, dtype = bool)] *= -1 # Everything is minimized
+    valid = np.flatnonzero(~np.isnan(values).any(axis = 1))
+    front = np.zeros(len(values), dtype = bool)
+    if len(valid) == 0:
+        return front
+    if values.shape[1] == 1:
+        front[valid[np.argmin(values[valid, 0])]] = True
+        return front
+    if values.shape[1] == 2:
+        front[valid] = pareto_front(values[valid, 0], -values[valid, 1])
+        return front
+    if values.shape[1] == 3:
+        # By the first objective (ties in the order of the others), each point can only be dominated
+        # by an earlier one: by a point of the 2D front of (second, third) of the earlier points.
+        # That front is kept sorted by the second objective, so the third one is decreasing
+        order = valid[np.lexsort(values[valid].T[::-1])]
+        second, minus_third = [], []
+        for position, (_, y, z) in zip(order, values[order].tolist()):
+            i = bisect_right(second, y)
+            if i and -minus_third[i - 1] <= z:
+                continue # Dominated by (or equal to) an earlier point
+            front[position] = True
+            # The points of the 2D front dominated by this one are removed
+            j = bisect_right(minus_third, -z, lo = i)
+            second[i:j], minus_third[i:j] = [y], [-z]
+        return front
+
+    # A point that dominates another has a lower sum (ties are sorted lexicographically)
+    low, high = values[valid].min(axis = 0), values[valid].max(axis = 0)
+    normalized = (values[valid] - low) / np.where(high > low, high - low, 1)
+    order = valid[np.lexsort(values[valid].T[::-1].tolist() + [normalized.sum(axis = 1)])]
+
+    def dominated(points, by):
+        """True for the points with a point in by lower or equal in all the objectives"""
+        result = np.zeros(len(points), dtype = bool)
+        chunk = max(1, max_elements // (max(len(by), 1) * values.shape[1]))
+        for start in range(0, len(points), chunk):
+            result[start:start + chunk] = (by[:, None, :] <= points[None, start:start + chunk, :]).all(axis = 2).any(axis = 0)
+        return result
+
+    skyline_values = np.empty((0, values.shape[1]))
+    start = 0
+    while start < len(order):
+        candidates = order[start:start + block]
+        # Not dominated by the front so far, and then by a previous point of the block
+        candidates = candidates[~dominated(values[candidates], skyline_values)]
+        points = values[candidates]
+        keep = ~np.triu((points[:, None, :] <= points[None, :, :]).all(axis = 2), 1).any(axis = 0)
+        front[candidates[keep]] = True
+        skyline_values = np.concatenate([skyline_values, points[keep]])
+        if start == 0:
+            # The front of the first points (the lowest sums) dominates most of the others, they are discarded at once
+            rest = order[block:]
+            order = np.concatenate([order[:block], rest[~dominated(values[rest], skyline_values)]])
+        start += block
+    return front
+
+@timed
+def pareto_solvents(df, objectives = ['Ra', 'Composite score']):
+    """
+    The non-dominated solvents, e.g. those for which no other solvent is closer to the solute and greener:
+        - df: DataFrame structure (or SolventCatalog) with the objectives columns (as returned by solvent_ranking)
+        - objectives: list of columns, the direction of each one is given by PARETO_OBJECTIVES
+    The solvents without data for any of the objectives are excluded.
+    Returns:
+        A DataFrame structure (or SolventCatalog) with the solvents in the front, sorted by the first objective
+    """
+    front = skyline(np.asarray(df[objectives], dtype = float), [PARETO_OBJECTIVES[column] for column in objectives])
+    return sort_rows(df[front], objectives[0], ascending = not PARETO_OBJECTIVES[objectives[0]])
+
+@timed
 def suggested_path(df, ref_solvent = None, min_score = 1.0):
     """
     This function contains the algorithm that provides the suggested path to 
-    "greeness" paradise. Needs:
-        - df : DataFrame structure with all the necessary columns ('Solvent Name', 'Composite score' and 'Ra' at least)
-        - ref_solvent: if no reference solvent Series is passed, it will filter all the solvents with score < min_score
+    "greeness" paradise (see quick_path_mask). Needs:
+        - df : DataFrame structure with all the necessary columns ('Solvent Name', 'Composite score' and 'Ra' at least),
+          or a SolventCatalog
+        - ref_solvent: if no reference solvent Series (or SolventCatalog.row) is passed, it will filter all the solvents with score < min_score
         - min_score: minimum score to consider if no ref_solvent is passed
     Returns:
         A DataFrame structure with the sorted solvents that will leads you to the greeness paradise
     """
-    flag = True
-    solvent_path = []
     if ref_solvent is None:
         ref_GSK = min_score # Minimm GSK score to start the path with
     else:
         ref_GSK = ref_solvent['Composite score']
-        solvent_path.append(ref_solvent['Solvent Name'])
     
-    while True:
-        # Filter and sort out the less green
-        df1 = (df[(df['Composite score'] > ref_GSK) & (df['Ra'] > 0.0)]).sort_values(by = 'Ra', inplace = False)
-        flag = (len(df1) == 0)
-        
-        if flag: break
+    in_path = quick_path_mask(np.asarray(df['Ra']), np.asarray(df['Composite score']), ref_GSK)
+    if ref_solvent is not None:
+        # The reference solvent starts the path, if it is in df
+        in_path |= np.asarray(df['Solvent Name'] == ref_solvent['Solvent Name'])
     
-        ref_solvent = df1.iloc[0]
-        solvent_path.append(ref_solvent['Solvent Name'])
-        ref_GSK = ref_solvent['Composite score']
+    return sort_rows(df[in_path], 'Ra')
 
-    
-    # In case some labels are not found, this workaround must be done
-    index = df.index.intersection(solvent_path) # Form the intersection of two index objects
-    # Now I have the index, I can locate the values and sort them again by Ra
-    return (df.loc[index]).sort_values(by = 'Ra', inplace = False)
+def sort_rows(df, column, ascending = True):
+    """The rows of a DataFrame structure or a SolventCatalog, sorted by the column (stable, the nan go last)"""
+    if not is_catalog(df):
+        return df.sort_values(by = column, ascending = ascending, inplace = False, kind = 'mergesort')
+    values = df[column]
+    return df[np.argsort(values if ascending else -values, kind = 'mergesort')]
 
 
+@timed
 def create_annotations(df):
     """
     This function creates the annotations on the positions [dD, dP, dH], enumerating 
     the solvent on the DataFrame structure:
-        - df: DataFrame structure with the solvents to enumerature, sequentially
+        - df: DataFrame structure (or SolventCatalog) with the solvents to enumerature, sequentially
     Returns:
         A list of dictionaries with the annotations data
     """
     annotations = []
     k = 0
-    for x,y,z in df[HANSEN_COORDINATES].values:
+    for x,y,z in np.asarray(df[HANSEN_COORDINATES]):
         annotations.append(
             dict(showarrow=False,
                     x = x,
@@ -291,4 +772,3 @@ def number2scientific(x):
     base = float(base)
     exponent= int(exponent)
     return ['{:.1f}∙10'.format(float(base)), html.Sup('{}'.format(exponent))]
-    
\ No newline at end of file